@@ -1,14 +1,26 @@
 from flask import Blueprint, jsonify, request, current_app
 
-from core.database import query_db, execute_query
+from core.database import query_db, execute_query, parse_fields
+from core.json_provider import LIST_FORMATS, list_payload
+from core.response_cache import versioned_response
 from core.auth import role_required
 
 categories_bp = Blueprint('categories', __name__, url_prefix='/api/v1/categories')
 
+# Columns the list can be narrowed to with fields=
+CATEGORY_FIELDS = ('category_id', 'name')
+
 @categories_bp.route('', methods=['GET'])
 def get_categories():
-    categories = query_db(current_app, 'SELECT * FROM categories')
-    return jsonify([dict(category) for category in categories])
+    try:
+        fields = parse_fields(request.args, CATEGORY_FIELDS)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    list_format = request.args.get('format', 'json')
+    if list_format not in LIST_FORMATS:
+        return jsonify({'message': 'Invalid format'}), 400
+    query = f"SELECT {', '.join(fields) if fields else '*'} FROM categories"
+    return versioned_response('categories', lambda: list_payload(*query_db(current_app, query, columns=True), list_format))
 
 @categories_bp.route('/<int:category_id>', methods=['GET'])
 def get_category(category_id):
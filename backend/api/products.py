@@ -1,45 +1,130 @@
+import re
+import sqlite3
+
 from flask import Blueprint, request, jsonify, g, current_app
 from core.auth import token_required, role_required
-from core.database import query_db, execute_query
+from core.database import query_db, execute_query, execute_returning, parse_fields
+from core.json_provider import LIST_FORMATS, list_payload
+from core.product_index import lookup_products, record_product_write
+from core.response_cache import versioned_response
 
 products_bp = Blueprint('products', __name__, url_prefix='/api/v1/products')
 
-@products_bp.route('', methods=['GET'])
-@token_required
-def get_products():
-    query = 'SELECT * FROM products'
+# Columns the list can be narrowed to with fields=
+PRODUCT_FIELDS = ('product_id', 'item_code', 'name', 'description', 'supplier_id', 'category_id', 'unit_cost',
+                  'selling_price', 'is_vat_exempt', 'stock_on_hand', 'is_active')
+
+def build_products_query(params, fields=None):
+    query = f"SELECT {', '.join(fields) if fields else '*'} FROM products"
     args = []
     where_clauses = []
 
     # Filtering
-    if 'category_id' in request.args:
+    if 'category_id' in params:
         where_clauses.append('category_id = ?')
-        args.append(request.args['category_id'])
-    if 'supplier_id' in request.args:
+        args.append(params['category_id'])
+    if 'supplier_id' in params:
         where_clauses.append('supplier_id = ?')
-        args.append(request.args['supplier_id'])
-    if 'item_code' in request.args:
+        args.append(params['supplier_id'])
+    if 'item_code' in params:
         where_clauses.append('item_code = ?')
-        args.append(request.args['item_code'])
-    if 'name' in request.args:
+        args.append(params['item_code'])
+    if 'name' in params:
         where_clauses.append('name LIKE ?')
-        args.append(f"%{request.args['name']}%")  # Use % for partial matching
-    if 'is_active' in request.args:
+        args.append(f"%{params['name']}%")  # Use % for partial matching
+    if 'is_active' in params:
         where_clauses.append('is_active = ?')
-        args.append(request.args['is_active'])
-    if 'stock_on_hand_lte' in request.args:
+        args.append(params['is_active'])
+    if 'stock_on_hand_lte' in params:
         where_clauses.append('stock_on_hand <= ?')
-        args.append(request.args['stock_on_hand_lte'])
-    if 'stock_on_hand_gte' in request.args:
+        args.append(params['stock_on_hand_lte'])
+    if 'stock_on_hand_gte' in params:
         where_clauses.append('stock_on_hand >= ?')
-        args.append(request.args['stock_on_hand_gte'])
+        args.append(params['stock_on_hand_gte'])
 
     if where_clauses:
         query += ' WHERE ' + ' AND '.join(where_clauses)
+    return query, args
+
+SEARCH_TERM = re.compile(r'\w+')
+DEFAULT_SEARCH_LIMIT = 20
+
+def build_search_query(params, limit):
+    # Typeahead: every word of q must be the prefix of a word in the item code, name or
+    # description. Matches on the item code rank above the name, the name above the
+    # description.
+    match = ' '.join(f'"{term}"*' for term in SEARCH_TERM.findall(params.get('q', '')))
+    if not match:
+        return None, None
+    query = '''
+        SELECT p.* FROM products_fts
+        JOIN products p ON p.product_id = products_fts.rowid
+        WHERE products_fts MATCH ?
+    '''
+    args = [match]
+    for name in ('category_id', 'supplier_id', 'is_active'):
+        if name in params:
+            query += f' AND p.{name} = ?'
+            args.append(params[name])
+    query += ' ORDER BY bm25(products_fts, 10.0, 5.0, 1.0), p.product_id LIMIT ?'
+    args.append(limit)
+    return query, args
 
+@products_bp.route('', methods=['GET'])
+@token_required
+def get_products():
+    try:
+        fields = parse_fields(request.args, PRODUCT_FIELDS)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    list_format = request.args.get('format', 'json')
+    if list_format not in LIST_FORMATS:
+        return jsonify({'message': 'Invalid format'}), 400
+    query, args = build_products_query(request.args, fields)
+    return versioned_response('products', lambda: list_payload(*query_db(current_app, query, args, columns=True), list_format))
+
+@products_bp.route('/search', methods=['GET'])
+@token_required
+def search_products():
+    max_limit = current_app.config['PRODUCT_SEARCH_MAX_LIMIT']
+    try:
+        limit = int(request.args.get('limit', DEFAULT_SEARCH_LIMIT))
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= max_limit:
+        return jsonify({'message': f'limit must be between 1 and {max_limit}'}), 400
+
+    query, args = build_search_query(request.args, limit)
+    if query is None:
+        return jsonify({'message': 'Missing search query'}), 400
     products = query_db(current_app, query, args)
     return jsonify([dict(product) for product in products])
 
+@products_bp.route('/by-code/<item_code>', methods=['GET'])
+@token_required
+def get_product_by_code(item_code):
+    # Barcode scans: served from the in-process index of active products
+    product = lookup_products(current_app, [item_code]).get(item_code)
+    if not product:
+        return jsonify({'message': 'Product not found'}), 404
+    return jsonify(product)
+
+@products_bp.route('/by-code', methods=['POST'])
+@token_required
+def get_products_by_code():
+    data = request.json
+    item_codes = data.get('item_codes') if isinstance(data, dict) else None
+    if not isinstance(item_codes, list) or not item_codes or not all(isinstance(code, str) for code in item_codes):
+        return jsonify({'message': 'Expected a non-empty list of item_codes'}), 400
+    if len(item_codes) > current_app.config['PRODUCT_LOOKUP_BATCH_LIMIT']:
+        return jsonify({'message': f"Lookup exceeds the limit of {current_app.config['PRODUCT_LOOKUP_BATCH_LIMIT']} item codes"}), 400
+
+    found = lookup_products(current_app, item_codes)
+    return jsonify({
+        'products': list(found.values()),
+        'missing': [code for code in dict.fromkeys(item_codes) if code not in found],
+    })
+
 @products_bp.route('/<int:product_id>', methods=['GET'])
 @token_required
 def get_product(product_id):
@@ -48,6 +133,17 @@ def get_product(product_id):
         return jsonify({'message': 'Product not found'}), 404
     return jsonify(dict(product))
 
+def _invalid_reference_message(data):
+    # Only consulted after a foreign key violation, to name the offending reference
+    if 'supplier_id' in data and not query_db(current_app, 'SELECT 1 FROM suppliers WHERE supplier_id = ?', [data['supplier_id']], one=True):
+        return 'Invalid supplier_id'
+    if 'category_id' in data and not query_db(current_app, 'SELECT 1 FROM categories WHERE category_id = ?', [data['category_id']], one=True):
+        return 'Invalid category_id'
+    return 'Invalid supplier_id or category_id'
+
+def _is_foreign_key_error(error):
+    return 'FOREIGN KEY constraint failed' in str(error)
+
 @products_bp.route('', methods=['POST'])
 @role_required(['Administrator', 'Manager'])
 def create_product():
@@ -56,19 +152,19 @@ def create_product():
     if not all(field in data for field in required_fields):
         return jsonify({'message': 'Missing required fields'}), 400
 
-    # Check if supplier_id and category_id exist
-    supplier = query_db(current_app, 'SELECT * FROM suppliers WHERE supplier_id = ?', [data['supplier_id']], one=True)
-    category = query_db(current_app, 'SELECT * FROM categories WHERE category_id = ?', [data['category_id']], one=True)
-
-    if not supplier or not category:
+    # supplier_id and category_id are checked by their foreign keys
+    try:
+        new_product = execute_returning(current_app, '''
+            INSERT INTO products (item_code, name, description, supplier_id, category_id, unit_cost, selling_price, is_vat_exempt)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            RETURNING *
+        ''', [data['item_code'], data['name'], data.get('description'), data['supplier_id'], data['category_id'],
+              data['unit_cost'], data['selling_price'], data['is_vat_exempt']])
+    except sqlite3.IntegrityError as e:
+        if not _is_foreign_key_error(e):
+            raise
         return jsonify({'message':'Invalid supplier_id or category_id'}), 400
-
-    product_id = execute_query(current_app, '''
-        INSERT INTO products (item_code, name, description, supplier_id, category_id, unit_cost, selling_price, is_vat_exempt)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    ''', [data['item_code'], data['name'], data.get('description'), data['supplier_id'], data['category_id'],
-          data['unit_cost'], data['selling_price'], data['is_vat_exempt']])
-    new_product = query_db(current_app, 'SELECT * FROM products WHERE product_id = ?', [product_id], one=True)
+    record_product_write(current_app, new_product)
     return jsonify(dict(new_product)), 201
 
 @products_bp.route('/<int:product_id>', methods=['PUT'])
@@ -79,23 +175,22 @@ def update_product(product_id):
     if not all(field in data for field in required_fields):
         return jsonify({'message': 'Missing required fields for PUT'}), 400
 
-    # Check if supplier_id and category_id exist
-    supplier = query_db(current_app, 'SELECT * FROM suppliers WHERE supplier_id = ?', [data['supplier_id']], one=True)
-    category = query_db(current_app, 'SELECT * FROM categories WHERE category_id = ?', [data['category_id']], one=True)
-
-    if not supplier or not category:
+    try:
+        updated_product = execute_returning(current_app, '''
+            UPDATE products
+            SET item_code = ?, name = ?, description = ?, supplier_id = ?, category_id = ?,
+            unit_cost = ?, selling_price = ?, is_vat_exempt = ?, is_active = ?, stock_on_hand = ?
+            WHERE product_id = ?
+            RETURNING *
+        ''', [data['item_code'], data['name'], data.get('description'), data['supplier_id'], data['category_id'],
+              data['unit_cost'], data['selling_price'], data['is_vat_exempt'], data['is_active'], data['stock_on_hand'], product_id])
+    except sqlite3.IntegrityError as e:
+        if not _is_foreign_key_error(e):
+            raise
         return jsonify({'message':'Invalid supplier_id or category_id'}), 400
-
-    execute_query(current_app, '''
-        UPDATE products
-        SET item_code = ?, name = ?, description = ?, supplier_id = ?, category_id = ?,
-        unit_cost = ?, selling_price = ?, is_vat_exempt = ?, is_active = ?, stock_on_hand = ?
-        WHERE product_id = ?
-    ''', [data['item_code'], data['name'], data.get('description'), data['supplier_id'], data['category_id'],
-          data['unit_cost'], data['selling_price'], data['is_vat_exempt'], data['is_active'], data['stock_on_hand'], product_id])
-    updated_product = query_db(current_app, 'SELECT * FROM products WHERE product_id = ?', [product_id], one=True)
     if not updated_product:
         return jsonify({'message': 'Product not found'}), 404
+    record_product_write(current_app, updated_product)
     return jsonify(dict(updated_product))
 
 @products_bp.route('/<int:product_id>', methods=['PATCH'])
@@ -108,14 +203,6 @@ def partial_update_product(product_id):
     allowed_fields = ['item_code', 'name', 'description', 'supplier_id', 'category_id', 'unit_cost', 'selling_price', 'is_vat_exempt', 'is_active', 'stock_on_hand']
     for field in allowed_fields:
         if field in data:
-            if field == 'supplier_id':
-                supplier = query_db(current_app, 'SELECT * from suppliers WHERE supplier_id=?', [data['supplier_id']], one=True)
-                if not supplier:
-                    return jsonify({'message':'Invalid supplier_id'}), 400
-            if field == 'category_id':
-                category = query_db(current_app, 'SELECT * FROM categories WHERE category_id=?', [data['category_id']], one=True)
-                if not category:
-                    return jsonify({'message':'Invalid category_id'}), 400
             updates.append(f'{field} = ?')
             args.append(data[field])
 
@@ -123,17 +210,26 @@ def partial_update_product(product_id):
         return jsonify({'message': 'No valid fields to update'}), 400
 
     args.append(product_id)
-    query = f'UPDATE products SET {", ".join(updates)} WHERE product_id = ?'
-    execute_query(current_app, query, args)
+    query = f'UPDATE products SET {", ".join(updates)} WHERE product_id = ? RETURNING *'
+    try:
+        updated_product = execute_returning(current_app, query, args)
+    except sqlite3.IntegrityError as e:
+        if not _is_foreign_key_error(e):
+            raise
+        return jsonify({'message': _invalid_reference_message(data)}), 400
 
-    updated_product = query_db(current_app, 'SELECT * FROM products WHERE product_id = ?', [product_id], one=True)
     if not updated_product:
         return jsonify({'message': 'Product not found'}), 404
+    # A stock-only PATCH leaves the catalog version alone
+    if any(field in data for field in allowed_fields if field != 'stock_on_hand'):
+        record_product_write(current_app, updated_product)
     return jsonify(dict(updated_product))
 
 @products_bp.route('/<int:product_id>', methods=['DELETE'])
 @role_required(['Administrator'])
 def delete_product(product_id):
     #Soft delete
-    execute_query(current_app, 'UPDATE products SET is_active = 0 WHERE product_id = ?', [product_id])
+    product = execute_returning(current_app, 'UPDATE products SET is_active = 0 WHERE product_id = ? RETURNING *', [product_id])
+    if product:
+        record_product_write(current_app, product)
     return jsonify({'message':'Product deactivated'}), 204
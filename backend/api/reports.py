@@ -0,0 +1,370 @@
+import re
+from datetime import date
+
+from flask import Blueprint, Response, request, jsonify, g, current_app, stream_with_context
+from core.auth import token_required, role_required
+from core.concurrency import limit_concurrency
+from core.database import get_db, iter_query, query_db
+from core.export import CSV_MIMETYPE, JSON_MIMETYPE, XLSX_MIMETYPE, stream_csv, stream_json, stream_xlsx
+from core.json_provider import LIST_FORMATS
+from core.reconciliation import apply_reconciliation, run_reconciliation, start_reconciliation
+from core.stock_snapshots import create_stock_snapshot, nearest_snapshot, stock_as_of
+
+reports_bp = Blueprint('reports', __name__, url_prefix='/api/v1/reports')
+
+DATE_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+EXPORT_MIMETYPES = {'xlsx': XLSX_MIMETYPE, 'csv': CSV_MIMETYPE}
+
+class ReportParameterError(ValueError):
+    pass
+
+def valid_date(value):
+    try:
+        date.fromisoformat(value)
+    except ValueError:
+        return False
+    return True
+
+def date_range(params, column, day_column=False):
+    # Both bounds are inclusive whole days. day_column marks columns holding a bare
+    # YYYY-MM-DD day; otherwise the column is a full transaction_date timestamp.
+    clauses = []
+    args = []
+    for name in ('start_date', 'end_date'):
+        if name in params and (not DATE_PATTERN.match(params[name]) or not valid_date(params[name])):
+            raise ReportParameterError(f'Invalid {name}, expected YYYY-MM-DD')
+    if 'start_date' in params:
+        clauses.append(f'{column} >= ?')
+        args.append(params['start_date'])
+    if 'end_date' in params:
+        if day_column:
+            clauses.append(f'{column} <= ?')
+        else:
+            clauses.append(f"{column} < date(?, '+1 day')")
+        args.append(params['end_date'])
+    return clauses, args
+
+def order_by(params, columns, default):
+    # columns maps the public sort names to SQL expressions; ties fall back to the product id
+    sort = params.get('sort', default)
+    order = params.get('order', 'asc')
+    if sort not in columns:
+        raise ReportParameterError(f"Invalid sort column, expected one of: {', '.join(columns)}")
+    if order not in ('asc', 'desc'):
+        raise ReportParameterError('Invalid sort order')
+    return f' ORDER BY {columns[sort]} {order.upper()}'
+
+def run_report(build):
+    list_format = request.args.get('format', 'json')
+    if list_format not in LIST_FORMATS:
+        return jsonify({'message': 'Invalid format'}), 400
+    try:
+        query, args = build(request.args)
+    except ReportParameterError as e:
+        return jsonify({'message': str(e)}), 400
+    # Streamed from the cursor like the exports: without a date range the ledger reports
+    # cover every transaction, which must never be held in memory at once
+    rows = iter_query(current_app, query, args, columns=True)
+
+    def generate():
+        yield from stream_json(next(rows), rows, list_format, current_app.json.dumps)
+    return Response(stream_with_context(generate()), mimetype=JSON_MIMETYPE)
+
+def stock_on_hand_query(params):
+    where_clauses = []
+    args = []
+    stock = 'p.stock_on_hand'
+    joins = ''
+    if 'as_of' in params:
+        # Stock at the end of that day, from the nearest snapshot or the live stock
+        as_of = params['as_of']
+        if not DATE_PATTERN.match(as_of) or not valid_date(as_of):
+            raise ReportParameterError('Invalid as_of, expected YYYY-MM-DD')
+        stock, joins, args = stock_as_of(as_of, nearest_snapshot(get_db(current_app), as_of))
+    if 'category_id' in params:
+        where_clauses.append('p.category_id = ?')
+        args.append(params['category_id'])
+    if 'supplier_id' in params:
+        where_clauses.append('p.supplier_id = ?')
+        args.append(params['supplier_id'])
+    if 'is_active' in params:
+        where_clauses.append('p.is_active = ?')
+        args.append(params['is_active'])
+
+    query = f'SELECT p.product_id, p.item_code, p.name, p.description, {stock} AS stock_on_hand FROM products p{joins}'
+    if where_clauses:
+        query += ' WHERE ' + ' AND '.join(where_clauses)
+    query += order_by(params, {
+        'item_code': 'p.item_code',
+        'name': 'p.name',
+        'stock_on_hand': 'stock_on_hand',
+    }, 'item_code')
+    return query, args
+
+def sales_query(params):
+    clauses, args = date_range(params, 'movement_date', day_column=True)
+    query = f'''
+        SELECT p.product_id, p.item_code, p.name, p.description,
+               s.quantity_sold, s.total_sales_amount
+        FROM (
+            SELECT product_id, SUM(quantity) AS quantity_sold, SUM(amount) AS total_sales_amount
+            FROM daily_product_movements
+            WHERE {' AND '.join(["transaction_type = 'Sale'"] + clauses)}
+            GROUP BY product_id
+        ) s
+        JOIN products p ON p.product_id = s.product_id
+        WHERE s.quantity_sold != 0
+    '''
+    query += order_by(params, {
+        'item_code': 'p.item_code',
+        'name': 'p.name',
+        'quantity_sold': 's.quantity_sold',
+        'total_sales_amount': 's.total_sales_amount',
+    }, 'item_code')
+    return query, args
+
+def unsold_query(params):
+    clauses, args = date_range(params, 'm.movement_date', day_column=True)
+    where_clauses = [f'''NOT EXISTS (
+        SELECT 1 FROM daily_product_movements m
+        WHERE {' AND '.join(['m.product_id = p.product_id'] + clauses + ["m.transaction_type = 'Sale'", 'm.quantity != 0'])}
+    )''']
+    for name in ('category_id', 'supplier_id', 'is_active'):
+        if name in params:
+            where_clauses.append(f'p.{name} = ?')
+            args.append(params[name])
+    query = f'''
+        SELECT p.product_id, p.item_code, p.name, p.description, p.stock_on_hand
+        FROM products p
+        WHERE {' AND '.join(where_clauses)}
+    '''
+    query += order_by(params, {
+        'item_code': 'p.item_code',
+        'name': 'p.name',
+        'stock_on_hand': 'p.stock_on_hand',
+    }, 'item_code')
+    return query, args
+
+def supplier_movements_query(transaction_type):
+    # Delivery and Pull-out reports list individual transactions with their supplier
+    def build(params):
+        clauses, args = date_range(params, 't.transaction_date')
+        where_clauses = ['t.transaction_type = ?'] + clauses
+        args.insert(0, transaction_type)
+        if 'supplier_id' in params:
+            where_clauses.append('t.supplier_id = ?')
+            args.append(params['supplier_id'])
+        query = f'''
+            SELECT t.transaction_id, t.transaction_date, t.supplier_id, s.name AS supplier_name,
+                   t.product_id, p.item_code, p.name, t.quantity
+            FROM transactions t
+            JOIN products p ON p.product_id = t.product_id
+            LEFT JOIN suppliers s ON s.supplier_id = t.supplier_id
+            WHERE {' AND '.join(where_clauses)}
+        '''
+        query += order_by(params, {
+            'transaction_date': 't.transaction_date',
+            'supplier_name': 's.name',
+            'item_code': 'p.item_code',
+            'name': 'p.name',
+            'quantity': 't.quantity',
+        }, 'transaction_date') + ', t.transaction_id'
+        return query, args
+    return build
+
+def transaction_history_query(params):
+    clauses, args = date_range(params, 't.transaction_date')
+    for name in ('transaction_type', 'product_id', 'supplier_id', 'user_id'):
+        if name in params:
+            clauses.append(f't.{name} = ?')
+            args.append(params[name])
+    query = '''
+        SELECT t.transaction_id, t.transaction_date, t.transaction_type, t.product_id, p.item_code, p.name,
+               t.quantity, t.price, t.supplier_id, s.name AS supplier_name, t.user_id, u.username
+        FROM transactions t
+        JOIN products p ON p.product_id = t.product_id
+        LEFT JOIN suppliers s ON s.supplier_id = t.supplier_id
+        LEFT JOIN users u ON u.user_id = t.user_id
+    '''
+    if clauses:
+        query += ' WHERE ' + ' AND '.join(clauses)
+    query += order_by(params, {
+        'transaction_date': 't.transaction_date',
+        'transaction_type': 't.transaction_type',
+        'item_code': 'p.item_code',
+        'name': 'p.name',
+        'quantity': 't.quantity',
+    }, 'transaction_date') + ', t.transaction_id'
+    return query, args
+
+REPORTS = {
+    'stock-on-hand': stock_on_hand_query,
+    'sales': sales_query,
+    'unsold': unsold_query,
+    'deliveries': supplier_movements_query('Delivery'),
+    'pull-outs': supplier_movements_query('Pull-out'),
+    'transaction-history': transaction_history_query,
+}
+
+@reports_bp.route('/stock-on-hand', methods=['GET'])
+@token_required
+@limit_concurrency('report')
+def stock_on_hand_report():
+    return run_report(REPORTS['stock-on-hand'])
+
+@reports_bp.route('/sales', methods=['GET'])
+@token_required
+@limit_concurrency('report')
+def sales_report():
+    return run_report(REPORTS['sales'])
+
+@reports_bp.route('/unsold', methods=['GET'])
+@token_required
+@limit_concurrency('report')
+def unsold_report():
+    return run_report(REPORTS['unsold'])
+
+@reports_bp.route('/deliveries', methods=['GET'])
+@token_required
+@limit_concurrency('report')
+def deliveries_report():
+    return run_report(REPORTS['deliveries'])
+
+@reports_bp.route('/pull-outs', methods=['GET'])
+@token_required
+@limit_concurrency('report')
+def pull_outs_report():
+    return run_report(REPORTS['pull-outs'])
+
+@reports_bp.route('/transaction-history', methods=['GET'])
+@token_required
+@limit_concurrency('report')
+def transaction_history_report():
+    return run_report(REPORTS['transaction-history'])
+
+@reports_bp.route('/stock-snapshots', methods=['GET'])
+@token_required
+def list_stock_snapshots():
+    rows = query_db(current_app, 'SELECT * FROM stock_snapshot_dates ORDER BY snapshot_date DESC')
+    return jsonify([dict(row) for row in rows])
+
+@reports_bp.route('/stock-snapshots', methods=['POST'])
+@role_required(['Administrator', 'Manager'])
+@limit_concurrency('report')
+def create_stock_snapshot_endpoint():
+    data = request.json
+    snapshot_date = data.get('snapshot_date') if isinstance(data, dict) else None
+    if not isinstance(snapshot_date, str) or not DATE_PATTERN.match(snapshot_date) or not valid_date(snapshot_date):
+        return jsonify({'message': 'Invalid snapshot_date, expected YYYY-MM-DD'}), 400
+    snapshot = create_stock_snapshot(get_db(current_app), snapshot_date)
+    if snapshot is None:
+        return jsonify({'message': 'Transactions on or before snapshot_date changed while the snapshot was taken'}), 409
+    return jsonify(snapshot), 201
+
+def reconciliation_run(run_id):
+    run = query_db(current_app, 'SELECT * FROM stock_reconciliation_runs WHERE run_id = ?', [run_id], one=True)
+    return dict(run) if run else None
+
+def finish_reconciliation(run_id):
+    # Runs to completion; the discrepancies are stored with the run rather than kept here
+    for _ in run_reconciliation(get_db(current_app), run_id):
+        pass
+    return reconciliation_run(run_id)
+
+@reports_bp.route('/stock-reconciliations', methods=['GET'])
+@role_required(['Administrator', 'Manager'])
+def list_stock_reconciliations():
+    rows = query_db(current_app, 'SELECT * FROM stock_reconciliation_runs ORDER BY run_id DESC')
+    return jsonify([dict(row) for row in rows])
+
+@reports_bp.route('/stock-reconciliations', methods=['POST'])
+@role_required(['Administrator', 'Manager'])
+@limit_concurrency('report')
+def create_stock_reconciliation():
+    run_id = start_reconciliation(get_db(current_app), g.current_user['user_id'])
+    return jsonify(finish_reconciliation(run_id)), 201
+
+@reports_bp.route('/stock-reconciliations/<int:run_id>', methods=['GET'])
+@role_required(['Administrator', 'Manager'])
+def get_stock_reconciliation(run_id):
+    run = reconciliation_run(run_id)
+    if run is None:
+        return jsonify({'message': 'Reconciliation not found'}), 404
+    return jsonify(run)
+
+@reports_bp.route('/stock-reconciliations/<int:run_id>/resume', methods=['POST'])
+@role_required(['Administrator', 'Manager'])
+@limit_concurrency('report')
+def resume_stock_reconciliation(run_id):
+    run = reconciliation_run(run_id)
+    if run is None:
+        return jsonify({'message': 'Reconciliation not found'}), 404
+    if run['status'] == 'complete':
+        return jsonify({'message': 'Reconciliation already complete'}), 409
+    return jsonify(finish_reconciliation(run_id))
+
+@reports_bp.route('/stock-reconciliations/<int:run_id>/discrepancies', methods=['GET'])
+@role_required(['Administrator', 'Manager'])
+@limit_concurrency('export')
+def stock_reconciliation_discrepancies(run_id):
+    # Streamed like the report exports; JSON by default, or format=csv|xlsx
+    output_format = request.args.get('format', 'json')
+    if output_format != 'json' and output_format not in EXPORT_MIMETYPES:
+        return jsonify({'message': 'Invalid format'}), 400
+    if reconciliation_run(run_id) is None:
+        return jsonify({'message': 'Reconciliation not found'}), 404
+    rows = iter_query(current_app, '''
+        SELECT d.product_id, p.item_code, p.name, d.recorded_stock, d.ledger_stock,
+               d.recorded_stock - d.ledger_stock AS difference
+        FROM stock_reconciliation_discrepancies d
+        JOIN products p ON p.product_id = d.product_id
+        WHERE d.run_id = ?
+        ORDER BY d.product_id
+    ''', [run_id], columns=True)
+    if output_format != 'json':
+        return export_response(f'stock-reconciliation-{run_id}', output_format, rows)
+
+    def generate():
+        yield from stream_json(next(rows), rows)
+    return Response(stream_with_context(generate()), mimetype=JSON_MIMETYPE)
+
+@reports_bp.route('/stock-reconciliations/<int:run_id>/apply', methods=['POST'])
+@role_required(['Administrator'])
+def apply_stock_reconciliation(run_id):
+    run = reconciliation_run(run_id)
+    if run is None:
+        return jsonify({'message': 'Reconciliation not found'}), 404
+    if run['status'] != 'complete':
+        return jsonify({'message': 'Reconciliation is not complete'}), 409
+    return jsonify(apply_reconciliation(get_db(current_app), run_id, g.current_user['user_id']))
+
+@reports_bp.route('/<report>/export', methods=['GET'])
+@token_required
+@limit_concurrency('export')
+def export_report(report):
+    # Same parameters as the report itself; rows go from the cursor to the client as
+    # they are read, so the size of the export does not affect memory use
+    if report not in REPORTS:
+        return jsonify({'message': 'Report not found'}), 404
+    output_format = request.args.get('format', 'xlsx')
+    if output_format not in EXPORT_MIMETYPES:
+        return jsonify({'message': 'Invalid format'}), 400
+    try:
+        query, args = REPORTS[report](request.args)
+    except ReportParameterError as e:
+        return jsonify({'message': str(e)}), 400
+
+    return export_response(report, output_format, iter_query(current_app, query, args, columns=True))
+
+def export_response(name, output_format, rows):
+    # rows starts with the tuple of column names, as iter_query(columns=True) yields them
+    def generate():
+        columns = next(rows)
+        if output_format == 'csv':
+            yield from stream_csv(columns, rows)
+        else:
+            yield from stream_xlsx(name.replace('-', ' ').title(), columns, rows)
+
+    filename = f'{name}-{date.today().isoformat()}.{output_format}'
+    return Response(stream_with_context(generate()), mimetype=EXPORT_MIMETYPES[output_format],
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
@@ -1,14 +1,26 @@
 from flask import Blueprint, request, jsonify, g, current_app
 from core.auth import token_required, role_required
-from core.database import query_db, execute_query
+from core.database import query_db, execute_query, parse_fields
+from core.json_provider import LIST_FORMATS, list_payload
+from core.response_cache import versioned_response
 
 suppliers_bp = Blueprint('suppliers', __name__, url_prefix='/api/v1/suppliers')
 
+# Columns the list can be narrowed to with fields=
+SUPPLIER_FIELDS = ('supplier_id', 'name', 'contact_info')
+
 @suppliers_bp.route('', methods=['GET'])
 @token_required
 def get_suppliers():
-    suppliers = query_db(current_app, 'SELECT * FROM suppliers')
-    return jsonify([dict(supplier) for supplier in suppliers])
+    try:
+        fields = parse_fields(request.args, SUPPLIER_FIELDS)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    list_format = request.args.get('format', 'json')
+    if list_format not in LIST_FORMATS:
+        return jsonify({'message': 'Invalid format'}), 400
+    query = f"SELECT {', '.join(fields) if fields else '*'} FROM suppliers"
+    return versioned_response('suppliers', lambda: list_payload(*query_db(current_app, query, columns=True), list_format))
 
 @suppliers_bp.route('/<int:supplier_id>', methods=['GET'])
 @token_required
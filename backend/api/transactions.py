@@ -1,46 +1,234 @@
-from flask import Blueprint, request, jsonify, g, current_app
+import base64
+import json
+import re
+import sqlite3
+from datetime import datetime
+from urllib.parse import urlencode
+
+from flask import Blueprint, Response, request, jsonify, g, current_app, stream_with_context
 from core.auth import token_required
-from core.database import query_db, execute_query
+from core.concurrency import limit_concurrency
+from core.group_commit import get_group_commit
+from core.json_provider import list_payload
+from core.database import (query_db, execute_query, execute_returning, execute_in_transaction, iter_query,
+                           in_list, parse_fields, run_in_transaction)
 
 transactions_bp = Blueprint('transactions', __name__, url_prefix='/api/v1/transactions')
 
-@transactions_bp.route('', methods=['GET'])
-@token_required
-def get_transactions():
-    query = 'SELECT * FROM transactions'
+# Keyset orderings: the cursor holds the sort key of the last row returned.
+TRANSACTION_SORT_KEYS = {
+    'transaction_id': ('transaction_id',),
+    'transaction_date': ('transaction_date', 'transaction_id'),
+}
+# The JSON type of each sort key column, as a cursor must hold it
+CURSOR_VALUE_TYPES = {'transaction_id': int, 'transaction_date': str}
+
+TRANSACTION_COLUMNS = ('transaction_id', 'product_id', 'transaction_type', 'quantity', 'transaction_date',
+                       'supplier_id', 'user_id', 'price')
+
+# Related rows that expand= adds to each transaction: (join, {field: column}). Every join
+# is a primary-key lookup per transaction, so expanding never changes how the ledger is read.
+TRANSACTION_EXPANSIONS = {
+    'product': ('LEFT JOIN products ON products.product_id = transactions.product_id',
+                {'item_code': 'products.item_code', 'product_name': 'products.name'}),
+    'supplier': ('LEFT JOIN suppliers ON suppliers.supplier_id = transactions.supplier_id',
+                 {'supplier_name': 'suppliers.name'}),
+    'user': ('LEFT JOIN users ON users.user_id = transactions.user_id', {'username': 'users.username'}),
+}
+
+# Fields the list can be narrowed to with fields=, as (select list entry, expansion it needs)
+TRANSACTION_FIELDS = {field: (f'transactions.{field}', None) for field in TRANSACTION_COLUMNS}
+TRANSACTION_FIELDS.update({field: (f'{column} AS {field}', name)
+                           for name, (_, expanded) in TRANSACTION_EXPANSIONS.items()
+                           for field, column in expanded.items()})
+
+_FORMAT_MIMETYPES = {
+    'json-stream': 'application/json',
+    'ndjson': 'application/x-ndjson',
+}
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, key_columns):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list) or len(values) != len(key_columns):
+        return None
+    # Exact types, so that neither booleans nor nested values reach the query
+    if any(type(value) is not CURSOR_VALUE_TYPES[column] for value, column in zip(values, key_columns)):
+        return None
+    return values
+
+def parse_expand(params):
+    # Returns the requested expansions in a fixed order, or None if one is unknown
+    names = [name for name in params.get('expand', '').split(',') if name]
+    if any(name not in TRANSACTION_EXPANSIONS for name in names):
+        return None
+    return [name for name in TRANSACTION_EXPANSIONS if name in names]
+
+def build_transactions_query(params, expand=(), fields=None):
+    # Columns are qualified with the table name, as the expansions join tables that share them
+    if fields is None:
+        columns = ['transactions.*']
+        for name in expand:
+            columns.extend(f'{column} AS {field}' for field, column in TRANSACTION_EXPANSIONS[name][1].items())
+    else:
+        # An explicit field list replaces expand: joined are exactly the tables it draws on
+        columns = [TRANSACTION_FIELDS[field][0] for field in fields]
+        expand = {TRANSACTION_FIELDS[field][1] for field in fields}
+    joins = [join for name, (join, _) in TRANSACTION_EXPANSIONS.items() if name in expand]
+    query = f"SELECT {', '.join(columns)} FROM transactions"
+    if joins:
+        query += ' ' + ' '.join(joins)
     args = []
     where_clauses = []
 
     # Filtering
-    if 'product_id' in request.args:
-        where_clauses.append('product_id = ?')
-        args.append(request.args['product_id'])
-    if 'transaction_type' in request.args:
-        where_clauses.append('transaction_type = ?')
-        args.append(request.args['transaction_type'])
-    if 'start_date' in request.args:
-        where_clauses.append('transaction_date >= ?')
-        args.append(request.args['start_date'])
-    if 'end_date' in request.args:
-        where_clauses.append('transaction_date <= ?')
-        args.append(request.args['end_date'])
-    if 'user_id' in request.args:
-        where_clauses.append('user_id = ?')
-        args.append(request.args['user_id'])
-    if 'supplier_id' in request.args:
-        where_clauses.append('supplier_id = ?')
-        args.append(request.args['supplier_id'])
+    if 'product_id' in params:
+        where_clauses.append('transactions.product_id = ?')
+        args.append(params['product_id'])
+    if 'transaction_type' in params:
+        where_clauses.append('transactions.transaction_type = ?')
+        args.append(params['transaction_type'])
+    if 'start_date' in params:
+        where_clauses.append('transactions.transaction_date >= ?')
+        args.append(params['start_date'])
+    if 'end_date' in params:
+        where_clauses.append('transactions.transaction_date <= ?')
+        args.append(params['end_date'])
+    if 'user_id' in params:
+        where_clauses.append('transactions.user_id = ?')
+        args.append(params['user_id'])
+    if 'supplier_id' in params:
+        where_clauses.append('transactions.supplier_id = ?')
+        args.append(params['supplier_id'])
 
     if where_clauses:
         query += ' WHERE ' + ' AND '.join(where_clauses)
+    return query, args, where_clauses
+
+def _listing_class():
+    # Only the streamed formats without a limit are exports; plain listings are what the
+    # transaction page loads, and must not queue behind a running export
+    if 'limit' not in request.args and request.args.get('format') in _FORMAT_MIMETYPES:
+        return 'export'
+    return None
+
+@transactions_bp.route('', methods=['GET'])
+@token_required
+@limit_concurrency(_listing_class)
+def get_transactions():
+    expand = parse_expand(request.args)
+    if expand is None:
+        return jsonify({'message': 'Invalid expand'}), 400
+    try:
+        fields = parse_fields(request.args, TRANSACTION_FIELDS)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    # Keyset pagination
+    sort = request.args.get('sort', 'transaction_id')
+    order = request.args.get('order', 'asc')
+    output_format = request.args.get('format', 'json')
+    if sort not in TRANSACTION_SORT_KEYS:
+        return jsonify({'message': 'Invalid sort column'}), 400
+    if order not in ('asc', 'desc'):
+        return jsonify({'message': 'Invalid sort order'}), 400
+    if output_format not in ('json', 'compact', 'json-stream', 'ndjson'):
+        return jsonify({'message': 'Invalid format'}), 400
+
+    limit = None
+    if 'limit' in request.args:
+        try:
+            limit = int(request.args['limit'])
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= current_app.config['TRANSACTION_PAGE_MAX_LIMIT']:
+            return jsonify({'message': f"limit must be between 1 and {current_app.config['TRANSACTION_PAGE_MAX_LIMIT']}"}), 400
+
+    key_columns = TRANSACTION_SORT_KEYS[sort]
+    selected = fields
+    if fields is not None and limit is not None:
+        # A page also reads its sort key, for the next cursor
+        selected = fields + [column for column in key_columns if column not in fields]
+    query, args, where_clauses = build_transactions_query(request.args, expand, selected)
+    if 'after' in request.args:
+        after = decode_cursor(request.args['after'], key_columns)
+        if after is None:
+            return jsonify({'message': 'Invalid cursor'}), 400
+        comparison = '>' if order == 'asc' else '<'
+        keyset = f"({', '.join(f'transactions.{column}' for column in key_columns)}) {comparison} ({', '.join('?' * len(key_columns))})"
+        query += (' AND ' if where_clauses else ' WHERE ') + keyset
+        args.extend(after)
+
+    direction = 'ASC' if order == 'asc' else 'DESC'
+    order_columns = [f'transactions.{column}' for column in key_columns]
+    if sort == 'transaction_id' and 'after' not in request.args and ({'start_date', 'end_date'} & request.args.keys()):
+        # Without a cursor to seek from, SQLite would rather walk the whole table in rowid
+        # order than sort the rows found through the date index; the unary + rules that out.
+        order_columns = ['+transactions.transaction_id']
+    query += ' ORDER BY ' + ', '.join(f'{column} {direction}' for column in order_columns)
+
+    list_format = 'compact' if output_format == 'compact' else 'json'
+    if limit is None:
+        # Unpaginated: optionally stream rows straight from the cursor
+        if output_format in _FORMAT_MIMETYPES:
+            return _stream_transactions(query, args, output_format)
+        return jsonify(list_payload(*query_db(current_app, query, args, columns=True), list_format))
+
+    # Fetch one extra row to learn whether another page follows
+    query += ' LIMIT ?'
+    args.append(limit + 1)
+    columns, transactions = query_db(current_app, query, args, columns=True)
+    rows = transactions[:limit]
+    headers = {}
+    if len(transactions) > limit:
+        cursor = encode_cursor([rows[-1][columns.index(column)] for column in key_columns])
+        next_args = request.args.to_dict()
+        next_args['after'] = cursor
+        headers['X-Next-Cursor'] = cursor
+        headers['Link'] = f'<{request.base_url}?{urlencode(next_args)}>; rel="next"'
+    if selected != fields:
+        # The sort key columns come last and were only read for the cursor
+        columns, rows = columns[:len(fields)], [row[:len(fields)] for row in rows]
+
+    # A page is bounded by the limit, so there is nothing to gain from streaming it
+    if output_format == 'ndjson':
+        body = ''.join(current_app.json.dumps(transaction) + '\n' for transaction in list_payload(columns, rows))
+        return Response(body, 200, headers, mimetype=_FORMAT_MIMETYPES['ndjson'])
+    return jsonify(list_payload(columns, rows, list_format)), 200, headers
 
-    transactions = query_db(current_app, query, args)
-    return jsonify([dict(transaction) for transaction in transactions])
+def _stream_transactions(query, args, output_format):
+    dumps = current_app.json.dumps
+    rows = iter_query(current_app, query, args)
+
+    def generate_ndjson():
+        for row in rows:
+            yield dumps(dict(row)) + '\n'
+
+    def generate_json_array():
+        # A JSON array written element by element; valid JSON once the stream completes
+        yield '['
+        separator = ''
+        for row in rows:
+            yield separator + dumps(dict(row))
+            separator = ','
+        yield ']'
+
+    generate = generate_ndjson if output_format == 'ndjson' else generate_json_array
+    return Response(stream_with_context(generate()), mimetype=_FORMAT_MIMETYPES[output_format])
 
 @transactions_bp.route('/<int:transaction_id>', methods=['GET'])
 @token_required
 def get_transaction(transaction_id):
-    transaction = query_db(current_app, 'SELECT * FROM transactions WHERE transaction_id = ?', [transaction_id], one=True)
+    expand = parse_expand(request.args)
+    if expand is None:
+        return jsonify({'message': 'Invalid expand'}), 400
+    query, args, _ = build_transactions_query({}, expand)
+    transaction = query_db(current_app, query + ' WHERE transactions.transaction_id = ?', args + [transaction_id], one=True)
     if not transaction:
         return jsonify({'message': 'Transaction not found'}), 404
     return jsonify(dict(transaction))
@@ -56,33 +244,188 @@ def create_transaction():
     if data['transaction_type'] not in ['Delivery', 'Pull-out', 'Sale', 'Return']:
         return jsonify({'message': 'Invalid transaction type'}), 400
 
-    # Check if product_id exists
-    product = query_db(current_app, 'SELECT * FROM products WHERE product_id = ?', [data['product_id']], one=True)
-    if not product:
-        return jsonify({'message': 'Invalid product_id'}), 400
-
-    #Check if user_id exists
-    user = query_db(current_app, 'SELECT * FROM users WHERE user_id=?', [data['user_id']], one=True)
-    if not user:
-        return jsonify({'message':'Invalid user_id'}), 400
+    if not valid_transaction_date(data['transaction_date']):
+        return jsonify({'message': 'Invalid transaction_date'}), 400
 
     # Validate supplier_id for Delivery and Pull-out
     supplier_id = data.get('supplier_id')
-    if data['transaction_type'] in ('Delivery', 'Pull-out'):
-        if supplier_id is None:
-            return jsonify({'message': 'supplier_id is required for Delivery and Pull-out transactions'}), 400
-        supplier = query_db(current_app, 'SELECT * FROM suppliers WHERE supplier_id=?',[supplier_id], one=True)
-        if not supplier:
+    if data['transaction_type'] in ('Delivery', 'Pull-out') and supplier_id is None:
+        return jsonify({'message': 'supplier_id is required for Delivery and Pull-out transactions'}), 400
+
+    # One statement: the product lookup (sales and returns take its selling_price) and the
+    # insert. user_id and supplier_id are checked by their foreign keys, and the stock
+    # triggers run inside the same statement.
+    query = '''
+        INSERT INTO transactions (product_id, transaction_type, quantity, transaction_date, supplier_id, user_id, price)
+        SELECT product_id, ?, ?, ?, ?, ?, CASE WHEN ? IN ('Sale', 'Return') THEN selling_price END
+        FROM products WHERE product_id = ?
+        RETURNING *
+    '''
+    args = [data['transaction_type'], data['quantity'], data['transaction_date'], supplier_id, data['user_id'],
+            data['transaction_type'], data['product_id']]
+    writer = get_group_commit(current_app)
+    try:
+        if writer is None:
+            new_transaction = execute_returning(current_app, query, args)
+        else:
+            # Shares a commit with concurrent sales; returns once that commit is durable
+            future = writer.submit(query, args)
+            try:
+                new_transaction = future.result(timeout=current_app.config['TRANSACTION_GROUP_COMMIT_TIMEOUT'])
+            except TimeoutError:
+                if future.cancel():
+                    # Withdrawn before the writer took it, so nothing was recorded
+                    return jsonify({'message': 'The transaction could not be committed in time, please retry'}), 503, {'Retry-After': '1'}
+                return jsonify({'message': 'The transaction is still being committed, check the ledger before retrying'}), 503
+    except sqlite3.IntegrityError as e:
+        if 'FOREIGN KEY constraint failed' in str(e):
+            if not query_db(current_app, 'SELECT 1 FROM users WHERE user_id = ?', [data['user_id']], one=True):
+                return jsonify({'message':'Invalid user_id'}), 400
             return jsonify({'message':'Invalid supplier_id'}), 400
+        if 'stock_on_hand' in str(e):
+            return jsonify({'message': 'Insufficient stock'}), 400
+        raise
+    if not new_transaction:
+        return jsonify({'message': 'Invalid product_id'}), 400
+    return jsonify(dict(new_transaction)), 201
 
-    # For sales and returns, use selling_price from products table.
-    price = None
-    if data['transaction_type'] in ('Sale', 'Return'):
-        price = product['selling_price']
+TRANSACTION_TYPES = ('Delivery', 'Pull-out', 'Sale', 'Return')
+DATE_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}')
 
-    transaction_id = execute_query(current_app, '''
-        INSERT INTO transactions (product_id, transaction_type, quantity, transaction_date, supplier_id, user_id, price)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', [data['product_id'], data['transaction_type'], data['quantity'], data['transaction_date'], supplier_id, data['user_id'], price])
-    new_transaction = query_db(current_app, 'SELECT * FROM transactions WHERE transaction_id = ?', [transaction_id], one=True)
-    return jsonify(dict(new_transaction)), 201
\ No newline at end of file
+def valid_transaction_date(value):
+    # A real YYYY-MM-DD day, optionally followed by an ISO 8601 time: the reports group
+    # transactions by the first ten characters
+    if not isinstance(value, str) or not DATE_PATTERN.match(value):
+        return False
+    try:
+        datetime.fromisoformat(value)
+    except ValueError:
+        return False
+    return True
+
+def _stock_delta(transaction_type, quantity):
+    # Mirrors the update_stock_on_hand_insert trigger
+    return quantity if transaction_type == 'Delivery' else -quantity
+
+def _is_id(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def _select_existing(query, ids):
+    ids = list(ids)
+    if not ids:
+        return []
+    placeholders, args = in_list(ids)
+    return query_db(current_app, query.format(placeholders=placeholders), args)
+
+@transactions_bp.route('/batch', methods=['POST'])
+@token_required
+def create_transactions_batch():
+    data = request.json
+    if not isinstance(data, list) or not data:
+        return jsonify({'message': 'Expected a non-empty list of transactions'}), 400
+    if len(data) > current_app.config['TRANSACTION_BATCH_LIMIT']:
+        return jsonify({'message': f"Batch exceeds the limit of {current_app.config['TRANSACTION_BATCH_LIMIT']} transactions"}), 400
+
+    required_fields = ['product_id', 'transaction_type', 'quantity', 'transaction_date', 'user_id']
+    rows = [row if isinstance(row, dict) else {} for row in data]
+
+    # Validation and insert share one write transaction, so the preloaded ids and stock
+    # levels cannot go stale before the rows are written. A locked database reruns it
+    # from the start, or answers 503 once the retries are used up.
+    results, created = run_in_transaction(current_app, lambda: _insert_batch(rows, required_fields))
+    failed = len(results) - created
+    if not failed:
+        status = 201
+    elif created:
+        status = 207  # Multi-Status: some rows were rejected
+    else:
+        status = 400
+    return jsonify({'created': created, 'failed': failed, 'results': results}), status
+
+def _insert_batch(rows, required_fields):
+    # Returns the per-row results and how many rows were inserted
+    products = {
+        product['product_id']: product
+        for product in _select_existing(
+            'SELECT product_id, selling_price, stock_on_hand FROM products WHERE product_id IN ({placeholders})',
+            {row['product_id'] for row in rows if _is_id(row.get('product_id'))})
+    }
+    user_ids = {
+        user['user_id']
+        for user in _select_existing(
+            'SELECT user_id FROM users WHERE user_id IN ({placeholders})',
+            {row['user_id'] for row in rows if _is_id(row.get('user_id'))})
+    }
+    supplier_ids = {
+        supplier['supplier_id']
+        for supplier in _select_existing(
+            'SELECT supplier_id FROM suppliers WHERE supplier_id IN ({placeholders})',
+            {row['supplier_id'] for row in rows if _is_id(row.get('supplier_id'))})
+    }
+
+    results = []
+    accepted = []
+    stock = {product_id: product['stock_on_hand'] for product_id, product in products.items()}
+    deltas = {}
+    for index, row in enumerate(rows):
+        error = None
+        supplier_id = row.get('supplier_id')
+        quantity = row.get('quantity')
+        if not all(field in row for field in required_fields):
+            error = 'Missing required fields'
+        elif row['transaction_type'] not in TRANSACTION_TYPES:
+            error = 'Invalid transaction type'
+        elif isinstance(quantity, bool) or not isinstance(quantity, (int, float)):
+            error = 'Invalid quantity'
+        elif not valid_transaction_date(row['transaction_date']):
+            error = 'Invalid transaction_date'
+        elif not _is_id(row['product_id']) or row['product_id'] not in products:
+            error = 'Invalid product_id'
+        elif not _is_id(row['user_id']) or row['user_id'] not in user_ids:
+            error = 'Invalid user_id'
+        elif row['transaction_type'] in ('Delivery', 'Pull-out') and supplier_id is None:
+            error = 'supplier_id is required for Delivery and Pull-out transactions'
+        elif supplier_id is not None and (not _is_id(supplier_id) or supplier_id not in supplier_ids):
+            error = 'Invalid supplier_id'
+        else:
+            delta = _stock_delta(row['transaction_type'], quantity)
+            if stock[row['product_id']] + delta < 0:
+                error = 'Insufficient stock'
+
+        if error:
+            results.append({'index': index, 'status': 400, 'message': error})
+            continue
+
+        product_id = row['product_id']
+        stock[product_id] += delta
+        deltas[product_id] = deltas.get(product_id, 0) + delta
+        # For sales and returns, use selling_price from products table.
+        price = products[product_id]['selling_price'] if row['transaction_type'] in ('Sale', 'Return') else None
+        accepted.append((index, {
+            'product_id': product_id,
+            'transaction_type': row['transaction_type'],
+            'quantity': quantity,
+            'transaction_date': row['transaction_date'],
+            'supplier_id': supplier_id,
+            'user_id': row['user_id'],
+            'price': price,
+        }))
+        results.append(None)
+
+    if accepted:
+        # Suspend the per-row stock trigger and apply one UPDATE per product instead.
+        execute_in_transaction(current_app, 'UPDATE stock_trigger_control SET deferred = 1 WHERE control_id = 1')
+        execute_in_transaction(current_app, '''
+            INSERT INTO transactions (product_id, transaction_type, quantity, transaction_date, supplier_id, user_id, price)
+            VALUES (:product_id, :transaction_type, :quantity, :transaction_date, :supplier_id, :user_id, :price)
+        ''', [transaction for _, transaction in accepted], many=True)
+        execute_in_transaction(current_app, 'UPDATE products SET stock_on_hand = stock_on_hand + ? WHERE product_id = ?',
+                               [(delta, product_id) for product_id, delta in deltas.items()], many=True)
+        execute_in_transaction(current_app, 'UPDATE stock_trigger_control SET deferred = 0 WHERE control_id = 1')
+        # AUTOINCREMENT ids are consecutive while this transaction holds the write lock.
+        last_id = query_db(current_app, "SELECT seq FROM sqlite_sequence WHERE name = 'transactions'", one=True)[0]
+        first_id = last_id - len(accepted) + 1
+        for offset, (index, transaction) in enumerate(accepted):
+            results[index] = {'index': index, 'status': 201,
+                              'transaction': {'transaction_id': first_id + offset, **transaction}}
+    return results, len(accepted)
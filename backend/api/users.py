@@ -1,7 +1,8 @@
 from flask import Blueprint, request, jsonify, g, current_app
 import jwt
-from core.auth import token_required, role_required, generate_auth_token, verify_password, hash_password
+from core.auth import token_required, role_required, generate_auth_token, invalidate_cached_user
 from core.database import query_db, execute_query
+from core.hashing import get_password_hasher
 
 from core.auth import verify_refresh_token
 
@@ -27,7 +28,7 @@ def login():
     if not user:
         return jsonify({"message": "User not found"}), 404
 
-    if verify_password(bytes.fromhex(user["password"]), auth["password"]):
+    if get_password_hasher(current_app).verify(bytes.fromhex(user["password"]), auth["password"]):
         access_token = generate_auth_token(current_app, user["user_id"], 'access')
         refresh_token_string = generate_auth_token(current_app, user["user_id"], 'refresh') # Generate refresh token string
         execute_query(current_app, 'UPDATE users SET refresh_token = ? WHERE user_id = ?', [refresh_token_string, user['user_id']]) # Store refresh token in db
@@ -89,7 +90,7 @@ def create_user():
     if data['role'] not in ['Administrator', 'Manager', 'Staff']:
         return jsonify({'message': 'Invalid role'}), 400
 
-    hashed_password = hash_password(data['password']).hex()  # Store as hex string
+    hashed_password = get_password_hasher(current_app).hash(data['password']).hex()  # Store as hex string
     user_id = execute_query(current_app, 'INSERT INTO users (username, password, role) VALUES (?, ?, ?)',
                            [data['username'], hashed_password, data['role']])
 
@@ -111,9 +112,10 @@ def update_user(user_id):
     if data['role'] not in ['Administrator', 'Manager', 'Staff']:
          return jsonify({'message': 'Invalid role'}), 400
 
-    hashed_password = hash_password(data['password']).hex()
+    hashed_password = get_password_hasher(current_app).hash(data['password']).hex()
     execute_query(current_app, 'UPDATE users SET username = ?, password = ?, role = ?, is_active = ? WHERE user_id = ?',
                   [data['username'], hashed_password, data['role'], data['is_active'], user_id])
+    invalidate_cached_user(current_app, user_id)
 
     updated_user = query_db(current_app, 'SELECT user_id, username, role, is_active FROM users WHERE user_id = ?', [user_id], one=True)
 
@@ -137,7 +139,7 @@ def partial_update_user(user_id):
         if field in data:
             if field == 'password':
                 updates.append(f'{field} = ?')
-                args.append(hash_password(data[field]).hex())
+                args.append(get_password_hasher(current_app).hash(data[field]).hex())
             elif field == 'role' and data['role'] not in ['Administrator', 'Manager', 'Staff']:
                 return jsonify({'message': 'Invalid role'}),400
             else:
@@ -150,6 +152,7 @@ def partial_update_user(user_id):
     args.append(user_id)
     query = f'UPDATE users SET {", ".join(updates)} WHERE user_id = ?'
     execute_query(current_app, query, args)
+    invalidate_cached_user(current_app, user_id)
 
     updated_user = query_db(current_app, 'SELECT user_id, username, role, is_active FROM users WHERE user_id = ?', [user_id], one=True)
     if not updated_user:
@@ -161,4 +164,5 @@ def partial_update_user(user_id):
 def delete_user(user_id):
     # Soft delete (set is_active to 0)
     execute_query(current_app, 'UPDATE users SET is_active = 0 WHERE user_id = ?', [user_id])
+    invalidate_cached_user(current_app, user_id)
     return jsonify({'message': 'User deactivated'}), 204
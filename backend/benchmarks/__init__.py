@@ -0,0 +1 @@
+# Package initialization file for benchmarks module
\ No newline at end of file
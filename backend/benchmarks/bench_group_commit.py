@@ -0,0 +1,71 @@
+"""Throughput and latency of POST /api/v1/transactions with and without group commit.
+
+Each till is a thread posting one-unit sales back to back through its own test
+client for a fixed time. "off" commits every sale on its request thread; the
+other rows route the insert through the group-commit writer with the given
+TRANSACTION_GROUP_COMMIT_ROWS / TRANSACTION_GROUP_COMMIT_MS. The default
+wal-durable storage profile fsyncs every commit, which is the cost group
+commit shares between sales.
+
+Usage (from backend/):
+    python -m benchmarks.bench_group_commit --tills 16 --duration 5
+"""
+import argparse
+import threading
+import time
+
+from benchmarks.bench_write_paths import seed
+from benchmarks.common import bench_app, summarize, temp_database
+from core.auth import generate_auth_token
+
+SETTINGS = [None, (8, 0), (32, 1), (64, 2), (64, 5)]
+
+def till(client, headers, number, duration, latencies, failures):
+    sale = {'product_id': number % 1000 + 1, 'transaction_type': 'Sale', 'quantity': 1,
+            'transaction_date': '2025-06-01T10:00:00', 'user_id': 1}
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        start = time.perf_counter()
+        response = client.post('/api/v1/transactions', json=sale, headers=headers)
+        latencies.append(time.perf_counter() - start)
+        if response.status_code != 201:
+            failures.append(response.status_code)
+
+def run(setting, profile, tills, duration):
+    config = {'DATABASE_STORAGE_PROFILE': profile, 'DATABASE_POOL_SIZE': tills}
+    if setting is not None:
+        config.update(TRANSACTION_GROUP_COMMIT=True, TRANSACTION_GROUP_COMMIT_ROWS=setting[0],
+                      TRANSACTION_GROUP_COMMIT_MS=setting[1])
+    with temp_database() as db_path:
+        seed(db_path)
+        with bench_app(db_path, **config) as app:
+            with app.app_context():
+                headers = {'Authorization': f'Bearer {generate_auth_token(app, 1)}'}
+            latencies, failures = [], []
+            threads = [threading.Thread(target=till, args=(app.test_client(), headers, number, duration, latencies, failures))
+                       for number in range(tills)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            writer = app.extensions.get('group_commit')
+            rows_per_commit = writer.stats()['rows_per_batch'] if writer is not None else 1.0
+    return len(latencies) / duration, rows_per_commit, len(failures), summarize(latencies)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tills', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--profile', default='wal-durable', help='storage profile (wal, wal-durable, rollback)')
+    args = parser.parse_args()
+
+    print(f'{args.tills} tills, {args.duration:.0f} s per setting, {args.profile} storage profile')
+    print(f"{'group commit':<16}{'sales/s':>9}{'rows/commit':>13}{'failed':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for setting in SETTINGS:
+        label = 'off' if setting is None else f'{setting[0]} rows/{setting[1]} ms'
+        throughput, rows_per_commit, failed, summary = run(setting, args.profile, args.tills, args.duration)
+        print(f"{label:<16}{throughput:>9.0f}{rows_per_commit:>13.1f}{failed:>8}"
+              f"{summary['p50']:>9.2f}{summary['p95']:>9.2f}{summary['p99']:>9.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Cost of turning large list results into JSON responses.
+
+Serves GET /products (the whole catalog, with the response cache off) and a
+1000-row page of GET /transactions through the test client, with Flask's stdlib
+JSON provider and with orjson, each as an array of objects and in the compact
+columns + rows format. Then times the conversion alone on the product rows:
+the former path (dict per sqlite3.Row, stdlib encoder) against the current
+ones. The best of several rounds is reported.
+
+Usage (from backend/):
+    python -m benchmarks.bench_json_serialization --products 20000 --rounds 5
+"""
+import argparse
+import json
+import sqlite3
+import time
+
+from benchmarks.common import bench_app, temp_database
+from benchmarks.dataset import generate_dataset
+from core.auth import generate_auth_token
+from core.json_provider import list_payload, orjson
+
+ENDPOINTS = [
+    ('products', '/api/v1/products'),
+    ('transactions', '/api/v1/transactions?limit=1000&sort=transaction_date&order=desc'),
+]
+
+def best_of(rounds, function):
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def end_to_end(db_path, provider, rounds):
+    results = {}
+    with bench_app(db_path, RESPONSE_CACHE_BYTES=0, JSON_PROVIDER=provider) as app:
+        with app.app_context():
+            headers = {'Authorization': f'Bearer {generate_auth_token(app, 1)}'}
+        client = app.test_client()
+        for name, url in ENDPOINTS:
+            for list_format in ('json', 'compact'):
+                full_url = f"{url}{'&' if '?' in url else '?'}format={list_format}"
+                size = len(client.get(full_url, headers=headers).get_data())
+
+                def fetch():
+                    response = client.get(full_url, headers=headers)
+                    assert response.status_code == 200, full_url
+                    response.get_data()
+                results[name, list_format] = (best_of(rounds, fetch), size)
+    return results
+
+def conversion_only(db_path, rounds):
+    db = sqlite3.connect(db_path)
+    db.row_factory = sqlite3.Row
+    rows = db.execute('SELECT * FROM products').fetchall()
+    cursor = db.execute('SELECT * FROM products')
+    cursor.row_factory = None
+    tuples = cursor.fetchall()
+    columns = tuple(column[0] for column in cursor.description)
+    db.close()
+
+    paths = [('dict(Row) + json (former)', lambda: json.dumps([dict(row) for row in rows], sort_keys=True))]
+    if orjson is not None:
+        paths.append(('zip + orjson', lambda: orjson.dumps(list_payload(columns, tuples), option=orjson.OPT_SORT_KEYS)))
+        paths.append(('compact + orjson', lambda: orjson.dumps(list_payload(columns, tuples, 'compact'))))
+    paths.append(('zip + json', lambda: json.dumps(list_payload(columns, tuples), sort_keys=True)))
+    paths.append(('compact + json', lambda: json.dumps(list_payload(columns, tuples, 'compact'))))
+    return len(rows), [(label, best_of(rounds, function)) for label, function in paths]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=20000)
+    parser.add_argument('--transactions', type=int, default=200000)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    providers = ['default'] + (['orjson'] if orjson is not None else [])
+    with temp_database() as db_path:
+        generate_dataset(db_path, products=args.products, transactions=args.transactions)
+        results = {provider: end_to_end(db_path, provider, args.rounds) for provider in providers}
+        count, conversions = conversion_only(db_path, args.rounds)
+
+    print(f'Best of {args.rounds} rounds')
+    print(f"{'endpoint':<14}{'format':<9}{'bytes':>10}" + ''.join(f'{provider + " ms":>13}' for provider in providers))
+    for name, _ in ENDPOINTS:
+        for list_format in ('json', 'compact'):
+            size = results['default'][name, list_format][1]
+            print(f'{name:<14}{list_format:<9}{size:>10}'
+                  + ''.join(f'{results[provider][name, list_format][0] * 1000:>13.1f}' for provider in providers))
+    print(f'\n{count} product rows to JSON, without HTTP')
+    for label, elapsed in conversions:
+        print(f'{label:<28}{elapsed * 1000:>8.1f} ms')
+
+if __name__ == '__main__':
+    main()
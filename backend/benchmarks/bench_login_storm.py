@@ -0,0 +1,99 @@
+"""Latency of non-login endpoints during a shift-change login storm.
+
+For each hasher configuration, probe threads repeatedly call GET
+/api/v1/products and GET /api/v1/categories, first on an idle server and
+then while storm threads log in as fast as they can. "inline" hashes on
+the request thread, as the server did before the hashing pool existed.
+
+Usage (from backend/):
+    python -m benchmarks.bench_login_storm --logins 40 --duration 5
+"""
+import argparse
+import sqlite3
+import threading
+import time
+
+from benchmarks.common import bench_app, summarize, temp_database
+from core.auth import generate_auth_token, hash_password
+from core.database import init_db
+
+CONFIGURATIONS = {
+    'inline': {'PASSWORD_HASHER_WORKERS': 0, 'PASSWORD_HASHER_QUEUE_SIZE': 1000},
+    'thread-1': {'PASSWORD_HASHER_EXECUTOR': 'thread', 'PASSWORD_HASHER_WORKERS': 1},
+    'thread-2': {'PASSWORD_HASHER_EXECUTOR': 'thread', 'PASSWORD_HASHER_WORKERS': 2},
+    'process-2': {'PASSWORD_HASHER_EXECUTOR': 'process', 'PASSWORD_HASHER_WORKERS': 2},
+}
+
+def seed(db_path, users):
+    db = sqlite3.connect(db_path)
+    init_db(db)
+    password = hash_password('storm-password').hex()
+    db.executemany('INSERT INTO users (username, password, role) VALUES (?, ?, ?)',
+                   [(f'staff{i}', password, 'Staff') for i in range(users)])
+    db.execute("INSERT INTO suppliers (name) VALUES ('Bench Supplier')")
+    db.executemany(
+        'INSERT INTO products (item_code, name, supplier_id, category_id, unit_cost, selling_price, is_vat_exempt) '
+        'VALUES (?, ?, 1, 1, 10, 15, 0)',
+        [(f'BENCH{i:05d}', f'Bench Product {i}') for i in range(200)])
+    db.commit()
+    db.close()
+
+def run_phase(app, token, probes, logins, duration):
+    stop = threading.Event()
+    latencies = []
+    login_statuses = {}
+    lock = threading.Lock()
+
+    def probe():
+        client = app.test_client()
+        urls = ['/api/v1/products?is_active=1', '/api/v1/categories']
+        i = 0
+        while not stop.is_set():
+            i += 1
+            start = time.perf_counter()
+            client.get(urls[i % len(urls)], headers={'Authorization': f'Bearer {token}'})
+            latencies.append(time.perf_counter() - start)
+
+    def login(n):
+        client = app.test_client()
+        while not stop.is_set():
+            response = client.post('/api/v1/users/login', json={'username': f'staff{n}', 'password': 'storm-password'})
+            with lock:
+                login_statuses[response.status_code] = login_statuses.get(response.status_code, 0) + 1
+
+    threads = [threading.Thread(target=probe) for _ in range(probes)]
+    threads += [threading.Thread(target=login, args=(n,)) for n in range(logins)]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return {**summarize(latencies), 'logins': login_statuses}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--logins', type=int, default=40, help='Concurrent login threads')
+    parser.add_argument('--probes', type=int, default=4, help='Concurrent non-login threads')
+    parser.add_argument('--duration', type=float, default=5.0, help='Seconds per phase')
+    parser.add_argument('--configs', nargs='+', default=list(CONFIGURATIONS), choices=list(CONFIGURATIONS))
+    args = parser.parse_args()
+
+    results = {}
+    with temp_database() as db_path:
+        seed(db_path, args.logins)
+        for name in args.configs:
+            with bench_app(db_path, DATABASE_POOL_SIZE=args.logins + args.probes + 2, **CONFIGURATIONS[name]) as app:
+                with app.app_context():
+                    token = generate_auth_token(app, 1)
+                results[name] = (run_phase(app, token, args.probes, 0, args.duration),
+                                 run_phase(app, token, args.probes, args.logins, args.duration))
+
+    print(f"{'hasher':<12}{'phase':<14}{'requests':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}  logins by status")
+    for name, (idle, storm) in results.items():
+        for phase, result in (('idle', idle), (f'{args.logins} logins', storm)):
+            print(f"{name:<12}{phase:<14}{result['count']:>10}{result['p50']:>10.2f}{result['p95']:>10.2f}"
+                  f"{result['p99']:>10.2f}{result['max']:>10.2f}  {result['logins']}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Cost of the instrumentation layer per request.
+
+Replays one read-mostly request mix (barcode lookups, transaction pages,
+product searches and a short sales report) through the test client with
+instrumentation off, with METRICS_ENABLED, and with METRICS_ENABLED plus a
+100 ms slow query threshold. Setups are run in alternating rounds and the
+best round of each is reported, to keep machine noise out of the comparison.
+
+Usage (from backend/):
+    python -m benchmarks.bench_metrics_overhead --requests 5000 --rounds 3
+"""
+import argparse
+import random
+import time
+
+from benchmarks.common import bench_app, temp_database
+from benchmarks.dataset import generate_dataset
+from core.auth import generate_auth_token
+
+SETUPS = [
+    ('off', {}),
+    ('metrics', {'METRICS_ENABLED': True}),
+    ('metrics + slow log', {'METRICS_ENABLED': True, 'SLOW_QUERY_MS': 100}),
+]
+
+def request_mix(count, products, seed=5):
+    rng = random.Random(seed)
+    mix = []
+    for _ in range(count):
+        product_id = rng.randint(1, products)
+        roll = rng.random()
+        if roll < 0.5:
+            mix.append(f'/api/v1/products/by-code/SKU{product_id - 1:07d}')
+        elif roll < 0.8:
+            mix.append(f'/api/v1/transactions?product_id={product_id}&limit=20&order=desc&sort=transaction_date')
+        elif roll < 0.95:
+            mix.append(f"/api/v1/products/search?q=sku{rng.randint(0, 99):02d}&limit=20")
+        else:
+            mix.append('/api/v1/reports/sales?start_date=2024-06-01&end_date=2024-06-02')
+    return mix
+
+def run(db_path, config, mix):
+    with bench_app(db_path, RESPONSE_CACHE_BYTES=0, **config) as app:
+        with app.app_context():
+            headers = {'Authorization': f'Bearer {generate_auth_token(app, 1)}'}
+        client = app.test_client()
+        for url in mix[:200]:  # Warm the connection, statement and product caches
+            client.get(url, headers=headers)
+        start = time.perf_counter()
+        for url in mix:
+            response = client.get(url, headers=headers)
+            assert response.status_code == 200, url
+        return (time.perf_counter() - start) / len(mix)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--transactions', type=int, default=100000)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    mix = request_mix(args.requests, args.products)
+    best = {label: float('inf') for label, _ in SETUPS}
+    with temp_database() as db_path:
+        generate_dataset(db_path, products=args.products, transactions=args.transactions)
+        for _ in range(args.rounds):
+            for label, config in SETUPS:
+                best[label] = min(best[label], run(db_path, config, mix))
+
+    baseline = best['off']
+    print(f'{args.requests} requests per round, best of {args.rounds} rounds')
+    print(f"{'instrumentation':<22}{'us/request':>12}{'overhead':>10}")
+    for label, _ in SETUPS:
+        print(f'{label:<22}{best[label] * 1e6:>12.0f}{(best[label] - baseline) / baseline:>10.1%}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""Latency of checkout traffic while reports and exports run, with and without concurrency limits.
+
+Starts waitress through wsgi.py with WEB_THREADS request threads on a generated
+store. Checkout clients scan a barcode and post a one-unit sale, back to back,
+while heavy clients keep requesting a full-year sales report and a CSV export of
+the transaction history. Each configuration runs for a fixed time; "limits off"
+sets REPORT_CONCURRENCY and EXPORT_CONCURRENCY to 0. Rejected heavy requests
+(429) are counted separately and retried by their client after Retry-After.
+
+Usage (from backend/):
+    python -m benchmarks.bench_mixed_workload --checkout-clients 4 --heavy-clients 6 --duration 15
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_wsgi_scaling import BACKEND, free_port, wait_until_up
+from benchmarks.common import bench_app, summarize
+from benchmarks.dataset import generate_dataset
+from core.auth import generate_auth_token
+
+HEAVY_URLS = [
+    '/api/v1/reports/sales?start_date=2024-01-01&end_date=2024-12-31',
+    '/api/v1/reports/transaction-history/export?format=csv&start_date=2024-01-01&end_date=2024-03-31',
+]
+
+def checkout_client(port, token, products, duration, seed, results):
+    rng = random.Random(seed)
+    headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+    scans, sales = [], []
+    errors = 0
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        product_id = rng.randint(1, products)
+        body = json.dumps({'product_id': product_id, 'transaction_type': 'Sale', 'quantity': 1,
+                           'transaction_date': '2024-12-31T12:00:00', 'user_id': 1})
+        for samples, method, url, payload in ((scans, 'GET', f'/api/v1/products/by-code/SKU{product_id - 1:07d}', None),
+                                              (sales, 'POST', '/api/v1/transactions', body)):
+            start = time.perf_counter()
+            try:
+                conn.request(method, url, body=payload, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                if response.status >= 500:
+                    errors += 1
+            except (OSError, http.client.HTTPException):
+                errors += 1
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+            samples.append(time.perf_counter() - start)
+    conn.close()
+    results.put(('checkout', scans, sales, errors, 0))
+
+def heavy_client(port, token, duration, seed, results):
+    rng = random.Random(seed)
+    headers = {'Authorization': f'Bearer {token}'}
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+    completed, rejected, errors = [], 0, 0
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        start = time.perf_counter()
+        try:
+            conn.request('GET', rng.choice(HEAVY_URLS), headers=headers)
+            response = conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+            continue
+        if response.status == 429:
+            rejected += 1
+            time.sleep(float(response.getheader('Retry-After', 1)))
+        elif response.status >= 500:
+            errors += 1
+        else:
+            completed.append(time.perf_counter() - start)
+    conn.close()
+    results.put(('heavy', completed, [], errors, rejected))
+
+def drive(port, token, products, checkout_clients, heavy_clients, duration):
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=checkout_client, args=(port, token, products, duration, seed, results))
+                 for seed in range(checkout_clients)]
+    processes += [multiprocessing.Process(target=heavy_client, args=(port, token, duration, 1000 + seed, results))
+                  for seed in range(heavy_clients)]
+    for process in processes:
+        process.start()
+    scans, sales, heavy = [], [], []
+    errors = rejected = 0
+    for _ in processes:
+        kind, first, second, failed, turned_away = results.get()
+        if kind == 'checkout':
+            scans.extend(first)
+            sales.extend(second)
+        else:
+            heavy.extend(first)
+        errors += failed
+        rejected += turned_away
+    for process in processes:
+        process.join()
+    return scans, sales, heavy, errors, rejected
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--transactions', type=int, default=300000)
+    parser.add_argument('--checkout-clients', type=int, default=4)
+    parser.add_argument('--heavy-clients', type=int, default=6)
+    parser.add_argument('--threads', type=int, default=4, help='WEB_THREADS of the server')
+    parser.add_argument('--duration', type=float, default=15.0)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    try:
+        # create_app opens inventory.db in the working directory
+        db_path = os.path.join(workdir, 'inventory.db')
+        print(f'Generating {args.transactions} transactions...', file=sys.stderr)
+        generate_dataset(db_path, products=args.products, transactions=args.transactions)
+        with bench_app(db_path) as app, app.app_context():
+            token = generate_auth_token(app, 1)
+        env = {**os.environ, 'SECRET_KEY': 'bench', 'JWT_SECRET_KEY': 'bench', 'WEB_THREADS': str(args.threads),
+               'PYTHONPATH': BACKEND + os.pathsep + os.environ.get('PYTHONPATH', '')}
+
+        rows = []
+        port = free_port()
+        for label, limits in (('limits off', {'REPORT_CONCURRENCY': '0', 'EXPORT_CONCURRENCY': '0'}),
+                              ('limits on (default)', {})):
+            server = subprocess.Popen([sys.executable, os.path.join(BACKEND, 'wsgi.py')], cwd=workdir,
+                                      env={**env, **limits, 'BIND': f'127.0.0.1:{port}'},
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                wait_until_up(port, server)
+                rows.append((label, *drive(port, token, args.products, args.checkout_clients, args.heavy_clients,
+                                           args.duration)))
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f'{os.cpu_count() or 1} CPU core(s), {args.threads} server threads, {args.checkout_clients} checkout and '
+          f'{args.heavy_clients} heavy clients, {args.duration:.0f} s per configuration')
+    print(f"{'configuration':<22}{'checkouts/s':>12}{'scan p50':>10}{'scan p99':>10}{'sale p50':>10}{'sale p99':>10}"
+          f"{'heavy/s':>9}{'429s':>7}{'errors':>8}")
+    for label, scans, sales, heavy, errors, rejected in rows:
+        scan, sale = summarize(scans), summarize(sales)
+        print(f"{label:<22}{len(sales) / args.duration:>12.1f}{scan['p50']:>10.1f}{scan['p99']:>10.1f}"
+              f"{sale['p50']:>10.1f}{sale['p99']:>10.1f}{len(heavy) / args.duration:>9.2f}{rejected:>7}{errors:>8}")
+    print('latencies in ms')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""Server time per barcode scan: the generic product filter vs the by-code index.
+
+Scans pick item codes at random from the seeded catalog. "filter" is
+GET /api/v1/products?item_code=..., "by-code" is GET /api/v1/products/by-code/...,
+and "batch" looks up --batch codes in one POST /api/v1/products/by-code (the
+time reported is per code). Times are measured inside the app, from
+before_request to after_request: authentication, the lookup and JSON
+serialization, without the test client's own overhead.
+
+A second table times a single code without HTTP: one query on the UNIQUE
+item_code index against lookup_products, with the catalog version read on
+every scan and with the default time-bounded version check.
+
+Usage (from backend/):
+    python -m benchmarks.bench_product_lookup --products 5000 --scans 5000
+"""
+import argparse
+import random
+import time
+
+from flask import g
+
+from benchmarks.common import bench_app, summarize, temp_database
+from benchmarks.dataset import generate_dataset
+from core.auth import generate_auth_token
+from core.database import query_db
+from core.product_index import get_product_index, lookup_products
+
+def single_code(app, codes):
+    def by_unique_index(code):
+        row = query_db(app, 'SELECT * FROM products WHERE item_code = ? AND is_active = 1', [code], one=True)
+        return {row['item_code']: dict(row)} if row else {}
+
+    index = get_product_index(app)
+    default_check = index.version_check
+
+    def with_check(version_check):
+        def lookup(code):
+            index.version_check = version_check
+            lookup_products(app, [code])
+        return lookup
+
+    paths = [
+        ('item_code = ?', by_unique_index),
+        ('index, version per scan', with_check(0)),
+        ('index, version per interval', with_check(default_check)),
+    ]
+    results = {}
+    with app.app_context():
+        for label, function in paths:
+            function(codes[0])
+            latencies = []
+            for code in codes:
+                start = time.perf_counter()
+                function(code)
+                latencies.append(time.perf_counter() - start)
+            results[label] = summarize(latencies)
+    index.version_check = default_check
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--scans', type=int, default=5000)
+    parser.add_argument('--batch', type=int, default=50, help='Codes per batch lookup')
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    with temp_database() as db_path:
+        generate_dataset(db_path, products=args.products, transactions=args.products * 2)
+        with bench_app(db_path) as app:
+            server_times = []
+
+            @app.before_request
+            def start_timer():
+                g.bench_start = time.perf_counter()
+
+            @app.after_request
+            def stop_timer(response):
+                server_times.append(time.perf_counter() - g.bench_start)
+                return response
+
+            with app.app_context():
+                headers = {'Authorization': f'Bearer {generate_auth_token(app, 1)}'}
+            client = app.test_client()
+            codes = [f'SKU{rng.randrange(args.products):07d}' for _ in range(args.scans)]
+            urls = {
+                'filter': '/api/v1/products?item_code={}',
+                'by-code': '/api/v1/products/by-code/{}',
+            }
+            results = {}
+            for name, url in urls.items():
+                client.get(url.format(codes[0]), headers=headers)
+                server_times.clear()
+                for code in codes:
+                    response = client.get(url.format(code), headers=headers)
+                    assert response.status_code in (200, 404)
+                results[name] = summarize(server_times)
+
+            latencies = []
+            for i in range(0, len(codes), args.batch):
+                chunk = codes[i:i + args.batch]
+                server_times.clear()
+                response = client.post('/api/v1/products/by-code', json={'item_codes': chunk}, headers=headers)
+                assert response.status_code == 200
+                latencies.extend([server_times[0] / len(chunk)] * len(chunk))
+            results[f'batch of {args.batch}'] = summarize(latencies)
+            direct = single_code(app, codes)
+
+    print(f"{'lookup':<16}{'scans':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, result in results.items():
+        print(f"{name:<16}{result['count']:>8}{result['p50']:>10.3f}{result['p95']:>10.3f}{result['p99']:>10.3f}{result['max']:>10.3f}")
+    print(f"\n{'single code, no HTTP':<28}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, result in direct.items():
+        print(f"{name:<28}{result['p50']:>10.4f}{result['p95']:>10.4f}{result['p99']:>10.4f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Product name search: LIKE '%term%' filtering vs the FTS5 search endpoint.
+
+Seeds a catalog of generated school-store products and replays typeahead
+sequences ("p", "po", "pol", "polo", ...) plus a few rare and missing terms
+against GET /api/v1/products?name=... and GET /api/v1/products/search?q=...
+The LIKE path has no limit, as the endpoint has none; "like, limit 20" shows
+the same SQL capped to the search endpoint's default page for comparison.
+
+Usage (from backend/):
+    python -m benchmarks.bench_product_search --products 50000
+"""
+import argparse
+import random
+import sqlite3
+
+import time
+
+from benchmarks.common import bench_app, summarize, temp_database
+from core.auth import generate_auth_token
+from core.database import init_db, query_db
+
+ITEMS = ['Polo', 'Blouse', 'Slacks', 'Skirt', 'PE Shirt', 'Jogging Pants', 'Necktie', 'Notebook', 'Ballpen', 'Pencil',
+         'Crayons', 'Bond Paper', 'Folder', 'Workbook', 'Textbook', 'Lab Gown', 'Calculator', 'Ruler', 'Eraser', 'Backpack']
+QUALIFIERS = ['Grade 1', 'Grade 4', 'Grade 7', 'Grade 10', 'College', 'Senior High', 'Science', 'Mathematics', 'English',
+              'Filipino', 'History', 'Blue', 'White', 'Black', 'Small', 'Medium', 'Large', 'XL', 'Pack of 10', 'Spiral']
+TYPEAHEAD = ['p', 'po', 'pol', 'polo', 'polo l', 'polo lar', 'sci', 'scien', 'science work', 'grade 7 math',
+             'calc', 'xyzzy', 'backpack blue']
+
+def seed(db_path, count, rng):
+    db = sqlite3.connect(db_path)
+    init_db(db)
+    db.execute("INSERT INTO users (username, password, role) VALUES ('bench', '', 'Administrator')")
+    db.execute("INSERT INTO suppliers (name) VALUES ('Bench Supplier')")
+    db.executemany(
+        'INSERT INTO products (item_code, name, description, supplier_id, category_id, unit_cost, selling_price, is_vat_exempt) '
+        'VALUES (?, ?, ?, 1, 1, 10, 15, 0)',
+        [(f'SKU{i:07d}', f'{rng.choice(QUALIFIERS)} {rng.choice(ITEMS)} {rng.choice(QUALIFIERS)}',
+          f'{rng.choice(QUALIFIERS)} edition, batch {i % 97}') for i in range(count)])
+    db.commit()
+    db.close()
+
+def time_requests(client, headers, urls, repeat):
+    latencies = []
+    rows = 0
+    for _ in range(repeat):
+        for url in urls:
+            start = time.perf_counter()
+            response = client.get(url, headers=headers)
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code == 200
+            rows += len(response.get_json())
+    return {**summarize(latencies), 'rows': rows / len(latencies)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with temp_database() as db_path:
+        seed(db_path, args.products, random.Random(11))
+        with bench_app(db_path) as app:
+            with app.app_context():
+                headers = {'Authorization': f'Bearer {generate_auth_token(app, 1)}'}
+            client = app.test_client()
+            # The response cache would answer repeated LIKE requests without running them
+            app.config['RESPONSE_CACHE_BYTES'] = 0
+            app.extensions['response_cache'].max_bytes = 0
+            results = {
+                'like': time_requests(client, headers, [f'/api/v1/products?name={term}' for term in TYPEAHEAD], args.repeat),
+                'search': time_requests(client, headers, [f'/api/v1/products/search?q={term}' for term in TYPEAHEAD], args.repeat),
+            }
+            with app.app_context():
+                latencies = []
+                for _ in range(args.repeat):
+                    for term in TYPEAHEAD:
+                        start = time.perf_counter()
+                        query_db(app, 'SELECT * FROM products WHERE name LIKE ? LIMIT 20', [f'%{term}%'])
+                        latencies.append(time.perf_counter() - start)
+                results['like, limit 20'] = {**summarize(latencies), 'rows': 20}
+
+    print(f"{'path':<16}{'requests':>10}{'avg rows':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for name, result in results.items():
+        print(f"{name:<16}{result['count']:>10}{result['rows']:>10.0f}{result['p50']:>10.2f}{result['p95']:>10.2f}{result['max']:>10.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Stock reconciliation over a large ledger: run time and peak memory.
+
+Overwrites the stock of every Nth product to simulate drift, reconciles with
+several batch sizes (the checkpoint interval), then applies the corrections,
+which restores the original stock. Reconciliation runs and adjustments made
+by the benchmark are deleted again at the end.
+
+Usage (from backend/):
+    python -m benchmarks.bench_reconciliation --database /tmp/bench1m.db
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+import tracemalloc
+
+from benchmarks.common import temp_database
+from benchmarks.dataset import generate_dataset
+from core.database import migrate_db
+from core.reconciliation import apply_reconciliation, run_reconciliation, start_reconciliation
+
+def reconcile(db, batch_size):
+    tracemalloc.start()
+    start = time.perf_counter()
+    run_id = start_reconciliation(db)
+    found = sum(1 for _ in run_reconciliation(db, run_id, batch_size=batch_size))
+    duration = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return run_id, found, duration, peak
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', help='Reuse (or create) this dataset instead of a temporary one')
+    parser.add_argument('--transactions', type=int, default=1000000)
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--drift-every', type=int, default=100, help='Overwrite the stock of every Nth product')
+    args = parser.parse_args()
+
+    def bench(db_path):
+        if not os.path.exists(db_path) or os.path.getsize(db_path) == 0:
+            print(f'Generating {args.transactions} transactions...', file=sys.stderr)
+            generate_dataset(db_path, products=args.products, transactions=args.transactions)
+        db = sqlite3.connect(db_path, timeout=30)
+        migrate_db(db)
+        first_run = db.execute('SELECT COALESCE(MAX(run_id), 0) FROM stock_reconciliation_runs').fetchone()[0]
+        try:
+            with db:
+                db.execute('UPDATE products SET stock_on_hand = stock_on_hand + 7 WHERE product_id % ? = 0', [args.drift_every])
+            results = [(batch_size, *reconcile(db, batch_size)) for batch_size in (250, 1000, 5000)]
+            start = time.perf_counter()
+            applied = apply_reconciliation(db, results[-1][1])
+            return results, applied, time.perf_counter() - start
+        finally:
+            with db:
+                db.execute('DELETE FROM stock_adjustments WHERE run_id > ?', [first_run])
+                db.execute('DELETE FROM stock_reconciliation_discrepancies WHERE run_id > ?', [first_run])
+                db.execute('DELETE FROM stock_reconciliation_runs WHERE run_id > ?', [first_run])
+            db.close()
+
+    if args.database:
+        results, applied, apply_time = bench(args.database)
+    else:
+        with temp_database() as db_path:
+            os.unlink(db_path)
+            results, applied, apply_time = bench(db_path)
+
+    print(f"{'batch':>8}{'discrepancies':>15}{'seconds':>10}{'peak KiB':>10}")
+    for batch_size, _, found, duration, peak in results:
+        print(f'{batch_size:>8}{found:>15}{duration:>10.2f}{peak / 1024:>10.0f}')
+    print(f"apply: {applied['adjusted']} products corrected in {apply_time:.2f} s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""End-to-end latency of the report endpoints on a seeded store (NFR-PE-001).
+
+Each report is requested through the Flask app against a dataset generated
+by benchmarks.dataset, and the run fails if any report's worst time
+exceeds the target. The ledger reports are also requested without a date
+range, which returns every matching transaction: those are timed and their
+peak traced server memory is checked against --memory-target instead.
+
+Usage (from backend/):
+    python -m benchmarks.bench_reports --transactions 1000000
+    python -m benchmarks.bench_reports --database /tmp/bench1m.db
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+from benchmarks.common import bench_app, summarize, temp_database
+from benchmarks.dataset import generate_dataset
+from core.auth import generate_auth_token
+
+# (label, url) pairs covering the reports the way the frontend requests them
+SCENARIOS = [
+    ('stock on hand', '/api/v1/reports/stock-on-hand?is_active=1'),
+    ('stock on hand by stock', '/api/v1/reports/stock-on-hand?sort=stock_on_hand&order=desc'),
+    ('sales, full year', '/api/v1/reports/sales?start_date=2024-01-01&end_date=2024-12-31&sort=total_sales_amount&order=desc'),
+    ('sales, one month', '/api/v1/reports/sales?start_date=2024-06-01&end_date=2024-06-30'),
+    ('unsold, one month', '/api/v1/reports/unsold?start_date=2024-06-01&end_date=2024-06-30'),
+    ('unsold, one week', '/api/v1/reports/unsold?start_date=2024-06-01&end_date=2024-06-07'),
+    ('deliveries, one month', '/api/v1/reports/deliveries?start_date=2024-06-01&end_date=2024-06-30'),
+    ('deliveries, one supplier', '/api/v1/reports/deliveries?start_date=2024-01-01&end_date=2024-12-31&supplier_id=7'),
+    ('pull-outs, one month', '/api/v1/reports/pull-outs?start_date=2024-06-01&end_date=2024-06-30&sort=supplier_name'),
+    ('history, one day', '/api/v1/reports/transaction-history?start_date=2024-06-15&end_date=2024-06-15'),
+    ('history, one product', '/api/v1/reports/transaction-history?product_id=1&start_date=2024-01-01&end_date=2024-12-31'),
+]
+
+# Reports over the whole ledger; their time grows with it, their memory must not
+UNBOUNDED_SCENARIOS = [
+    ('history, whole ledger', '/api/v1/reports/transaction-history'),
+    ('history, compact', '/api/v1/reports/transaction-history?format=compact'),
+    ('deliveries, all', '/api/v1/reports/deliveries'),
+]
+
+def run(app, token, repeat):
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+    results = []
+    for label, url in SCENARIOS:
+        latencies = []
+        rows = 0
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response = client.get(url, headers=headers)
+            # Reports are streamed, so the body is only produced as it is read
+            response.get_data()
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code == 200, (url, response.status_code, response.get_data(as_text=True))
+            rows = len(response.get_json())
+        results.append((label, rows, summarize(latencies)))
+    return results
+
+def run_unbounded(app, token, repeat):
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+    results = []
+    for label, url in UNBOUNDED_SCENARIOS:
+        latencies = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response = client.get(url, headers=headers, buffered=False)
+            size = sum(len(chunk) for chunk in response.response)
+            response.close()
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code == 200, (url, response.status_code)
+        # A separate pass, as tracing slows every allocation down
+        tracemalloc.start()
+        try:
+            response = client.get(url, headers=headers, buffered=False)
+            for _ in response.response:
+                pass
+            response.close()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        results.append((label, size, summarize(latencies), peak))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', help='Reuse (or create) this dataset instead of a temporary one')
+    parser.add_argument('--transactions', type=int, default=1000000)
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=3, help='Requests per report')
+    parser.add_argument('--target', type=float, default=2.0, help='Worst acceptable seconds per report')
+    parser.add_argument('--memory-target', type=float, default=32.0,
+                        help='Worst acceptable peak MB of traced memory for a whole-ledger report')
+    args = parser.parse_args()
+
+    def bench(db_path):
+        if not os.path.exists(db_path) or os.path.getsize(db_path) == 0:
+            print(f'Generating {args.transactions} transactions...', file=sys.stderr)
+            generate_dataset(db_path, products=args.products, transactions=args.transactions)
+        with bench_app(db_path) as app:
+            with app.app_context():
+                token = generate_auth_token(app, 1)
+            return run(app, token, args.repeat), run_unbounded(app, token, args.repeat)
+
+    if args.database:
+        results, unbounded = bench(args.database)
+    else:
+        with temp_database() as db_path:
+            os.unlink(db_path)
+            results, unbounded = bench(db_path)
+
+    failed = False
+    print(f"{'report':<28}{'rows':>8}{'p50 ms':>10}{'max ms':>10}")
+    for label, rows, summary in results:
+        slow = summary['max'] > args.target * 1000
+        failed = failed or slow
+        print(f"{label:<28}{rows:>8}{summary['p50']:>10.1f}{summary['max']:>10.1f}{'  SLOW' if slow else ''}")
+
+    print(f"\n{'unbounded report':<28}{'MB sent':>8}{'p50 ms':>10}{'max ms':>10}{'peak MB':>10}")
+    for label, size, summary, peak in unbounded:
+        heavy = peak > args.memory_target * 1024 * 1024
+        failed = failed or heavy
+        print(f"{label:<28}{size / 1024 / 1024:>8.1f}{summary['p50']:>10.1f}{summary['max']:>10.1f}"
+              f"{peak / 1024 / 1024:>10.1f}{'  MEMORY' if heavy else ''}")
+    if failed:
+        print(f'FAIL: at least one report exceeded {args.target:.1f} s or {args.memory_target:.0f} MB', file=sys.stderr)
+        sys.exit(1)
+    print(f'OK: every report completed within {args.target:.1f} s and {args.memory_target:.0f} MB')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Statement preparation per request on a mixed workload, by statement cache setup.
+
+Replays the same random request mix against each setup: filtered product and
+transaction listings (random filter subsets, sorts and page sizes), reports,
+batch barcode lookups and transaction batches of random size. "exact IN lists"
+restores one placeholder per value, so every list length is a distinct
+statement; the others pad IN lists with core.database.in_list. The prepared
+count mirrors the sqlite3 statement cache of the pooled connections.
+
+Usage (from backend/):
+    python -m benchmarks.bench_statement_cache --requests 3000
+"""
+import argparse
+import random
+import time
+from unittest import mock
+
+from benchmarks.common import bench_app, temp_database
+from benchmarks.dataset import generate_dataset
+from core.auth import generate_auth_token
+from core.database import get_pool_stats
+
+SETUPS = [
+    ('exact IN lists, 128', 128, True),
+    ('padded IN lists, 128', 128, False),
+    ('padded IN lists, 512', 512, False),
+]
+PRODUCT_FILTERS = ['category_id=2', 'supplier_id=3', 'is_active=1', 'stock_on_hand_lte=50', 'name=sku00']
+TRANSACTION_FILTERS = ['product_id=7', 'transaction_type=Sale', 'start_date=2024-06-01', 'end_date=2024-06-30', 'user_id=2']
+
+def exact_in_list(values):
+    values = list(values)
+    return ', '.join('?' * len(values)), values
+
+def request_mix(count, products, seed=11):
+    rng = random.Random(seed)
+    mix = []
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.25:
+            filters = rng.sample(PRODUCT_FILTERS, rng.randint(0, 3))
+            mix.append(('GET', '/api/v1/products?' + '&'.join(filters), None))
+        elif roll < 0.50:
+            filters = rng.sample(TRANSACTION_FILTERS, rng.randint(1, 3))
+            filters.append(f"limit={rng.choice([20, 50, 100])}&sort={rng.choice(['transaction_id', 'transaction_date'])}")
+            mix.append(('GET', '/api/v1/transactions?' + '&'.join(filters), None))
+        elif roll < 0.60:
+            mix.append(('GET', f"/api/v1/reports/sales?start_date=2024-06-{rng.randint(1, 28):02d}&end_date=2024-06-30", None))
+        elif roll < 0.85:
+            codes = [f'SKU{rng.randrange(products):07d}' for _ in range(rng.randint(1, 200))]
+            mix.append(('POST', '/api/v1/products/by-code', {'item_codes': codes}))
+        else:
+            rows = [{'product_id': rng.randint(1, products), 'transaction_type': 'Delivery', 'quantity': 1,
+                     'transaction_date': '2024-12-31T12:00:00', 'supplier_id': rng.randint(1, 40), 'user_id': rng.randint(1, 50)}
+                    for _ in range(rng.randint(1, 100))]
+            mix.append(('POST', '/api/v1/transactions/batch', rows))
+    return mix
+
+def run(db_path, cached_statements, exact, mix):
+    patches = [mock.patch('api.transactions.in_list', exact_in_list), mock.patch('core.product_index.in_list', exact_in_list)] if exact else []
+    for patch in patches:
+        patch.start()
+    try:
+        with bench_app(db_path, DATABASE_CACHED_STATEMENTS=cached_statements, DATABASE_POOL_SIZE=1, RESPONSE_CACHE_BYTES=0) as app:
+            with app.app_context():
+                headers = {'Authorization': f'Bearer {generate_auth_token(app, 1)}'}
+            client = app.test_client()
+            before = get_pool_stats(app)
+            start = time.perf_counter()
+            for method, url, body in mix:
+                response = client.open(url, method=method, json=body, headers=headers)
+                assert response.status_code < 400, (url, response.get_json())
+            elapsed = time.perf_counter() - start
+            after = get_pool_stats(app)
+    finally:
+        for patch in patches:
+            patch.stop()
+    executed = after['statements_executed'] - before['statements_executed']
+    prepared = after['statements_prepared'] - before['statements_prepared']
+    return len(mix) / elapsed, prepared / len(mix), (executed - prepared) / executed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--transactions', type=int, default=50000)
+    parser.add_argument('--requests', type=int, default=3000)
+    args = parser.parse_args()
+
+    mix = request_mix(args.requests, args.products)
+    rows = []
+    for label, cached_statements, exact in SETUPS:
+        # A fresh copy per setup, since the transaction batches write to it
+        with temp_database() as db_path:
+            generate_dataset(db_path, products=args.products, transactions=args.transactions)
+            rows.append((label, *run(db_path, cached_statements, exact, mix)))
+
+    print(f'{args.requests} requests, {args.products} products, {args.transactions} transactions')
+    print(f"{'setup':<24}{'req/s':>9}{'prepares/req':>14}{'cache hits':>12}")
+    for label, throughput, prepares, hit_ratio in rows:
+        print(f'{label:<24}{throughput:>9.0f}{prepares:>14.2f}{hit_ratio:>12.1%}')
+
+if __name__ == '__main__':
+    main()
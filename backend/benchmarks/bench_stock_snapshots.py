@@ -0,0 +1,161 @@
+"""Stock-on-hand as of a past day: ledger replay vs stock snapshots.
+
+Part one times the stock of every product at the end of several days computed
+three ways: replaying the transactions ledger, moving the live stock back by
+the daily movement totals, and moving the nearest month-end snapshot. Part two
+measures the latency of a concurrent writer while a snapshot is created, with
+the rows written in one transaction and in the default batches.
+
+Snapshots written to --database are removed again at the end, as are the
+writer's transactions.
+
+Usage (from backend/):
+    python -m benchmarks.bench_stock_snapshots --database /tmp/bench1m.db
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import date, timedelta
+
+from benchmarks.common import summarize, temp_database
+from benchmarks.dataset import generate_dataset
+from core.database import migrate_db
+from core.stock_snapshots import SNAPSHOT_BATCH_ROWS, create_stock_snapshot, nearest_snapshot, stock_as_of
+
+LEDGER_REPLAY = """
+    SELECT p.product_id, COALESCE((
+        SELECT SUM(CASE WHEN transaction_type = 'Delivery' THEN quantity ELSE -quantity END)
+        FROM transactions t
+        WHERE t.product_id = p.product_id AND t.transaction_date < date(?, '+1 day')
+    ), 0)
+    FROM products p
+"""
+
+def connect(db_path):
+    db = sqlite3.connect(db_path, timeout=30)
+    db.execute('PRAGMA journal_mode=WAL')
+    return db
+
+def clear_snapshots(db):
+    with db:
+        db.execute('DELETE FROM stock_snapshots')
+        db.execute('DELETE FROM stock_snapshot_dates')
+
+def timed(db, query, args, repeat):
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = db.execute(query, args).fetchall()
+        latencies.append(time.perf_counter() - start)
+    return dict(rows), summarize(latencies)
+
+def as_of_queries(db, days, today, repeat):
+    results = []
+    for as_of in days:
+        ledger, ledger_time = timed(db, LEDGER_REPLAY, [as_of], repeat)
+        expression, joins, args = stock_as_of(as_of)
+        live, live_time = timed(db, f'SELECT p.product_id, {expression} FROM products p{joins}', args, repeat)
+        anchor = nearest_snapshot(db, as_of, today=today)
+        expression, joins, args = stock_as_of(as_of, anchor)
+        snapshot, snapshot_time = timed(db, f'SELECT p.product_id, {expression} FROM products p{joins}', args, repeat)
+        assert live == ledger == snapshot, f'stock as of {as_of} disagrees with the ledger'
+        results.append((as_of, anchor, ledger_time['p50'], live_time['p50'], snapshot_time['p50']))
+    return results
+
+def writer_latency(db_path, product_id, stop, latencies):
+    db = connect(db_path)
+    while not stop.is_set():
+        start = time.perf_counter()
+        with db:
+            db.execute('''
+                INSERT INTO transactions (product_id, transaction_type, quantity, transaction_date, supplier_id, user_id)
+                VALUES (?, 'Delivery', 1, '9999-12-31T00:00:00', 1, 1)
+            ''', [product_id])
+        latencies.append(time.perf_counter() - start)
+        time.sleep(0.001)
+    db.close()
+
+def snapshot_under_load(db_path, snapshot_date, batch_size, today):
+    latencies = []
+    stop = threading.Event()
+    writer = threading.Thread(target=writer_latency, args=(db_path, 1, stop, latencies))
+    writer.start()
+    time.sleep(0.2)
+    db = connect(db_path)
+    start = time.perf_counter()
+    if batch_size is not None:
+        create_stock_snapshot(db, snapshot_date, batch_size=batch_size, today=today)
+    duration = time.perf_counter() - start
+    time.sleep(0.2)
+    stop.set()
+    writer.join()
+    db.close()
+    return duration, summarize(latencies)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', help='Reuse (or create) this dataset instead of a temporary one')
+    parser.add_argument('--transactions', type=int, default=1000000)
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    def bench(db_path):
+        if not os.path.exists(db_path) or os.path.getsize(db_path) == 0:
+            print(f'Generating {args.transactions} transactions...', file=sys.stderr)
+            generate_dataset(db_path, products=args.products, transactions=args.transactions)
+        db = connect(db_path)
+        migrate_db(db)
+        first, last = (date.fromisoformat(value[:10]) for value in
+                       db.execute('SELECT MIN(transaction_date), MAX(transaction_date) FROM transactions').fetchone())
+        # The dataset ends in the past; "today" is the day after its last transaction
+        today = last + timedelta(days=1)
+        newest = db.execute('SELECT MAX(transaction_id) FROM transactions').fetchone()[0]
+        clear_snapshots(db)
+        try:
+            month_ends = []
+            day = date(first.year, first.month, 1)
+            while day <= last:
+                day = (day + timedelta(days=32)).replace(day=1)
+                month_ends.append((day - timedelta(days=1)).isoformat())
+            start = time.perf_counter()
+            for month_end in month_ends:
+                create_stock_snapshot(db, month_end, today=today)
+            build_time = time.perf_counter() - start
+            span = (last - first).days
+            days = [(first + timedelta(days=span * fraction // 8)).isoformat() for fraction in range(1, 8)]
+            queries = as_of_queries(db, days, today, args.repeat)
+            clear_snapshots(db)
+
+            probe = month_ends[len(month_ends) // 2]
+            load = [(label, *snapshot_under_load(db_path, probe, batch_size, today))
+                    for label, batch_size in (('no snapshot', None),
+                                              ('one transaction', args.products * 2),
+                                              (f'batches of {SNAPSHOT_BATCH_ROWS}', SNAPSHOT_BATCH_ROWS))]
+            return build_time, len(month_ends), queries, load
+        finally:
+            clear_snapshots(db)
+            with db:
+                db.execute('DELETE FROM transactions WHERE transaction_id > ?', [newest])
+            db.close()
+
+    if args.database:
+        build_time, snapshots, queries, load = bench(args.database)
+    else:
+        with temp_database() as db_path:
+            os.unlink(db_path)
+            build_time, snapshots, queries, load = bench(db_path)
+
+    print(f'{snapshots} month-end snapshots built incrementally in {build_time:.2f} s')
+    print(f"{'as_of':<12}{'anchor':<12}{'ledger ms':>11}{'live ms':>10}{'snapshot ms':>13}")
+    for as_of, anchor, ledger, live, snapshot in queries:
+        print(f"{as_of:<12}{anchor or 'live':<12}{ledger:>11.1f}{live:>10.1f}{snapshot:>13.1f}")
+    print(f"\n{'writer during':<20}{'snapshot s':>11}{'writes':>8}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for label, duration, summary in load:
+        print(f"{label:<20}{duration:>11.2f}{summary['count']:>8}{summary['p50']:>9.2f}{summary['p99']:>9.2f}{summary['max']:>9.2f}")
+
+if __name__ == '__main__':
+    main()
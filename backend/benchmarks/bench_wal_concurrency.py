@@ -0,0 +1,103 @@
+"""Read latency while concurrent cashiers write sales, per storage profile.
+
+Each profile is measured twice on a fresh database: with readers only, then
+with writer threads inserting Sale transactions through execute_query. With
+WAL the read percentiles should stay flat; with the rollback journal they
+climb as readers queue behind writers.
+
+Usage (from backend/):
+    python -m benchmarks.bench_wal_concurrency --writers 4 --duration 5
+"""
+import argparse
+import sqlite3
+import threading
+import time
+
+from benchmarks.common import bench_app, summarize, temp_database
+from core.database import init_db, query_db, execute_query
+
+PRODUCT_COUNT = 2000
+
+def seed(db_path, profile):
+    db = sqlite3.connect(db_path)
+    init_db(db, profile)
+    db.execute("INSERT INTO users (username, password, role) VALUES ('bench', '', 'Staff')")
+    db.execute("INSERT INTO suppliers (name) VALUES ('Bench Supplier')")
+    db.executemany(
+        'INSERT INTO products (item_code, name, supplier_id, category_id, unit_cost, selling_price, is_vat_exempt, stock_on_hand) '
+        'VALUES (?, ?, 1, 1, 10, 15, 0, 1000000000)',
+        [(f'BENCH{i:06d}', f'Bench Product {i}') for i in range(PRODUCT_COUNT)])
+    db.commit()
+    db.close()
+
+def run_phase(app, writers, duration):
+    stop = threading.Event()
+    latencies = []
+    writes = [0]
+    errors = [0]
+    lock = threading.Lock()
+
+    def reader():
+        i = 0
+        while not stop.is_set():
+            i += 1
+            start = time.perf_counter()
+            with app.app_context():
+                query_db(app, 'SELECT * FROM products WHERE product_id = ?', [i % PRODUCT_COUNT + 1], one=True)
+                query_db(app, 'SELECT COUNT(*) FROM transactions WHERE product_id = ?', [i % PRODUCT_COUNT + 1])
+            latencies.append(time.perf_counter() - start)
+
+    def writer(seed_value):
+        i = seed_value
+        while not stop.is_set():
+            i += 7
+            try:
+                with app.app_context():
+                    execute_query(app, '''
+                        INSERT INTO transactions (product_id, transaction_type, quantity, transaction_date, user_id, price)
+                        VALUES (?, 'Sale', 1, '2025-06-01T10:00:00', 1, 15)
+                    ''', [i % PRODUCT_COUNT + 1])
+                with lock:
+                    writes[0] += 1
+            except sqlite3.OperationalError:
+                with lock:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=reader)]
+    threads += [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    return {
+        **summarize(latencies),
+        'writes_per_s': writes[0] / duration,
+        'write_errors': errors[0],
+    }
+
+def bench_profile(profile, writers, duration):
+    with temp_database() as db_path:
+        seed(db_path, profile)
+        with bench_app(db_path, DATABASE_STORAGE_PROFILE=profile, DATABASE_POOL_SIZE=writers + 2) as app:
+            return run_phase(app, 0, duration), run_phase(app, writers, duration)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=5.0, help='Seconds per phase')
+    parser.add_argument('--profiles', nargs='+', default=['wal', 'rollback'])
+    args = parser.parse_args()
+
+    results = {profile: bench_profile(profile, args.writers, args.duration) for profile in args.profiles}
+
+    print(f"{'profile':<12}{'phase':<14}{'reads':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'writes/s':>10}{'errors':>8}")
+    for profile, (idle, loaded) in results.items():
+        for phase, result in (('reads only', idle), (f'{args.writers} writers', loaded)):
+            print(f"{profile:<12}{phase:<14}{result['count']:>8}{result['p50']:>10.3f}{result['p95']:>10.3f}"
+                  f"{result['p99']:>10.3f}{result['max']:>10.3f}{result['writes_per_s']:>10.1f}{result['write_errors']:>8}")
+
+if __name__ == '__main__':
+    main()
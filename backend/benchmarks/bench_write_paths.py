@@ -0,0 +1,132 @@
+"""Requests per second for POST /api/v1/transactions and POST /api/v1/products.
+
+"before" serves the requests with the handlers as they were written before
+the write paths moved to a single INSERT ... RETURNING: separate SELECTs to
+validate every reference, the insert, a commit, then a SELECT * read-back.
+They are registered on a benchmark-only blueprint and run with foreign key
+enforcement off, as the server did then. "after" is the live endpoints.
+Statements per request count everything sent to SQLite, BEGIN and COMMIT
+included.
+
+Usage (from backend/):
+    python -m benchmarks.bench_write_paths --requests 3000
+"""
+import argparse
+import sqlite3
+import time
+
+from flask import Blueprint, current_app, jsonify, request
+
+from benchmarks.common import bench_app, temp_database
+from core.auth import generate_auth_token, role_required, token_required
+from core.database import execute_query, get_db, init_db, query_db
+
+before_bp = Blueprint('before', __name__, url_prefix='/before')
+
+@before_bp.route('/transactions', methods=['POST'])
+@token_required
+def create_transaction_before():
+    data = request.json
+    product = query_db(current_app, 'SELECT * FROM products WHERE product_id = ?', [data['product_id']], one=True)
+    if not product:
+        return jsonify({'message': 'Invalid product_id'}), 400
+    user = query_db(current_app, 'SELECT * FROM users WHERE user_id=?', [data['user_id']], one=True)
+    if not user:
+        return jsonify({'message': 'Invalid user_id'}), 400
+    supplier_id = data.get('supplier_id')
+    if data['transaction_type'] in ('Delivery', 'Pull-out'):
+        supplier = query_db(current_app, 'SELECT * FROM suppliers WHERE supplier_id=?', [supplier_id], one=True)
+        if not supplier:
+            return jsonify({'message': 'Invalid supplier_id'}), 400
+    price = product['selling_price'] if data['transaction_type'] in ('Sale', 'Return') else None
+    transaction_id = execute_query(current_app, '''
+        INSERT INTO transactions (product_id, transaction_type, quantity, transaction_date, supplier_id, user_id, price)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', [data['product_id'], data['transaction_type'], data['quantity'], data['transaction_date'], supplier_id, data['user_id'], price])
+    new_transaction = query_db(current_app, 'SELECT * FROM transactions WHERE transaction_id = ?', [transaction_id], one=True)
+    return jsonify(dict(new_transaction)), 201
+
+@before_bp.route('/products', methods=['POST'])
+@role_required(['Administrator', 'Manager'])
+def create_product_before():
+    data = request.json
+    supplier = query_db(current_app, 'SELECT * FROM suppliers WHERE supplier_id = ?', [data['supplier_id']], one=True)
+    category = query_db(current_app, 'SELECT * FROM categories WHERE category_id = ?', [data['category_id']], one=True)
+    if not supplier or not category:
+        return jsonify({'message': 'Invalid supplier_id or category_id'}), 400
+    product_id = execute_query(current_app, '''
+        INSERT INTO products (item_code, name, description, supplier_id, category_id, unit_cost, selling_price, is_vat_exempt)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', [data['item_code'], data['name'], data.get('description'), data['supplier_id'], data['category_id'],
+          data['unit_cost'], data['selling_price'], data['is_vat_exempt']])
+    new_product = query_db(current_app, 'SELECT * FROM products WHERE product_id = ?', [product_id], one=True)
+    return jsonify(dict(new_product)), 201
+
+VARIANTS = {
+    'before': ('/before', {'DATABASE_PRAGMAS': {'foreign_keys': 'OFF'}}),
+    'after': ('/api/v1', {}),
+}
+
+def seed(db_path):
+    db = sqlite3.connect(db_path)
+    init_db(db)
+    db.execute("INSERT INTO users (username, password, role) VALUES ('bench', '', 'Administrator')")
+    db.execute("INSERT INTO suppliers (name) VALUES ('Bench Supplier')")
+    db.executemany(
+        'INSERT INTO products (item_code, name, supplier_id, category_id, unit_cost, selling_price, is_vat_exempt, stock_on_hand) '
+        'VALUES (?, ?, 1, 1, 10, 15, 0, 1000000000)',
+        [(f'SEED{i:05d}', f'Seed Product {i}') for i in range(1000)])
+    db.commit()
+    db.close()
+
+def measure(app, client, headers, url, bodies):
+    # Requests are sent one at a time, so they all reuse the pool's single warm
+    # connection and tracing it counts every statement they run
+    statements = []
+    with app.app_context():
+        get_db(app).set_trace_callback(statements.append)
+    start = time.perf_counter()
+    for body in bodies:
+        response = client.post(url, json=body, headers=headers)
+        assert response.status_code == 201, response.get_json()
+    elapsed = time.perf_counter() - start
+    with app.app_context():
+        get_db(app).set_trace_callback(None)
+    return len(bodies) / elapsed, len(statements) / len(bodies)
+
+def run(variant, requests):
+    prefix, config = VARIANTS[variant]
+    with temp_database() as db_path:
+        seed(db_path)
+        with bench_app(db_path, **config) as app:
+            app.register_blueprint(before_bp)
+            with app.app_context():
+                headers = {'Authorization': f'Bearer {generate_auth_token(app, 1)}'}
+            client = app.test_client()
+            transactions = [{'product_id': i % 1000 + 1, 'transaction_type': 'Sale' if i % 4 else 'Delivery', 'quantity': 1,
+                             'transaction_date': '2025-06-01T10:00:00', 'user_id': 1, 'supplier_id': None if i % 4 else 1}
+                            for i in range(requests)]
+            products = [{'item_code': f'{variant}{i:06d}', 'name': f'Bench Product {i}', 'supplier_id': 1, 'category_id': 1 + i % 4,
+                         'unit_cost': 10, 'selling_price': 15, 'is_vat_exempt': 0}
+                        for i in range(requests)]
+            # Warm the user cache and the statement caches before timing
+            measure(app, client, headers, f'{prefix}/transactions', transactions[:50])
+            return {
+                'create_transaction': measure(app, client, headers, f'{prefix}/transactions', transactions),
+                'create_product': measure(app, client, headers, f'{prefix}/products', products),
+            }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=3000, help='Requests per endpoint')
+    args = parser.parse_args()
+
+    results = {variant: run(variant, args.requests) for variant in VARIANTS}
+    print(f"{'endpoint':<22}{'before req/s':>14}{'after req/s':>14}{'change':>10}{'before stmts':>14}{'after stmts':>13}")
+    for endpoint in results['before']:
+        (before, before_statements), (after, after_statements) = results['before'][endpoint], results['after'][endpoint]
+        print(f"{endpoint:<22}{before:>14.0f}{after:>14.0f}{(after / before - 1) * 100:>+9.0f}%"
+              f"{before_statements:>14.1f}{after_statements:>13.1f}")
+
+if __name__ == '__main__':
+    main()
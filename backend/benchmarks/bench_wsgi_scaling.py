@@ -0,0 +1,157 @@
+"""Throughput of the API under the development server and the production launchers.
+
+Starts each server configuration as a subprocess on a generated store, then
+drives it with client processes, each holding one keep-alive connection and
+sending a mix of barcode lookups, product searches, transaction pages, a
+one-week sales report and (1 in 10) delivery postings for a fixed time.
+gunicorn runs from gunicorn.conf.py with the worker count overridden; the
+last gunicorn row uses the configured default for this machine.
+
+Usage (from backend/):
+    python -m benchmarks.bench_wsgi_scaling --clients 16 --duration 10
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import bench_app, summarize
+from benchmarks.dataset import generate_dataset
+from core.auth import generate_auth_token
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEARCH_TERMS = ['sku00', 'sku001', 'sku0042']
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def server_commands(port, cores):
+    bind = f'127.0.0.1:{port}'
+    gunicorn = [sys.executable, '-m', 'gunicorn', '-c', os.path.join(BACKEND, 'gunicorn.conf.py'),
+                '--pythonpath', BACKEND, '--bind', bind, '--access-logfile', '/dev/null']
+    return [
+        ('flask dev server, debug', [sys.executable, '-c',
+                                     f"import main; main.app.run(host='127.0.0.1', port={port}, debug=True, use_reloader=False)"]),
+        ('waitress', [sys.executable, os.path.join(BACKEND, 'wsgi.py')]),
+        ('gunicorn 1x4 threads', gunicorn + ['--workers', '1', 'wsgi:app']),
+        ('gunicorn 2x4 threads', gunicorn + ['--workers', '2', 'wsgi:app']),
+        (f'gunicorn default ({2 * cores + 1}x4)', gunicorn + ['wsgi:app']),
+    ]
+
+def wait_until_up(port, process, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('server exited during startup')
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('server did not start')
+
+def client(port, token, products, duration, seed, results):
+    rng = random.Random(seed)
+    headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    latencies = []
+    errors = 0
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        product_id = rng.randint(1, products)
+        roll = rng.random()
+        body = None
+        method = 'GET'
+        if roll < 0.35:
+            url = f'/api/v1/products/by-code/SKU{product_id - 1:07d}'
+        elif roll < 0.55:
+            url = f'/api/v1/products/search?q={rng.choice(SEARCH_TERMS)}&limit=20'
+        elif roll < 0.80:
+            url = f'/api/v1/transactions?product_id={product_id}&limit=20&order=desc&sort=transaction_date'
+        elif roll < 0.90:
+            url = '/api/v1/reports/sales?start_date=2024-06-01&end_date=2024-06-07'
+        else:
+            method, url = 'POST', '/api/v1/transactions'
+            body = json.dumps({'product_id': product_id, 'transaction_type': 'Delivery', 'quantity': 1,
+                               'transaction_date': '2024-12-31T12:00:00', 'supplier_id': 1, 'user_id': 1})
+        start = time.perf_counter()
+        try:
+            conn.request(method, url, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status >= 500:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+    results.put((latencies, errors))
+
+def drive(port, token, products, clients, duration):
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=client, args=(port, token, products, duration, seed, results))
+                 for seed in range(clients)]
+    for process in processes:
+        process.start()
+    latencies, errors = [], 0
+    for _ in processes:
+        samples, failed = results.get()
+        latencies.extend(samples)
+        errors += failed
+    for process in processes:
+        process.join()
+    return len(latencies) / duration, errors, summarize(latencies)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--transactions', type=int, default=100000)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0)
+    args = parser.parse_args()
+    cores = os.cpu_count() or 1
+
+    workdir = tempfile.mkdtemp()
+    try:
+        # create_app opens inventory.db in the working directory
+        db_path = os.path.join(workdir, 'inventory.db')
+        print(f'Generating {args.transactions} transactions...', file=sys.stderr)
+        generate_dataset(db_path, products=args.products, transactions=args.transactions)
+        env = {**os.environ, 'SECRET_KEY': 'bench', 'JWT_SECRET_KEY': 'bench', 'ACCESS_LOG': '/dev/null',
+               'PYTHONPATH': BACKEND + os.pathsep + os.environ.get('PYTHONPATH', '')}
+        with bench_app(db_path) as app, app.app_context():
+            token = generate_auth_token(app, 1)
+
+        rows = []
+        port = free_port()
+        for label, command in server_commands(port, cores):
+            server = subprocess.Popen(command, cwd=workdir, env={**env, 'BIND': f'127.0.0.1:{port}'},
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                wait_until_up(port, server)
+                rows.append((label, *drive(port, token, args.products, args.clients, args.duration)))
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f'{cores} CPU core(s), {args.clients} clients, {args.duration:.0f} s per server')
+    print(f"{'server':<28}{'req/s':>9}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for label, throughput, errors, summary in rows:
+        print(f"{label:<28}{throughput:>9.0f}{errors:>8}{summary['p50']:>9.1f}{summary['p95']:>9.1f}{summary['p99']:>9.1f}")
+
+if __name__ == '__main__':
+    main()
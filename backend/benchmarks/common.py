@@ -0,0 +1,54 @@
+import contextlib
+import os
+import statistics
+import tempfile
+
+from core.app import create_app
+from core.database import close_pool
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def summarize(latencies):
+    # Latencies in seconds -> milliseconds summary
+    ms = [sample * 1000 for sample in latencies]
+    return {
+        'count': len(ms),
+        'p50': statistics.median(ms) if ms else 0.0,
+        'p95': percentile(ms, 95),
+        'p99': percentile(ms, 99),
+        'max': max(ms) if ms else 0.0,
+    }
+
+@contextlib.contextmanager
+def temp_database():
+    db_fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(db_fd)
+    try:
+        yield db_path
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.unlink(db_path + suffix)
+
+@contextlib.contextmanager
+def bench_app(db_path, **config):
+    app = create_app({
+        'DATABASE': db_path,
+        'SECRET_KEY': 'bench',
+        'JWT_SECRET_KEY': 'bench',
+        **config,
+    })
+    try:
+        yield app
+    finally:
+        close_pool(app)
+        hasher = app.extensions.get('password_hasher')
+        if hasher is not None:
+            hasher.shutdown()
+        writer = app.extensions.get('group_commit')
+        if writer is not None:
+            writer.shutdown()
@@ -0,0 +1,127 @@
+"""Deterministic synthetic store dataset built on top of init_db.
+
+The same arguments always produce the same database, so benchmark results
+can be compared across commits.
+"""
+import hashlib
+import itertools
+import json
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta
+
+from core.auth import hash_password
+from core.database import init_db, SCHEMA_VERSION
+
+START_DATE = datetime(2024, 1, 1, 8, 0, 0)
+DEFAULT_PASSWORD = 'bench-password'
+
+# Share of each transaction type in the generated ledger
+TRANSACTION_MIX = (('Sale', 0.78), ('Delivery', 0.12), ('Return', 0.06), ('Pull-out', 0.04))
+CHUNK_SIZE = 50000
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'inventory-bench-datasets')
+
+def generate_dataset(db_path, products=5000, transactions=1000000, suppliers=40, users=50, days=365, seed=42, categories=4):
+    # categories counts the four that init_db creates; any beyond those are added
+    rng = random.Random(seed)
+    db = sqlite3.connect(db_path)
+    init_db(db)
+
+    password = hash_password(DEFAULT_PASSWORD).hex()
+    db.executemany('INSERT INTO users (username, password, role) VALUES (?, ?, ?)',
+                   [(f'user{i:03d}', password, 'Administrator' if i == 0 else 'Manager' if i < 5 else 'Staff')
+                    for i in range(users)])
+    db.executemany('INSERT INTO suppliers (name, contact_info) VALUES (?, ?)',
+                   [(f'Supplier {i:03d}', f'supplier{i:03d}@example.com') for i in range(suppliers)])
+    existing = db.execute('SELECT COUNT(*) FROM categories').fetchone()[0]
+    db.executemany('INSERT INTO categories (name) VALUES (?)', [(f'Category {i:03d}',) for i in range(existing, categories)])
+    categories = [row[0] for row in db.execute('SELECT category_id FROM categories')]
+
+    product_rows = []
+    product_suppliers = []
+    prices = []
+    for i in range(products):
+        supplier_id = rng.randint(1, suppliers)
+        unit_cost = round(rng.uniform(5, 1500), 2)
+        selling_price = round(unit_cost * rng.uniform(1.1, 1.6), 2)
+        product_rows.append((f'SKU{i:07d}', f'Product {i} {rng.choice(["Uniform", "Book", "Notebook", "Pen", "Bag"])}',
+                             f'Synthetic product number {i}', supplier_id, rng.choice(categories),
+                             unit_cost, selling_price, rng.randint(0, 1)))
+        product_suppliers.append(supplier_id)
+        prices.append(selling_price)
+    db.executemany('''
+        INSERT INTO products (item_code, name, description, supplier_id, category_id, unit_cost, selling_price, is_vat_exempt)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', product_rows)
+
+    # A few best sellers and a long tail (Zipf-like popularity)
+    cumulative_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(products)))
+    type_names = [name for name, _ in TRANSACTION_MIX]
+    type_weights = list(itertools.accumulate(share for _, share in TRANSACTION_MIX))
+    seconds_per_transaction = days * 86400 / max(transactions, 1)
+
+    # Opening stock for every product, then the day-by-day ledger in date order. Stock is
+    # applied once at the end, the same way the batch endpoint does it.
+    db.execute('UPDATE stock_trigger_control SET deferred = 1')
+    opening = [(product_id, 'Delivery', 500, START_DATE.isoformat(timespec='seconds'), product_suppliers[product_id - 1], 1, None)
+               for product_id in range(1, products + 1)]
+    insert = '''
+        INSERT INTO transactions (product_id, transaction_type, quantity, transaction_date, supplier_id, user_id, price)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    '''
+    db.executemany(insert, opening)
+
+    batch = []
+    for n in range(transactions):
+        product_id = rng.choices(range(1, products + 1), cum_weights=cumulative_weights)[0]
+        transaction_type = rng.choices(type_names, cum_weights=type_weights)[0]
+        date = (START_DATE + timedelta(seconds=int(n * seconds_per_transaction))).isoformat(timespec='seconds')
+        user_id = rng.randint(1, users)
+        if transaction_type == 'Delivery':
+            row = (product_id, transaction_type, rng.randint(20, 200), date, product_suppliers[product_id - 1], user_id, None)
+        elif transaction_type == 'Pull-out':
+            row = (product_id, transaction_type, rng.randint(1, 5), date, product_suppliers[product_id - 1], user_id, None)
+        else:
+            row = (product_id, transaction_type, rng.randint(1, 3), date, None, user_id, prices[product_id - 1])
+        batch.append(row)
+        if len(batch) == CHUNK_SIZE:
+            db.executemany(insert, batch)
+            batch = []
+    if batch:
+        db.executemany(insert, batch)
+
+    db.execute('''
+        UPDATE products SET stock_on_hand = MAX(0, (
+            SELECT COALESCE(SUM(CASE WHEN transaction_type = 'Delivery' THEN quantity ELSE -quantity END), 0)
+            FROM transactions t WHERE t.product_id = products.product_id
+        ))
+    ''')
+    db.execute('UPDATE stock_trigger_control SET deferred = 0')
+    db.commit()
+    db.execute('ANALYZE')
+    db.close()
+
+def dataset_key(**params):
+    # Changes with the arguments, this generator and the schema, so stale copies are never reused
+    with open(__file__, 'rb') as source:
+        generator = hashlib.sha256(source.read()).hexdigest()
+    blob = json.dumps({'params': params, 'generator': generator, 'schema': SCHEMA_VERSION}, sort_keys=True)
+    return hashlib.sha256(blob.encode()).hexdigest()[:16]
+
+def cached_dataset(db_path, cache_dir=DEFAULT_CACHE_DIR, **params):
+    """Writes the dataset for ``params`` to ``db_path``, generating it only on a cache miss.
+
+    Large datasets take minutes to generate; the cache keeps one pristine copy per
+    parameter set, so every benchmark run starts from identical data.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    cached = os.path.join(cache_dir, f'{dataset_key(**params)}.db')
+    if not os.path.exists(cached):
+        partial = f'{cached}.{os.getpid()}.tmp'
+        generate_dataset(partial, **params)
+        os.replace(partial, cached)
+    shutil.copyfile(cached, db_path)
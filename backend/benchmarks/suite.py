@@ -0,0 +1,269 @@
+"""Reproducible benchmark suite: scenario latencies on a synthetic store, as JSON.
+
+"run" builds (or reuses from its cache) the deterministic dataset of the chosen
+profile, then plays each scenario against a fresh copy of it through the Flask
+test client. Request parameters come from seeded random generators, so two runs
+of the same commit send identical requests. Results are written as JSON with the
+commit, machine and dataset they were measured on. "compare" reads two result
+files and exits with status 1 when a scenario's p95 latency or throughput got
+worse by more than the threshold.
+
+Scenarios:
+    scans            barcode lookups, GET /products/by-code/<code>, best sellers most often
+    sales_burst      concurrent tills posting one-unit sales
+    catalog_listing  filtered product listings and product searches
+    reports          every report over a month, stock on hand as of a past day, CSV exports
+    logins           POST /users/login with password verification
+
+Usage (from backend/):
+    python -m benchmarks.suite run --profile small --output before.json
+    python -m benchmarks.suite run --profile small --output after.json
+    python -m benchmarks.suite compare before.json after.json --threshold 0.10
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+from benchmarks.common import bench_app, summarize, temp_database
+from benchmarks.dataset import DEFAULT_CACHE_DIR, DEFAULT_PASSWORD, cached_dataset
+from core.auth import generate_auth_token
+from core.database import get_db
+
+RESULTS_FORMAT = 1
+
+# Dataset parameters per profile; "store" is the size of a large branch after a year
+PROFILES = {
+    'smoke': {'products': 500, 'transactions': 20000, 'suppliers': 10, 'users': 20, 'categories': 8},
+    'small': {'products': 5000, 'transactions': 200000, 'suppliers': 40, 'users': 50, 'categories': 12},
+    'store': {'products': 50000, 'transactions': 2000000, 'suppliers': 120, 'users': 80, 'categories': 24},
+}
+SEED = 1234
+
+def _request(client, method, url, headers, body=None):
+    start = time.perf_counter()
+    response = client.open(url, method=method, json=body, headers=headers)
+    response.close()
+    return time.perf_counter() - start, response.status_code < 400
+
+def _sequential(app, requests):
+    # Plays prepared (method, url, headers, body) requests one after the other; returns outcomes and wall time
+    client = app.test_client()
+    start = time.perf_counter()
+    outcomes = [_request(client, *request) for request in requests]
+    return outcomes, time.perf_counter() - start
+
+def _popular_product(rng, products):
+    # Same skew as the generated ledger: a few best sellers and a long tail
+    return min(int(products ** rng.random()), products)
+
+def scenario_scans(app, headers, dataset, rng):
+    return _sequential(app, [('GET', f'/api/v1/products/by-code/SKU{_popular_product(rng, dataset["products"]) - 1:07d}', headers, None)
+                             for _ in range(2000)])
+
+def scenario_sales_burst(app, headers, dataset, rng, tills=8, sales=250):
+    plans = [[_popular_product(rng, dataset['products']) for _ in range(sales)] for _ in range(tills)]
+    # Best sellers may have sold out in the generated ledger; deliver what the burst will sell first
+    needed = {}
+    for plan in plans:
+        for product_id in plan:
+            needed[product_id] = needed.get(product_id, 0) + 1
+    with app.app_context():
+        db = get_db(app)
+        with db:
+            db.executemany('''
+                INSERT INTO transactions (product_id, transaction_type, quantity, transaction_date, supplier_id, user_id)
+                SELECT product_id, 'Delivery', ?, '2025-01-02T08:00:00', supplier_id, 1 FROM products WHERE product_id = ?
+            ''', [(quantity, product_id) for product_id, quantity in needed.items()])
+
+    outcomes = []
+    lock = threading.Lock()
+
+    def till(plan):
+        client = app.test_client()
+        for product_id in plan:
+            sale = {'product_id': product_id, 'transaction_type': 'Sale', 'quantity': 1,
+                    'transaction_date': '2025-01-02T10:00:00', 'user_id': 1}
+            outcome = _request(client, 'POST', '/api/v1/transactions', headers, sale)
+            with lock:
+                outcomes.append(outcome)
+
+    threads = [threading.Thread(target=till, args=(plan,)) for plan in plans]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outcomes, time.perf_counter() - start
+
+def scenario_catalog_listing(app, headers, dataset, rng):
+    filters = ['is_active=1', f"category_id={rng.randint(1, dataset['categories'])}",
+               f"supplier_id={rng.randint(1, dataset['suppliers'])}", 'stock_on_hand_lte=10', 'name=Notebook']
+    requests = []
+    for _ in range(300):
+        if rng.random() < 0.5:
+            requests.append(('GET', f"/api/v1/products?{'&'.join(rng.sample(filters, rng.randint(1, 2)))}", headers, None))
+        else:
+            term = rng.choice(['note', 'uniform', 'pen', 'bag', 'book', f'sku{rng.randint(0, 99):02d}'])
+            requests.append(('GET', f'/api/v1/products/search?q={term}&limit=20', headers, None))
+    return _sequential(app, requests)
+
+def scenario_reports(app, headers, dataset, rng):
+    requests = []
+    for month in rng.sample(range(1, 13), 3):
+        period = f'start_date=2024-{month:02d}-01&end_date=2024-{month:02d}-28'
+        for report in ('sales', 'unsold', 'deliveries', 'pull-outs', 'transaction-history'):
+            requests.append(('GET', f'/api/v1/reports/{report}?{period}', headers, None))
+        requests.append(('GET', f'/api/v1/reports/stock-on-hand?as_of=2024-{month:02d}-15', headers, None))
+        requests.append(('GET', f'/api/v1/reports/sales/export?format=csv&{period}', headers, None))
+    requests.append(('GET', '/api/v1/reports/stock-on-hand', headers, None))
+    return _sequential(app, requests)
+
+def scenario_logins(app, headers, dataset, rng):
+    return _sequential(app, [('POST', '/api/v1/users/login', {},
+                              {'username': f"user{rng.randrange(dataset['users']):03d}", 'password': DEFAULT_PASSWORD})
+                             for _ in range(40)])
+
+SCENARIOS = {
+    'scans': scenario_scans,
+    'sales_burst': scenario_sales_burst,
+    'catalog_listing': scenario_catalog_listing,
+    'reports': scenario_reports,
+    'logins': scenario_logins,
+}
+
+def run_scenario(name, dataset, cache_dir):
+    # Every run starts from a pristine copy, so scenarios that write do not affect the others
+    with temp_database() as db_path:
+        cached_dataset(db_path, cache_dir=cache_dir, seed=42, **dataset)
+        with bench_app(db_path) as app:
+            with app.app_context():
+                headers = {'Authorization': f'Bearer {generate_auth_token(app, 1)}'}
+            outcomes, elapsed = SCENARIOS[name](app, headers, dataset, random.Random(f'{SEED}-{name}'))
+    return [latency for latency, _ in outcomes], sum(1 for _, ok in outcomes if not ok), elapsed
+
+def measure(name, dataset, repeat, cache_dir):
+    latencies, errors, throughputs = [], 0, []
+    for _ in range(repeat):
+        samples, failed, elapsed = run_scenario(name, dataset, cache_dir)
+        latencies.extend(samples)
+        errors += failed
+        throughputs.append(len(samples) / elapsed)
+    summary = summarize(latencies)
+    return {
+        'requests': summary['count'],
+        'errors': errors,
+        'throughput_rps': round(statistics.median(throughputs), 2),
+        'p50_ms': round(summary['p50'], 3),
+        'p95_ms': round(summary['p95'], 3),
+        'p99_ms': round(summary['p99'], 3),
+        'max_ms': round(summary['max'], 3),
+    }
+
+def git_revision():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=root, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=root,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, dirty
+
+def run(args):
+    dataset = dict(PROFILES[args.profile])
+    if args.products:
+        dataset['products'] = args.products
+    if args.transactions:
+        dataset['transactions'] = args.transactions
+    commit, dirty = git_revision()
+    results = {
+        'format': RESULTS_FORMAT,
+        'commit': commit,
+        'dirty': dirty,
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'machine': {
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'profile': args.profile,
+        'dataset': dataset,
+        'repeat': args.repeat,
+        'scenarios': {},
+    }
+    for name in args.scenarios:
+        print(f'Running {name}...', file=sys.stderr)
+        results['scenarios'][name] = measure(name, dataset, args.repeat, args.cache_dir)
+
+    print(f"{'scenario':<18}{'requests':>9}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for name, result in results['scenarios'].items():
+        print(f"{name:<18}{result['requests']:>9}{result['errors']:>8}{result['throughput_rps']:>9.1f}"
+              f"{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}{result['p99_ms']:>9.2f}")
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+            output.write('\n')
+    return 0
+
+def compare(args):
+    with open(args.base) as base_file, open(args.head) as head_file:
+        base, head = json.load(base_file), json.load(head_file)
+    for field in ('dataset', 'machine'):
+        if base.get(field) != head.get(field):
+            print(f'warning: the runs used a different {field}; differences may not be regressions', file=sys.stderr)
+
+    regressions = []
+    print(f"{'scenario':<18}{'p95 ms':>21}{'change':>9}{'req/s':>19}{'change':>9}")
+    for name in base['scenarios']:
+        if name not in head['scenarios']:
+            continue
+        old, new = base['scenarios'][name], head['scenarios'][name]
+        latency_change = new['p95_ms'] / old['p95_ms'] - 1 if old['p95_ms'] else 0.0
+        throughput_change = new['throughput_rps'] / old['throughput_rps'] - 1 if old['throughput_rps'] else 0.0
+        flag = ''
+        if latency_change > args.threshold or throughput_change < -args.threshold or new['errors'] > old['errors']:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:<18}{old['p95_ms']:>10.2f} ->{new['p95_ms']:>8.2f}{latency_change:>+9.1%}"
+              f"{old['throughput_rps']:>8.1f} ->{new['throughput_rps']:>8.1f}{throughput_change:>+9.1%}{flag}")
+    if regressions:
+        print(f"Regressed beyond {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Run the scenarios and record their results')
+    run_parser.add_argument('--profile', choices=list(PROFILES), default='small')
+    run_parser.add_argument('--products', type=int, help='Override the profile product count')
+    run_parser.add_argument('--transactions', type=int, help='Override the profile transaction count')
+    run_parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+    run_parser.add_argument('--repeat', type=int, default=1, help='Runs per scenario; latencies are pooled')
+    run_parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help='Where generated datasets are kept')
+    run_parser.add_argument('--output', help='Write the results as JSON to this file')
+    run_parser.set_defaults(handler=run)
+
+    compare_parser = commands.add_parser('compare', help='Compare two result files')
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('head')
+    compare_parser.add_argument('--threshold', type=float, default=0.10,
+                                help='Relative p95 increase or throughput drop that counts as a regression')
+    compare_parser.set_defaults(handler=compare)
+
+    args = parser.parse_args()
+    sys.exit(args.handler(args))
+
+if __name__ == '__main__':
+    main()
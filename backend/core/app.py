@@ -2,24 +2,75 @@ from datetime import timedelta
 import os
 import os.path
 
-from flask import Flask
+from flask import Flask, jsonify
 from flask_cors import CORS
 
-from core.database import close_db
+from core.auth import init_user_cache, DEFAULT_USER_CACHE_SIZE, DEFAULT_USER_CACHE_TTL, DEFAULT_USER_CACHE_VERSION_CHECK_MS
+from core.response_cache import init_response_cache, DEFAULT_RESPONSE_CACHE_BYTES
+from core.product_index import init_product_index, DEFAULT_PRODUCT_INDEX_VERSION_CHECK_MS
+from core.concurrency import (init_concurrency_limiter, ConcurrencyLimitExceeded, DEFAULT_CONCURRENCY_LIMITS,
+                              DEFAULT_CONCURRENCY_WAIT)
+from core.metrics import init_metrics, get_metrics, DEFAULT_METRICS_MAX_STATEMENTS
+from core.json_provider import init_json_provider, DEFAULT_JSON_PROVIDER
+from core.group_commit import (init_group_commit, get_group_commit, DEFAULT_GROUP_COMMIT_ROWS, DEFAULT_GROUP_COMMIT_MS,
+                                DEFAULT_GROUP_COMMIT_TIMEOUT)
+from core.hashing import (init_password_hasher, get_password_hasher, HasherSaturatedError, DEFAULT_HASHER_EXECUTOR,
+                          DEFAULT_HASHER_WORKERS, DEFAULT_HASHER_QUEUE_SIZE)
+from core.database import (close_db, get_pool, init_pool, init_storage, upgrade_db, DatabaseBusyError, DEFAULT_POOL_SIZE, DEFAULT_POOL_TIMEOUT,
+                           DEFAULT_STORAGE_PROFILE, DEFAULT_BUSY_RETRIES, DEFAULT_BUSY_BACKOFF, DEFAULT_CACHED_STATEMENTS)
 from api.users import users_bp
 from api.suppliers import suppliers_bp
 from api.categories import categories_bp
 from api.products import products_bp
 from api.transactions import transactions_bp
+from api.reports import reports_bp
+
+# Largest request body accepted, in bytes; a full batch of transactions is well under it
+DEFAULT_MAX_CONTENT_LENGTH = 1024 * 1024
 
 def create_app(config_overrides=None):
     app = Flask(__name__)
-    CORS(app)
+    CORS(app, expose_headers=['Link', 'X-Next-Cursor', 'ETag'])
 
     if config_overrides is None:
         config_overrides = {}
 
     app.config['DATABASE'] = config_overrides.get('DATABASE', 'inventory.db')
+    app.config['DATABASE_POOL_SIZE'] = config_overrides.get('DATABASE_POOL_SIZE', int(os.getenv('DATABASE_POOL_SIZE', DEFAULT_POOL_SIZE)))
+    app.config['DATABASE_POOL_TIMEOUT'] = config_overrides.get('DATABASE_POOL_TIMEOUT', DEFAULT_POOL_TIMEOUT)
+    app.config['DATABASE_STORAGE_PROFILE'] = config_overrides.get('DATABASE_STORAGE_PROFILE', os.getenv('DATABASE_STORAGE_PROFILE', DEFAULT_STORAGE_PROFILE))
+    app.config['DATABASE_PRAGMAS'] = config_overrides.get('DATABASE_PRAGMAS', {})
+    app.config['DATABASE_CACHED_STATEMENTS'] = config_overrides.get('DATABASE_CACHED_STATEMENTS', int(os.getenv('DATABASE_CACHED_STATEMENTS', DEFAULT_CACHED_STATEMENTS)))
+    app.config['DATABASE_BUSY_RETRIES'] = config_overrides.get('DATABASE_BUSY_RETRIES', DEFAULT_BUSY_RETRIES)
+    app.config['DATABASE_BUSY_BACKOFF'] = config_overrides.get('DATABASE_BUSY_BACKOFF', DEFAULT_BUSY_BACKOFF)
+    app.config['USER_CACHE_SIZE'] = config_overrides.get('USER_CACHE_SIZE', DEFAULT_USER_CACHE_SIZE)
+    app.config['USER_CACHE_TTL'] = config_overrides.get('USER_CACHE_TTL', DEFAULT_USER_CACHE_TTL)
+    app.config['USER_CACHE_VERSION_CHECK_MS'] = config_overrides.get('USER_CACHE_VERSION_CHECK_MS', float(os.getenv('USER_CACHE_VERSION_CHECK_MS', DEFAULT_USER_CACHE_VERSION_CHECK_MS)))
+    app.config['RESPONSE_CACHE_BYTES'] = config_overrides.get('RESPONSE_CACHE_BYTES', DEFAULT_RESPONSE_CACHE_BYTES)
+    app.config['PRODUCT_INDEX_VERSION_CHECK_MS'] = config_overrides.get('PRODUCT_INDEX_VERSION_CHECK_MS', float(os.getenv('PRODUCT_INDEX_VERSION_CHECK_MS', DEFAULT_PRODUCT_INDEX_VERSION_CHECK_MS)))
+    app.config['CONCURRENCY_LIMITS'] = config_overrides.get('CONCURRENCY_LIMITS', {
+        'report': int(os.getenv('REPORT_CONCURRENCY', DEFAULT_CONCURRENCY_LIMITS['report'])),
+        'export': int(os.getenv('EXPORT_CONCURRENCY', DEFAULT_CONCURRENCY_LIMITS['export'])),
+    })
+    app.config['CONCURRENCY_WAIT'] = config_overrides.get('CONCURRENCY_WAIT', DEFAULT_CONCURRENCY_WAIT)
+    app.config['PASSWORD_HASHER_EXECUTOR'] = config_overrides.get('PASSWORD_HASHER_EXECUTOR', os.getenv('PASSWORD_HASHER_EXECUTOR', DEFAULT_HASHER_EXECUTOR))
+    app.config['PASSWORD_HASHER_WORKERS'] = config_overrides.get('PASSWORD_HASHER_WORKERS', int(os.getenv('PASSWORD_HASHER_WORKERS', DEFAULT_HASHER_WORKERS)))
+    app.config['PASSWORD_HASHER_QUEUE_SIZE'] = config_overrides.get('PASSWORD_HASHER_QUEUE_SIZE', DEFAULT_HASHER_QUEUE_SIZE)
+    app.config['TRANSACTION_GROUP_COMMIT'] = config_overrides.get('TRANSACTION_GROUP_COMMIT', os.getenv('TRANSACTION_GROUP_COMMIT', '0') == '1')
+    app.config['TRANSACTION_GROUP_COMMIT_ROWS'] = config_overrides.get('TRANSACTION_GROUP_COMMIT_ROWS', int(os.getenv('TRANSACTION_GROUP_COMMIT_ROWS', DEFAULT_GROUP_COMMIT_ROWS)))
+    app.config['TRANSACTION_GROUP_COMMIT_MS'] = config_overrides.get('TRANSACTION_GROUP_COMMIT_MS', float(os.getenv('TRANSACTION_GROUP_COMMIT_MS', DEFAULT_GROUP_COMMIT_MS)))
+    app.config['TRANSACTION_GROUP_COMMIT_TIMEOUT'] = config_overrides.get('TRANSACTION_GROUP_COMMIT_TIMEOUT', float(os.getenv('TRANSACTION_GROUP_COMMIT_TIMEOUT', DEFAULT_GROUP_COMMIT_TIMEOUT)))
+    app.config['METRICS_ENABLED'] = config_overrides.get('METRICS_ENABLED', os.getenv('METRICS_ENABLED', '0') == '1')
+    app.config['SLOW_QUERY_MS'] = config_overrides.get('SLOW_QUERY_MS', float(os.getenv('SLOW_QUERY_MS')) if os.getenv('SLOW_QUERY_MS') else None)
+    app.config['SLOW_QUERY_EXPLAIN'] = config_overrides.get('SLOW_QUERY_EXPLAIN', True)
+    app.config['METRICS_MAX_STATEMENTS'] = config_overrides.get('METRICS_MAX_STATEMENTS', int(os.getenv('METRICS_MAX_STATEMENTS', DEFAULT_METRICS_MAX_STATEMENTS)))
+    app.config['METRICS_TOKEN'] = config_overrides.get('METRICS_TOKEN', os.getenv('METRICS_TOKEN'))
+    app.config['MAX_CONTENT_LENGTH'] = config_overrides.get('MAX_CONTENT_LENGTH', int(os.getenv('MAX_CONTENT_LENGTH', DEFAULT_MAX_CONTENT_LENGTH)))
+    app.config['JSON_PROVIDER'] = config_overrides.get('JSON_PROVIDER', os.getenv('JSON_PROVIDER', DEFAULT_JSON_PROVIDER))
+    app.config['TRANSACTION_BATCH_LIMIT'] = config_overrides.get('TRANSACTION_BATCH_LIMIT', 1000)
+    app.config['TRANSACTION_PAGE_MAX_LIMIT'] = config_overrides.get('TRANSACTION_PAGE_MAX_LIMIT', 1000)
+    app.config['PRODUCT_LOOKUP_BATCH_LIMIT'] = config_overrides.get('PRODUCT_LOOKUP_BATCH_LIMIT', 1000)
+    app.config['PRODUCT_SEARCH_MAX_LIMIT'] = config_overrides.get('PRODUCT_SEARCH_MAX_LIMIT', 100)
     app.config['JWT_ACCESS_TOKEN_EXPIRES'] = config_overrides.get('JWT_ACCESS_TOKEN_EXPIRES', timedelta(hours=1))
     app.config['JWT_REFRESH_TOKEN_EXPIRES'] = config_overrides.get('JWT_REFRESH_TOKEN_EXPIRES', timedelta(hours=24 * 3))
     app.config['SECRET_KEY'] = config_overrides.get('SECRET_KEY', os.getenv('SECRET_KEY'))
@@ -40,13 +91,52 @@ def create_app(config_overrides=None):
         print("Error: JWT_SECRET_KEY is not set. Please set it in your environment variables.")
         exit(1)
 
+    init_json_provider(app)
+
     # Register blueprints
     app.register_blueprint(users_bp)
     app.register_blueprint(suppliers_bp)
     app.register_blueprint(categories_bp)
     app.register_blueprint(products_bp)
     app.register_blueprint(transactions_bp)
+    app.register_blueprint(reports_bp)
 
+    # Persist the journal mode and bring the schema up to date, then hand out connections
+    # configured with the rest of the profile. Connections are opened lazily and returned
+    # to the pool at teardown.
+    init_storage(app)
+    upgrade_db(app)
+    init_pool(app)
+    init_user_cache(app)
+    init_response_cache(app)
+    init_product_index(app)
+    init_password_hasher(app)
+    init_concurrency_limiter(app)
+    init_group_commit(app)
+    init_metrics(app)
     app.teardown_appcontext(close_db)
 
+    @app.errorhandler(HasherSaturatedError)
+    def password_hasher_saturated(error):
+        return jsonify({'message': 'Too many password operations in progress, please retry shortly'}), 429, {'Retry-After': '1'}
+
+    @app.errorhandler(ConcurrencyLimitExceeded)
+    def concurrency_limit_exceeded(error):
+        return jsonify({'message': f'{error}, please retry shortly'}), 429, {'Retry-After': '1'}
+
+    @app.errorhandler(DatabaseBusyError)
+    def database_busy(error):
+        return jsonify({'message': 'The database is busy, please retry shortly'}), 503, {'Retry-After': '1'}
+
     return app
+
+def reset_after_fork(app):
+    # For preforking servers that build the app once in the parent (gunicorn.conf.py post_fork)
+    get_pool(app).reset_after_fork()
+    get_password_hasher(app).reset_after_fork()
+    writer = get_group_commit(app)
+    if writer is not None:
+        writer.reset_after_fork()
+    metrics = get_metrics(app)
+    if metrics is not None:
+        metrics.reset_after_fork()
@@ -1,4 +1,7 @@
 import os
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timezone
 from functools import wraps
 
@@ -8,7 +11,7 @@ from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
 from flask import current_app, g, jsonify, request
 
-from core.database import query_db
+from core.database import query_db, table_version
 
 def hash_password(password):
     salt = os.urandom(16)
@@ -26,6 +29,134 @@ def verify_password(stored_password, provided_password):
     except InvalidKey:
         return False  # Password is incorrect
 
+DEFAULT_USER_CACHE_SIZE = 1024
+DEFAULT_USER_CACHE_TTL = 30.0  # Seconds
+DEFAULT_USER_CACHE_VERSION_CHECK_MS = 1000
+
+class UserCache:
+    """In-process LRU cache of authenticated user records with a time-to-live.
+
+    Each entry carries the ``users`` table version read before its row was loaded, and
+    only a lookup with the same version hits. Any write to the cached columns, from
+    whichever server process, bumps the version. The version itself is re-read at most
+    once per ``version_check`` seconds, so a change made by another process is seen
+    within that interval, and one made by this process (which calls ``invalidate``) on
+    the next lookup.
+    """
+
+    def __init__(self, max_size=DEFAULT_USER_CACHE_SIZE, ttl=DEFAULT_USER_CACHE_TTL,
+                 version_check=DEFAULT_USER_CACHE_VERSION_CHECK_MS / 1000):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.version_check = version_check
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_checked = 0.0
+        self._invalidations = 0
+        self.version_checks = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self):
+        return self.max_size > 0 and self.ttl > 0
+
+    def current_version(self, read_version):
+        """The users table version, from ``read_version()`` once the last read is older
+        than ``version_check`` seconds."""
+        now = time.monotonic()
+        with self._lock:
+            if self._version is not None and now - self._version_checked < self.version_check:
+                return self._version
+            invalidations = self._invalidations
+        version = read_version()
+        with self._lock:
+            # Not kept if an invalidation came in meanwhile: the read may predate its write
+            if invalidations == self._invalidations:
+                self._version = version
+                self._version_checked = now
+            self.version_checks += 1
+        return version
+
+    def get(self, user_id, version=None):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > time.monotonic() and entry[1] == version:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[2]
+            if entry is not None:
+                del self._entries[user_id]
+            self.misses += 1
+            return None
+
+    def set(self, user_id, user, version=None):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, version, user)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            # A lookup that read the row before the write may still store it; re-reading
+            # the version on the next lookup keeps that entry from being served
+            self._version = None
+            self._invalidations += 1
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl,
+                'version_check_seconds': self.version_check,
+                'version_checks': self.version_checks,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+def init_user_cache(app):
+    cache = UserCache(
+        max_size=app.config.get('USER_CACHE_SIZE', DEFAULT_USER_CACHE_SIZE),
+        ttl=app.config.get('USER_CACHE_TTL', DEFAULT_USER_CACHE_TTL),
+        version_check=app.config.get('USER_CACHE_VERSION_CHECK_MS', DEFAULT_USER_CACHE_VERSION_CHECK_MS) / 1000,
+    )
+    app.extensions['user_cache'] = cache
+    return cache
+
+def get_user_cache(app):
+    cache = app.extensions.get('user_cache')
+    if cache is None:
+        cache = init_user_cache(app)
+    return cache
+
+def invalidate_cached_user(app, user_id):
+    get_user_cache(app).invalidate(user_id)
+
+def load_current_user(app, user_id):
+    cache = get_user_cache(app)
+    # Read before the row, so a write that commits in between leaves the entry outdated
+    version = cache.current_version(lambda: table_version(app, 'users')) if cache.enabled else None
+    user = cache.get(user_id, version)
+    if user is None:
+        # Only the columns needed for authorization; credentials never enter the cache
+        user = query_db(app, 'SELECT user_id, username, role, is_active FROM users WHERE user_id = ?', [user_id], one=True)
+        if user is not None:
+            user = dict(user)
+            cache.set(user_id, user, version)
+    return user
+
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -41,7 +172,7 @@ def token_required(f):
 
         try:
             data = jwt.decode(token, current_app.config['JWT_SECRET_KEY'], algorithms=["HS256"])
-            current_user = query_db(current_app, 'SELECT * FROM users WHERE user_id = ?', [data['user_id']], one=True)
+            current_user = load_current_user(current_app, data['user_id'])
             if not current_user:
                 return jsonify({'message': 'User not found'}), 404
             if not current_user['is_active']:
@@ -0,0 +1,117 @@
+import threading
+from functools import wraps
+
+from flask import current_app
+
+# Requests of each class allowed to run at once in one server process; 0 lifts the limit.
+# Keep their sum below the server's threads per process (WEB_THREADS), so that scans
+# and sales always find a free thread and database connection.
+DEFAULT_CONCURRENCY_LIMITS = {'report': 2, 'export': 1}
+# Seconds a request waits for a slot before it is turned away
+DEFAULT_CONCURRENCY_WAIT = 0.5
+
+class ConcurrencyLimitExceeded(RuntimeError):
+    def __init__(self, endpoint_class):
+        super().__init__(f'Too many {endpoint_class} requests in progress')
+        self.endpoint_class = endpoint_class
+
+class ConcurrencyLimiter:
+    """Caps how many requests of each endpoint class run at once.
+
+    Long reports and exports each hold a request thread and a pooled connection for
+    their whole duration. Bounding them per class keeps the rest of the threads for
+    short requests; a request that finds its class full waits up to ``wait`` seconds
+    and is then rejected with ConcurrencyLimitExceeded.
+    """
+
+    def __init__(self, limits=None, wait=DEFAULT_CONCURRENCY_WAIT):
+        self.limits = dict(DEFAULT_CONCURRENCY_LIMITS if limits is None else limits)
+        self.wait = wait
+        self._slots = {name: threading.BoundedSemaphore(limit) for name, limit in self.limits.items() if limit}
+        self._lock = threading.Lock()
+        self._active = dict.fromkeys(self.limits, 0)
+        self._completed = dict.fromkeys(self.limits, 0)
+        self._rejected = dict.fromkeys(self.limits, 0)
+
+    def acquire(self, endpoint_class):
+        slots = self._slots.get(endpoint_class)
+        if slots is not None and not slots.acquire(timeout=self.wait):
+            with self._lock:
+                self._rejected[endpoint_class] += 1
+            raise ConcurrencyLimitExceeded(endpoint_class)
+        with self._lock:
+            self._active[endpoint_class] = self._active.get(endpoint_class, 0) + 1
+
+    def release(self, endpoint_class):
+        with self._lock:
+            self._active[endpoint_class] -= 1
+            self._completed[endpoint_class] = self._completed.get(endpoint_class, 0) + 1
+        slots = self._slots.get(endpoint_class)
+        if slots is not None:
+            slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                name: {
+                    'limit': self.limits.get(name, 0),
+                    'active': self._active.get(name, 0),
+                    'completed': self._completed.get(name, 0),
+                    'rejected': self._rejected.get(name, 0),
+                }
+                for name in self._active
+            }
+
+def init_concurrency_limiter(app):
+    limiter = ConcurrencyLimiter(
+        limits=app.config.get('CONCURRENCY_LIMITS', DEFAULT_CONCURRENCY_LIMITS),
+        wait=app.config.get('CONCURRENCY_WAIT', DEFAULT_CONCURRENCY_WAIT),
+    )
+    app.extensions['concurrency_limiter'] = limiter
+    return limiter
+
+def get_concurrency_limiter(app):
+    limiter = app.extensions.get('concurrency_limiter')
+    if limiter is None:
+        limiter = init_concurrency_limiter(app)
+    return limiter
+
+def limit_concurrency(endpoint_class):
+    """Runs the view under the slot limit of ``endpoint_class``.
+
+    ``endpoint_class`` may also be a function of no arguments that picks the class for
+    the current request, or returns None for requests that need no slot. A streamed
+    response keeps its slot until its body has been sent or the response is closed.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            name = endpoint_class() if callable(endpoint_class) else endpoint_class
+            if name is None:
+                return f(*args, **kwargs)
+            limiter = get_concurrency_limiter(current_app)
+            limiter.acquire(name)
+            try:
+                response = current_app.make_response(f(*args, **kwargs))
+            except BaseException:
+                limiter.release(name)
+                raise
+            if not response.is_streamed:
+                limiter.release(name)
+                return response
+            released = threading.Lock()
+
+            def release():
+                # Called once the body is exhausted and again when the server closes it
+                if released.acquire(blocking=False):
+                    limiter.release(name)
+
+            def body(chunks):
+                yield from chunks
+                release()
+
+            response.response = body(response.response)
+            response.call_on_close(release)
+            return response
+        return decorated
+    return decorator
@@ -1,39 +1,543 @@
+import queue
+import random
 import sqlite3
+import threading
+import time
+from collections import OrderedDict
 from flask import g
 
 DATABASE_NAME = 'inventory.db'
+DEFAULT_POOL_SIZE = 8
+DEFAULT_POOL_TIMEOUT = 30.0
+DEFAULT_BUSY_RETRIES = 3
+DEFAULT_BUSY_BACKOFF = 0.05  # Seconds; doubled (with jitter) on every retry
+# Prepared statements kept per pooled connection. The app issues a little over a hundred
+# distinct statement shapes (the optional filters of the list endpoints and the column
+# subsets of PATCH combine into more, but few of them are in use at once); the sqlite3
+# default of 128 would evict hot statements whenever a report or export runs.
+DEFAULT_CACHED_STATEMENTS = 512
+
+# Named storage profiles. journal_mode is persisted in the database file; the
+# remaining pragmas are per connection and are applied by the pool on connect.
+STORAGE_PROFILES = {
+    # Readers never wait for writers. NORMAL sync survives application crashes but may
+    # lose the most recent commits on power loss.
+    'wal': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -32000,  # ~32 MiB page cache per connection
+        'mmap_size': 268435456,
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,
+    },
+    # WAL with an fsync on every commit, for tills where no sale may ever be lost.
+    'wal-durable': {
+        'journal_mode': 'WAL',
+        'synchronous': 'FULL',
+        'cache_size': -32000,
+        'mmap_size': 268435456,
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,
+    },
+    # SQLite's stock rollback journal, for filesystems that cannot host a WAL (e.g. network shares).
+    'rollback': {
+        'journal_mode': 'DELETE',
+        'synchronous': 'FULL',
+        'cache_size': -2000,
+        'mmap_size': 0,
+        'temp_store': 'DEFAULT',
+        'busy_timeout': 5000,
+    },
+}
+DEFAULT_STORAGE_PROFILE = 'wal'
+PERSISTENT_PRAGMAS = ('journal_mode',)
+# Applied to every pooled connection whatever the storage profile. SQLite leaves foreign
+# key enforcement off unless each connection asks for it.
+CONNECTION_PRAGMAS = {'foreign_keys': 'ON'}
+
+class PoolExhaustedError(RuntimeError):
+    pass
+
+class DatabaseBusyError(sqlite3.OperationalError):
+    # The write lock stayed taken through every retry; answered with 503 (see core/app.py)
+    pass
+
+class StatementCountingConnection(sqlite3.Connection):
+    """Connection that counts how many of its statements had to be prepared.
+
+    sqlite3 keeps the last ``cached_statements`` statements of a connection prepared,
+    keyed by their SQL text, and does not report on it. This mirrors that LRU for
+    statements run through execute() and executemany(), so a statement counts as
+    prepared when the module had to compile it and as reused when it came from the
+    cache.
+    """
+
+    def __init__(self, *args, cached_statements=DEFAULT_CACHED_STATEMENTS, **kwargs):
+        super().__init__(*args, cached_statements=cached_statements, **kwargs)
+        self.cache_capacity = cached_statements
+        self.statements_executed = 0
+        self.statements_prepared = 0
+        self._seen = OrderedDict()
+
+    def _count(self, sql):
+        self.statements_executed += 1
+        if sql in self._seen:
+            self._seen.move_to_end(sql)
+            return
+        self.statements_prepared += 1
+        if self.cache_capacity:
+            self._seen[sql] = None
+            if len(self._seen) > self.cache_capacity:
+                self._seen.popitem(last=False)
+
+    def execute(self, sql, *args):
+        self._count(sql)
+        return super().execute(sql, *args)
+
+    def executemany(self, sql, *args):
+        self._count(sql)
+        return super().executemany(sql, *args)
+
+def in_list(values):
+    """Placeholders and arguments for ``column IN (...)`` over ``values``.
+
+    The list is padded to the next power of two by repeating its last value, which
+    leaves the result unchanged, so lists of any length share a handful of statement
+    texts and stay in the statement cache. ``values`` must not be empty.
+    """
+    values = list(values)
+    size = 1
+    while size < len(values):
+        size *= 2
+    return ', '.join('?' * size), values + values[-1:] * (size - len(values))
+
+def parse_fields(params, allowed):
+    """Columns requested by the ``fields`` parameter of a list endpoint, in request order.
+
+    Returns None when the parameter is absent, meaning every column. Raises ValueError
+    naming the first field not in ``allowed``; as only whitelisted names come back, they
+    can be written into the SELECT list as they are.
+    """
+    if 'fields' not in params:
+        return None
+    fields = list(dict.fromkeys(name.strip() for name in params['fields'].split(',') if name.strip()))
+    if not fields:
+        raise ValueError('fields must name at least one field')
+    for name in fields:
+        if name not in allowed:
+            raise ValueError(f'Invalid field: {name}')
+    return fields
+
+class ConnectionPool:
+    """Bounded pool of long-lived SQLite connections shared by request threads.
+
+    Connections are opened lazily up to ``size``, configured once with the
+    given pragmas and handed back to the pool at app context teardown instead
+    of being closed, so requests reuse a warm page and schema cache.
+    """
+
+    def __init__(self, database, size=DEFAULT_POOL_SIZE, timeout=DEFAULT_POOL_TIMEOUT, pragmas=None,
+                 cached_statements=DEFAULT_CACHED_STATEMENTS):
+        if size < 1:
+            raise ValueError('Pool size must be at least 1')
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self.pragmas = dict(pragmas or {})
+        self.cached_statements = cached_statements
+        self.on_connect = []  # Callables run with every newly opened connection
+        self._connections = set()  # Open connections, for the statement counters
+        self._connects = 0
+        self._retired_executed = 0
+        self._retired_prepared = 0
+        self._idle = queue.LifoQueue()  # LIFO hands out the most recently used (warmest) connection
+        self._lock = threading.Lock()
+        self._closed = False  # Connections released after close() are closed instead of kept
+        self._opened = 0
+        self._in_use = 0
+        self._checkouts = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _connect(self):
+        # Connections migrate between request threads, but only one thread holds a connection at a time.
+        conn = sqlite3.connect(self.database, check_same_thread=False, factory=StatementCountingConnection,
+                               cached_statements=self.cached_statements)
+        conn.row_factory = sqlite3.Row  # Access columns by name
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        for hook in self.on_connect:
+            hook(conn)
+        with self._lock:
+            self._connections.add(conn)
+            self._connects += 1
+        return conn
+
+    def acquire(self):
+        start = time.perf_counter()
+        waited = False
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_open = self._opened < self.size
+                if can_open:
+                    self._opened += 1
+            if can_open:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._opened -= 1
+                    raise
+            else:
+                waited = True
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self._timeouts += 1
+                    raise PoolExhaustedError(
+                        f'No database connection became available within {self.timeout} seconds')
+
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._in_use += 1
+            self._checkouts += 1
+            if waited:
+                self._waits += 1
+                self._wait_total += elapsed
+                self._wait_max = max(self._wait_max, elapsed)
+        return conn
+
+    def release(self, conn):
+        with self._lock:
+            self._in_use -= 1
+        try:
+            # Never hand an open transaction to the next request.
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        with self._lock:
+            if not self._closed:
+                self._idle.put(conn)
+                return
+        self._discard(conn)  # The pool was closed while this connection was checked out
+
+    def _discard(self, conn):
+        with self._lock:
+            self._opened -= 1
+            if conn in self._connections:
+                self._connections.discard(conn)
+                self._retired_executed += conn.statements_executed
+                self._retired_prepared += conn.statements_prepared
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def reset_after_fork(self):
+        # A forked child inherits the parent's connections, which it must neither use nor
+        # close (SQLite connections do not survive a fork); it forgets them and opens its own.
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._in_use = 0
+        self._connections = set()
+
+    def close(self):
+        # Idle connections are closed now; those still checked out when they are released
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+    def stats(self):
+        with self._lock:
+            # Counters are read without the owning thread's cooperation; they may lag by a statement
+            executed = self._retired_executed + sum(conn.statements_executed for conn in self._connections)
+            prepared = self._retired_prepared + sum(conn.statements_prepared for conn in self._connections)
+            return {
+                'size': self.size,
+                'open': self._opened,
+                'connections_opened': self._connects,
+                'in_use': self._in_use,
+                'idle': self._opened - self._in_use,
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'timeouts': self._timeouts,
+                'wait_seconds_total': self._wait_total,
+                'wait_seconds_max': self._wait_max,
+                'cached_statements': self.cached_statements,
+                'statements_executed': executed,
+                'statements_prepared': prepared,
+                'statement_cache_hit_ratio': (executed - prepared) / executed if executed else 0.0,
+            }
+
+def resolve_storage_profile(profile=None):
+    if profile is None:
+        profile = DEFAULT_STORAGE_PROFILE
+    if isinstance(profile, str):
+        if profile not in STORAGE_PROFILES:
+            raise ValueError(f'Unknown storage profile: {profile}')
+        return dict(STORAGE_PROFILES[profile])
+    return dict(profile)
+
+def connection_pragmas(profile=None):
+    pragmas = dict(CONNECTION_PRAGMAS)
+    pragmas.update((name, value) for name, value in resolve_storage_profile(profile).items() if name not in PERSISTENT_PRAGMAS)
+    return pragmas
+
+def apply_storage_profile(db, profile=None):
+    for name, value in resolve_storage_profile(profile).items():
+        db.execute(f'PRAGMA {name} = {value}')
+
+def init_storage(app):
+    # Switching the journal mode needs a connection with no open transaction, so do it once at startup.
+    db = sqlite3.connect(app.config['DATABASE'])
+    try:
+        apply_storage_profile(db, app.config.get('DATABASE_STORAGE_PROFILE'))
+    finally:
+        db.close()
+
+_default_pool = None
+_pool_lock = threading.Lock()
+
+def init_pool(app):
+    pragmas = connection_pragmas(app.config.get('DATABASE_STORAGE_PROFILE'))
+    pragmas.update(app.config.get('DATABASE_PRAGMAS') or {})
+    pool = ConnectionPool(
+        app.config['DATABASE'],
+        size=app.config.get('DATABASE_POOL_SIZE', DEFAULT_POOL_SIZE),
+        timeout=app.config.get('DATABASE_POOL_TIMEOUT', DEFAULT_POOL_TIMEOUT),
+        pragmas=pragmas,
+        cached_statements=app.config.get('DATABASE_CACHED_STATEMENTS', DEFAULT_CACHED_STATEMENTS),
+    )
+    app.extensions['sqlite_pool'] = pool
+    return pool
+
+def get_pool(app=None):
+    global _default_pool
+    with _pool_lock:
+        if app is None:
+            if _default_pool is None:
+                # Default path for non-test environment
+                _default_pool = ConnectionPool(DATABASE_NAME, pragmas=connection_pragmas())
+            return _default_pool
+        pool = app.extensions.get('sqlite_pool')
+        if pool is None:
+            pool = init_pool(app)
+        return pool
+
+def close_pool(app=None):
+    global _default_pool
+    with _pool_lock:
+        if app is None:
+            pool, _default_pool = _default_pool, None
+        else:
+            pool = app.extensions.pop('sqlite_pool', None)
+    if pool is not None:
+        pool.close()
+
+def get_pool_stats(app=None):
+    return get_pool(app).stats()
 
 def get_db(app=None):
-    if app is not None:
-        db_path = app.config['DATABASE']
-    else:
-        db_path = DATABASE_NAME  # Default path for non-test environment
     db = getattr(g, '_database', None)
     if db is None:
-        db = g._database = sqlite3.connect(db_path)
-        db.row_factory = sqlite3.Row  # Access columns by name
+        pool = get_pool(app)
+        db = g._database = pool.acquire()
+        g._database_pool = pool
     return db
 
 def close_db(exception):
-    db = getattr(g, '_database', None)
+    db = g.pop('_database', None)
     if db is not None:
-        db.close()
+        g.pop('_database_pool').release(db)
 
-def query_db(app, query, args=(), one=False):
-    cur = get_db(app).execute(query, args)
-    rv = cur.fetchall()
-    cur.close()
+def _is_busy_error(error):
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+def _get_metrics(app):
+    # The metrics registry, present only when instrumentation is enabled (see core/metrics.py)
+    return app.extensions.get('metrics') if app is not None else None
+
+def _run_with_busy_retry(app, db, operation):
+    # The connection's busy_timeout already waits for the lock; this retries what is left
+    # over with jittered exponential backoff. Statements that joined a transaction opened by
+    # the caller are never retried, since rolling back would discard the caller's work.
+    config = app.config if app is not None else {}
+    retries = config.get('DATABASE_BUSY_RETRIES', DEFAULT_BUSY_RETRIES)
+    backoff = config.get('DATABASE_BUSY_BACKOFF', DEFAULT_BUSY_BACKOFF)
+    retryable = not db.in_transaction
+    attempt = 0
+    while True:
+        try:
+            return operation()
+        except sqlite3.OperationalError as e:
+            if not _is_busy_error(e):
+                raise
+            if not retryable or attempt >= retries:
+                raise DatabaseBusyError(str(e)) from e
+            if db.in_transaction:
+                db.rollback()
+            time.sleep(backoff * (2 ** attempt) * (0.5 + random.random()))
+            attempt += 1
+
+def query_db(app, query, args=(), one=False, columns=False):
+    # With columns=True, returns the tuple of column names and the rows as plain tuples,
+    # for responses that do not need sqlite3.Row's access by name (see core/json_provider.py).
+    db = get_db(app)
+    names = None
+
+    def run():
+        nonlocal names
+        cur = db.execute(query, args)
+        if columns:
+            cur.row_factory = None
+            names = tuple(column[0] for column in cur.description)
+        rv = cur.fetchall()
+        cur.close()
+        return rv
+
+    metrics = _get_metrics(app)
+    if metrics is None:
+        rv = _run_with_busy_retry(app, db, run)
+    else:
+        start = time.perf_counter()
+        rv = _run_with_busy_retry(app, db, run)
+        metrics.observe_statement(db, query, args, time.perf_counter() - start, len(rv))
+    if columns:
+        return names, rv
     return (rv[0] if rv else None) if one else rv
 
+def iter_query(app, query, args=(), size=500, columns=False):
+    # Yields rows straight from the cursor in batches of `size`, for responses that must
+    # not materialize the whole result set. With columns=True the first item is the
+    # tuple of column names, which is known even when no rows match.
+    # Only the time spent in SQLite is observed, not the time the consumer takes per batch.
+    db = get_db(app)
+    metrics = _get_metrics(app)
+    start = time.perf_counter()
+    cur = _run_with_busy_retry(app, db, lambda: db.execute(query, args))
+    elapsed = time.perf_counter() - start
+    count = 0
+    try:
+        if columns:
+            yield tuple(column[0] for column in cur.description)
+        while True:
+            start = time.perf_counter()
+            rows = cur.fetchmany(size)
+            elapsed += time.perf_counter() - start
+            if not rows:
+                break
+            count += len(rows)
+            yield from rows
+    finally:
+        cur.close()
+    if metrics is not None:
+        metrics.observe_statement(db, query, args, elapsed, count)
+
 def execute_query(app, query, args=()):
     db = get_db(app)
-    cur = db.execute(query, args)
-    db.commit()
-    lastrowid = cur.lastrowid
-    cur.close()
+
+    def run():
+        cur = db.execute(query, args)
+        db.commit()
+        result = cur.lastrowid, cur.rowcount
+        cur.close()
+        return result
+
+    metrics = _get_metrics(app)
+    if metrics is None:
+        return _run_with_busy_retry(app, db, run)[0]
+    start = time.perf_counter()
+    lastrowid, rowcount = _run_with_busy_retry(app, db, run)
+    metrics.observe_statement(db, query, args, time.perf_counter() - start, max(rowcount, 0))
     return lastrowid
 
-def init_db(db):
+def execute_returning(app, query, args=()):
+    # Runs a write with a RETURNING clause and commits it, returning the first row
+    # produced (None when the statement touched no rows).
+    db = get_db(app)
+    owns_transaction = not db.in_transaction
+
+    def run():
+        try:
+            rows = db.execute(query, args).fetchall()
+        except sqlite3.IntegrityError:
+            # Let the caller inspect the database without holding the write lock
+            if owns_transaction and db.in_transaction:
+                db.rollback()
+            raise
+        db.commit()
+        return rows
+
+    metrics = _get_metrics(app)
+    if metrics is None:
+        rows = _run_with_busy_retry(app, db, run)
+    else:
+        start = time.perf_counter()
+        rows = _run_with_busy_retry(app, db, run)
+        metrics.observe_statement(db, query, args, time.perf_counter() - start, len(rows))
+    return rows[0] if rows else None
+
+def execute_in_transaction(app, query, args=(), many=False):
+    # A write inside the transaction of run_in_transaction: observed like the other
+    # helpers, but neither committed nor retried on its own. With many=True, args is a
+    # list of argument sets for executemany, of which the first stands in for all of them
+    # in the slow query log. Returns the number of rows changed.
+    db = get_db(app)
+    start = time.perf_counter()
+    cur = db.executemany(query, args) if many else db.execute(query, args)
+    rowcount = max(cur.rowcount, 0)
+    cur.close()
+    metrics = _get_metrics(app)
+    if metrics is not None:
+        metrics.observe_statement(db, query, (args[0] if args else ()) if many else args,
+                                  time.perf_counter() - start, rowcount)
+    return rowcount
+
+def run_in_transaction(app, work):
+    """Runs ``work()`` between BEGIN IMMEDIATE and COMMIT and returns its result.
+
+    For writes that read and change several tables at once. ``work`` runs its
+    statements through query_db and execute_in_transaction, so they are observed by
+    the metrics registry. When the write lock cannot be had the whole transaction is
+    rolled back and run again with the backoff of single statements, so ``work`` must
+    start from scratch on every call; DatabaseBusyError is raised once the retries
+    are used up.
+    """
+    db = get_db(app)
+
+    def run():
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            result = work()
+            db.commit()
+        except BaseException:
+            db.rollback()
+            raise
+        return result
+
+    return _run_with_busy_retry(app, db, run)
+
+def table_version(app, table):
+    # Write counter kept by triggers for the tables listed in table_versions
+    row = query_db(app, 'SELECT version FROM table_versions WHERE table_name = ?', [table], one=True)
+    return row['version'] if row else 0
+
+def init_db(db, profile=None):
+    apply_storage_profile(db, profile)
     sql_script = """
 -- Create the users table
 CREATE TABLE users (
@@ -140,4 +644,356 @@ INSERT INTO categories (name) VALUES ('School Supplies');
         """
     db.executescript(sql_script)
     db.commit()
+    migrate_db(db)
     print("Database initialized.")
+
+# Schema changes layered on top of the base script in init_db, applied in order. The
+# number of applied migrations is recorded in PRAGMA user_version, so existing databases
+# are upgraded by create_app on startup and fresh ones by init_db.
+MIGRATIONS = [
+    # Lets bulk ingestion suspend the per-row stock trigger and apply stock deltas in
+    # aggregate. The flag is only ever set inside a write transaction and cleared again
+    # before commit, so other connections never observe it.
+    ('defer_stock_trigger', """
+CREATE TABLE stock_trigger_control (
+    control_id INTEGER PRIMARY KEY CHECK (control_id = 1),
+    deferred INTEGER NOT NULL DEFAULT 0 CHECK (deferred IN (0, 1))
+);
+INSERT INTO stock_trigger_control (control_id, deferred) VALUES (1, 0);
+
+DROP TRIGGER update_stock_on_hand_insert;
+CREATE TRIGGER update_stock_on_hand_insert
+AFTER INSERT ON transactions
+WHEN NOT EXISTS (SELECT 1 FROM stock_trigger_control WHERE deferred = 1)
+BEGIN
+    UPDATE products
+    SET stock_on_hand = CASE
+        WHEN NEW.transaction_type = 'Delivery' THEN stock_on_hand + NEW.quantity
+        WHEN NEW.transaction_type IN ('Sale', 'Pull-out', 'Return') THEN stock_on_hand - NEW.quantity
+        ELSE stock_on_hand -- Handle other transaction types if needed, or do nothing
+    END
+    WHERE product_id = NEW.product_id;
+END;
+"""),
+    # Secondary indexes shaped after the filters of GET /transactions and GET /products.
+    # Every transaction index ends in transaction_date so that date ranges and date
+    # ordering are served from the same index as the equality filter.
+    ('filter_indexes', """
+CREATE INDEX idx_transactions_date ON transactions (transaction_date);
+CREATE INDEX idx_transactions_product_date ON transactions (product_id, transaction_date);
+CREATE INDEX idx_transactions_type_date ON transactions (transaction_type, transaction_date);
+CREATE INDEX idx_transactions_user_date ON transactions (user_id, transaction_date);
+CREATE INDEX idx_transactions_supplier_date ON transactions (supplier_id, transaction_date);
+
+CREATE INDEX idx_products_category_active ON products (category_id, is_active);
+CREATE INDEX idx_products_supplier_active ON products (supplier_id, is_active);
+CREATE INDEX idx_products_active_stock ON products (is_active, stock_on_hand);
+CREATE INDEX idx_products_stock ON products (stock_on_hand);
+"""),
+    # Per day, product and transaction type totals of the transactions ledger, kept
+    # incrementally by triggers so reports never have to scan the full history. The day
+    # is the date part of transaction_date. Backfilled from the existing ledger.
+    ('daily_product_movements', """
+CREATE TABLE daily_product_movements (
+    transaction_type TEXT NOT NULL,
+    movement_date TEXT NOT NULL,
+    product_id INTEGER NOT NULL,
+    quantity REAL NOT NULL DEFAULT 0,
+    amount REAL NOT NULL DEFAULT 0, -- SUM(quantity * price); price is only set for sales and returns
+    transaction_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (transaction_type, movement_date, product_id)
+) WITHOUT ROWID;
+CREATE INDEX idx_daily_product_movements_product_date ON daily_product_movements (product_id, movement_date);
+
+CREATE TRIGGER update_daily_product_movements_insert
+AFTER INSERT ON transactions
+BEGIN
+    INSERT INTO daily_product_movements (transaction_type, movement_date, product_id, quantity, amount, transaction_count)
+    VALUES (NEW.transaction_type, substr(NEW.transaction_date, 1, 10), NEW.product_id,
+            NEW.quantity, NEW.quantity * COALESCE(NEW.price, 0), 1)
+    ON CONFLICT (transaction_type, movement_date, product_id) DO UPDATE SET
+        quantity = quantity + excluded.quantity,
+        amount = amount + excluded.amount,
+        transaction_count = transaction_count + 1;
+END;
+
+CREATE TRIGGER update_daily_product_movements_update
+AFTER UPDATE OF transaction_type, transaction_date, product_id, quantity, price ON transactions
+BEGIN
+    UPDATE daily_product_movements
+    SET quantity = quantity - OLD.quantity,
+        amount = amount - OLD.quantity * COALESCE(OLD.price, 0),
+        transaction_count = transaction_count - 1
+    WHERE transaction_type = OLD.transaction_type AND movement_date = substr(OLD.transaction_date, 1, 10) AND product_id = OLD.product_id;
+    DELETE FROM daily_product_movements
+    WHERE transaction_type = OLD.transaction_type AND movement_date = substr(OLD.transaction_date, 1, 10) AND product_id = OLD.product_id
+      AND transaction_count = 0;
+    INSERT INTO daily_product_movements (transaction_type, movement_date, product_id, quantity, amount, transaction_count)
+    VALUES (NEW.transaction_type, substr(NEW.transaction_date, 1, 10), NEW.product_id,
+            NEW.quantity, NEW.quantity * COALESCE(NEW.price, 0), 1)
+    ON CONFLICT (transaction_type, movement_date, product_id) DO UPDATE SET
+        quantity = quantity + excluded.quantity,
+        amount = amount + excluded.amount,
+        transaction_count = transaction_count + 1;
+END;
+
+CREATE TRIGGER update_daily_product_movements_delete
+AFTER DELETE ON transactions
+BEGIN
+    UPDATE daily_product_movements
+    SET quantity = quantity - OLD.quantity,
+        amount = amount - OLD.quantity * COALESCE(OLD.price, 0),
+        transaction_count = transaction_count - 1
+    WHERE transaction_type = OLD.transaction_type AND movement_date = substr(OLD.transaction_date, 1, 10) AND product_id = OLD.product_id;
+    DELETE FROM daily_product_movements
+    WHERE transaction_type = OLD.transaction_type AND movement_date = substr(OLD.transaction_date, 1, 10) AND product_id = OLD.product_id
+      AND transaction_count = 0;
+END;
+
+INSERT INTO daily_product_movements (transaction_type, movement_date, product_id, quantity, amount, transaction_count)
+SELECT transaction_type, substr(transaction_date, 1, 10), product_id, SUM(quantity), SUM(quantity * COALESCE(price, 0)), COUNT(*)
+FROM transactions
+GROUP BY transaction_type, substr(transaction_date, 1, 10), product_id;
+"""),
+    # A counter per catalog table, bumped by every write to it (stock movements included),
+    # so GET handlers can derive an ETag without reading any rows.
+    ('table_versions', """
+CREATE TABLE table_versions (
+    table_name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+INSERT INTO table_versions (table_name) VALUES ('products'), ('suppliers'), ('categories');
+
+CREATE TRIGGER bump_products_version_insert
+AFTER INSERT ON products
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'products';
+END;
+
+CREATE TRIGGER bump_products_version_update
+AFTER UPDATE ON products
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'products';
+END;
+
+CREATE TRIGGER bump_products_version_delete
+AFTER DELETE ON products
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'products';
+END;
+
+CREATE TRIGGER bump_suppliers_version_insert
+AFTER INSERT ON suppliers
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'suppliers';
+END;
+
+CREATE TRIGGER bump_suppliers_version_update
+AFTER UPDATE ON suppliers
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'suppliers';
+END;
+
+CREATE TRIGGER bump_suppliers_version_delete
+AFTER DELETE ON suppliers
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'suppliers';
+END;
+
+CREATE TRIGGER bump_categories_version_insert
+AFTER INSERT ON categories
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'categories';
+END;
+
+CREATE TRIGGER bump_categories_version_update
+AFTER UPDATE ON categories
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'categories';
+END;
+
+CREATE TRIGGER bump_categories_version_delete
+AFTER DELETE ON categories
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'categories';
+END;
+"""),
+    # Like the products counter, but blind to stock_on_hand, so in-process copies of the
+    # product catalog survive the stock updates of every sale.
+    ('product_catalog_version', """
+INSERT INTO table_versions (table_name) VALUES ('product_catalog');
+
+CREATE TRIGGER bump_product_catalog_version_insert
+AFTER INSERT ON products
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'product_catalog';
+END;
+
+CREATE TRIGGER bump_product_catalog_version_update
+AFTER UPDATE OF product_id, item_code, name, description, supplier_id, category_id, unit_cost, selling_price, is_vat_exempt, is_active ON products
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'product_catalog';
+END;
+
+CREATE TRIGGER bump_product_catalog_version_delete
+AFTER DELETE ON products
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'product_catalog';
+END;
+"""),
+    # Full-text index over the searchable product columns for GET /products/search. It is
+    # an external-content table (the text lives only in products), kept in step by
+    # triggers that ignore stock updates. Every token is also indexed by its 2-4
+    # character prefixes so typeahead queries stay cheap.
+    ('products_fts', """
+CREATE VIRTUAL TABLE products_fts USING fts5(
+    item_code, name, description,
+    content = 'products', content_rowid = 'product_id',
+    tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4'
+);
+
+CREATE TRIGGER products_fts_insert
+AFTER INSERT ON products
+BEGIN
+    INSERT INTO products_fts (rowid, item_code, name, description)
+    VALUES (NEW.product_id, NEW.item_code, NEW.name, NEW.description);
+END;
+
+CREATE TRIGGER products_fts_update
+AFTER UPDATE OF item_code, name, description ON products
+BEGIN
+    INSERT INTO products_fts (products_fts, rowid, item_code, name, description)
+    VALUES ('delete', OLD.product_id, OLD.item_code, OLD.name, OLD.description);
+    INSERT INTO products_fts (rowid, item_code, name, description)
+    VALUES (NEW.product_id, NEW.item_code, NEW.name, NEW.description);
+END;
+
+CREATE TRIGGER products_fts_delete
+AFTER DELETE ON products
+BEGIN
+    INSERT INTO products_fts (products_fts, rowid, item_code, name, description)
+    VALUES ('delete', OLD.product_id, OLD.item_code, OLD.name, OLD.description);
+END;
+
+INSERT INTO products_fts (products_fts) VALUES ('rebuild');
+"""),
+    # Per product stock at the end of a day, written by core.stock_snapshots so the
+    # stock-on-hand report can answer as_of dates without replaying the whole ledger.
+    # A date only counts once it is 'complete'; a ledger change dated on or before it
+    # marks it 'stale', since the stock it recorded no longer matches the ledger.
+    ('stock_snapshots', """
+CREATE TABLE stock_snapshot_dates (
+    snapshot_date TEXT PRIMARY KEY,
+    status TEXT NOT NULL CHECK (status IN ('building', 'complete', 'stale')),
+    created_at TEXT NOT NULL,
+    product_count INTEGER
+) WITHOUT ROWID;
+
+CREATE TABLE stock_snapshots (
+    snapshot_date TEXT NOT NULL,
+    product_id INTEGER NOT NULL,
+    stock_on_hand REAL NOT NULL,
+    PRIMARY KEY (snapshot_date, product_id)
+) WITHOUT ROWID;
+
+CREATE TRIGGER stale_stock_snapshots_insert
+AFTER INSERT ON transactions
+BEGIN
+    UPDATE stock_snapshot_dates SET status = 'stale'
+    WHERE snapshot_date >= substr(NEW.transaction_date, 1, 10) AND status != 'stale';
+END;
+
+CREATE TRIGGER stale_stock_snapshots_update
+AFTER UPDATE OF transaction_type, transaction_date, product_id, quantity ON transactions
+BEGIN
+    UPDATE stock_snapshot_dates SET status = 'stale'
+    WHERE snapshot_date >= min(substr(OLD.transaction_date, 1, 10), substr(NEW.transaction_date, 1, 10))
+      AND status != 'stale';
+END;
+
+CREATE TRIGGER stale_stock_snapshots_delete
+AFTER DELETE ON transactions
+BEGIN
+    UPDATE stock_snapshot_dates SET status = 'stale'
+    WHERE snapshot_date >= substr(OLD.transaction_date, 1, 10) AND status != 'stale';
+END;
+"""),
+    # Runs of the stock_on_hand vs ledger reconciliation in core.reconciliation, with
+    # the product_id checkpoint each run resumes from, the discrepancies it found and
+    # an audit log of the corrections applied to stock_on_hand.
+    ('stock_reconciliation', """
+CREATE TABLE stock_reconciliation_runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    status TEXT NOT NULL CHECK (status IN ('running', 'complete')),
+    started_at TEXT NOT NULL,
+    finished_at TEXT,
+    last_product_id INTEGER NOT NULL DEFAULT 0,
+    products_checked INTEGER NOT NULL DEFAULT 0,
+    discrepancy_count INTEGER NOT NULL DEFAULT 0,
+    user_id INTEGER,
+    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE SET NULL
+);
+
+CREATE TABLE stock_reconciliation_discrepancies (
+    run_id INTEGER NOT NULL,
+    product_id INTEGER NOT NULL,
+    recorded_stock REAL NOT NULL,
+    ledger_stock REAL NOT NULL,
+    PRIMARY KEY (run_id, product_id),
+    FOREIGN KEY (run_id) REFERENCES stock_reconciliation_runs(run_id) ON DELETE CASCADE,
+    FOREIGN KEY (product_id) REFERENCES products(product_id) ON DELETE CASCADE
+) WITHOUT ROWID;
+
+CREATE TABLE stock_adjustments (
+    adjustment_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    product_id INTEGER NOT NULL,
+    run_id INTEGER,
+    previous_stock REAL NOT NULL,
+    new_stock REAL NOT NULL,
+    user_id INTEGER,
+    adjusted_at TEXT NOT NULL,
+    FOREIGN KEY (product_id) REFERENCES products(product_id) ON DELETE RESTRICT,
+    FOREIGN KEY (run_id) REFERENCES stock_reconciliation_runs(run_id) ON DELETE SET NULL,
+    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE SET NULL
+);
+CREATE INDEX idx_stock_adjustments_product ON stock_adjustments (product_id, adjusted_at);
+"""),
+    # Bumped by changes to the user columns core.auth caches, so every server process
+    # notices a role change or deactivation on its next lookup. Refresh token and
+    # password updates leave it alone.
+    ('users_version', """
+INSERT INTO table_versions (table_name) VALUES ('users');
+
+CREATE TRIGGER bump_users_version_update
+AFTER UPDATE OF user_id, username, role, is_active ON users
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'users';
+END;
+
+CREATE TRIGGER bump_users_version_delete
+AFTER DELETE ON users
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'users';
+END;
+"""),
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def migrate_db(db):
+    version = db.execute('PRAGMA user_version').fetchone()[0]
+    for number, (name, script) in enumerate(MIGRATIONS[version:], start=version + 1):
+        try:
+            db.executescript(f'BEGIN;\n{script}\nPRAGMA user_version = {number};\nCOMMIT;')
+        except sqlite3.Error:
+            db.rollback()
+            raise
+    return db.execute('PRAGMA user_version').fetchone()[0]
+
+def upgrade_db(app):
+    db = sqlite3.connect(app.config['DATABASE'])
+    try:
+        # A brand-new file is left to init_db, which runs the base schema and then the migrations.
+        if db.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'transactions'").fetchone():
+            migrate_db(db)
+    finally:
+        db.close()
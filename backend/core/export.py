@@ -0,0 +1,154 @@
+# Streaming CSV, JSON and XLSX writers for report exports. All take the column names
+# and an iterable of rows and yield the file piece by piece, so an export never
+# holds more than one batch of rows in memory.
+import csv
+import json
+import re
+import zipfile
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+CSV_MIMETYPE = 'text/csv'
+JSON_MIMETYPE = 'application/json'
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Rows buffered before a chunk is handed to the client
+FLUSH_ROWS = 500
+
+class _ChunkBuffer:
+    """Write-only sink that hands back whatever was written since the last drain.
+
+    It deliberately has no seek() or tell(), so zipfile writes the archive as a
+    stream with data descriptors instead of seeking back to patch headers.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(chunk.encode() if isinstance(chunk, str) else chunk for chunk in self._chunks)
+        self._chunks = []
+        return data
+
+def stream_csv(columns, rows):
+    buffer = _ChunkBuffer()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % FLUSH_ROWS == 0:
+            yield buffer.drain()
+    yield buffer.drain()
+
+def stream_json(columns, rows, list_format='json', dumps=json.dumps):
+    # A JSON array with one object per row, or for list_format='compact' the column names
+    # once and each row as an array, as core.json_provider.list_payload lays them out
+    if list_format == 'compact':
+        head, tail = f'{{"columns":{dumps(list(columns))},"rows":[', ']}'
+        encode = list
+    else:
+        head, tail = '[', ']'
+        encode = lambda row: dict(zip(columns, row))
+    pending = [head]
+    separator = ''
+    for row in rows:
+        pending.append(separator + dumps(encode(row)))
+        separator = ','
+        if len(pending) >= FLUSH_ROWS:
+            yield ''.join(pending).encode()
+            pending = []
+    pending.append(tail)
+    yield ''.join(pending).encode()
+
+# Characters XML 1.0 does not allow, even escaped
+_ILLEGAL_XML = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+def _column_letter(index):
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+def _cell(reference, value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return f'<c r="{reference}" t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c r="{reference}"><v>{value!r}</v></c>'
+    text = escape(_ILLEGAL_XML.sub('', str(value)))
+    return f'<c r="{reference}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+def _sheet_row(number, values, letters):
+    cells = ''.join(_cell(f'{letters[i]}{number}', value) for i, value in enumerate(values))
+    return f'<row r="{number}">{cells}</row>'
+
+_CONTENT_TYPES = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>
+<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>
+</Types>'''
+
+_ROOT_RELS = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>
+</Relationships>'''
+
+_WORKBOOK = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets>
+</workbook>'''
+
+_WORKBOOK_RELS = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>
+</Relationships>'''
+
+_SHEET_HEADER = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'''
+
+_SHEET_FOOTER = '</sheetData></worksheet>'
+
+def stream_xlsx(sheet_name, columns, rows):
+    # A single-sheet workbook using inline strings, which unlike a shared string
+    # table can be written before all the rows have been seen
+    buffer = _ChunkBuffer()
+    letters = [_column_letter(i) for i in range(len(columns))]
+    date_time = datetime.now().timetuple()[:6]
+    # Excel limits sheet names to 31 characters
+    name = escape(_ILLEGAL_XML.sub('', sheet_name)[:31])
+
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for filename, content in (('[Content_Types].xml', _CONTENT_TYPES),
+                                  ('_rels/.rels', _ROOT_RELS),
+                                  ('xl/workbook.xml', _WORKBOOK.format(name=name)),
+                                  ('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)):
+            archive.writestr(zipfile.ZipInfo(filename, date_time), content, zipfile.ZIP_DEFLATED)
+        yield buffer.drain()
+
+        sheet_info = zipfile.ZipInfo('xl/worksheets/sheet1.xml', date_time)
+        sheet_info.compress_type = zipfile.ZIP_DEFLATED
+        with archive.open(sheet_info, 'w', force_zip64=True) as sheet:
+            sheet.write(_SHEET_HEADER.encode())
+            sheet.write(_sheet_row(1, columns, letters).encode())
+            pending = []
+            for number, row in enumerate(rows, 2):
+                pending.append(_sheet_row(number, row, letters))
+                if len(pending) == FLUSH_ROWS:
+                    sheet.write(''.join(pending).encode())
+                    pending = []
+                    yield buffer.drain()
+            sheet.write((''.join(pending) + _SHEET_FOOTER).encode())
+        yield buffer.drain()
+    yield buffer.drain()
@@ -0,0 +1,209 @@
+import queue
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+from core.database import DEFAULT_BUSY_RETRIES, DEFAULT_BUSY_BACKOFF, _is_busy_error, get_pool
+
+DEFAULT_GROUP_COMMIT_ROWS = 64
+DEFAULT_GROUP_COMMIT_MS = 2  # How long the writer waits after the first queued row for more
+DEFAULT_GROUP_COMMIT_TIMEOUT = 10  # Seconds a request waits for its row's commit
+
+class GroupCommitWriter:
+    """Commits single-row writes from many request threads in shared transactions.
+
+    Writes are queued to one writer thread with its own connection. It takes up to
+    ``max_rows`` of them, waiting at most ``max_delay`` seconds after the first for
+    more to arrive, and runs them in one transaction, so a burst of sales costs one
+    commit (and one fsync under wal-durable) instead of one each. Every write runs in
+    its own savepoint, so a row that breaks a constraint is rolled back alone. The
+    future returned by submit() resolves only after the row's transaction has
+    committed, with the row produced by the statement's RETURNING clause, or fails
+    with the statement's error. A write still queued can be withdrawn with the
+    future's cancel(). Should the writer thread itself fail, every write it holds or
+    has queued fails with that error and the next submit() starts a new writer.
+    """
+
+    def __init__(self, database, pragmas=None, max_rows=DEFAULT_GROUP_COMMIT_ROWS, max_delay=DEFAULT_GROUP_COMMIT_MS / 1000,
+                 busy_retries=DEFAULT_BUSY_RETRIES, busy_backoff=DEFAULT_BUSY_BACKOFF):
+        if max_rows < 1:
+            raise ValueError('max_rows must be at least 1')
+        self.database = database
+        self.pragmas = dict(pragmas or {})
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.busy_retries = busy_retries
+        self.busy_backoff = busy_backoff
+        self._queue = queue.Queue()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._rows = 0
+        self._failed = 0
+        self._largest_batch = 0
+        self._commit_total = 0.0
+        self._crashes = 0
+
+    def submit(self, query, args=()):
+        future = Future()
+        # Started on first use, so importing the app (or preloading it before a fork) spawns
+        # nothing. Queued under the lock, so a writer that is failing cannot strand the write.
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='group-commit-writer', daemon=True)
+                self._thread.start()
+            self._queue.put((query, args, future))
+        return future
+
+    def _connect(self):
+        conn = sqlite3.connect(self.database, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _run(self):
+        batch = []
+        try:
+            conn = self._connect()
+            try:
+                stopping = False
+                while not stopping:
+                    item = self._queue.get()
+                    if item is None:
+                        break
+                    batch = [item]
+                    deadline = time.perf_counter() + self.max_delay
+                    while len(batch) < self.max_rows:
+                        try:
+                            item = self._queue.get(timeout=max(deadline - time.perf_counter(), 0))
+                        except queue.Empty:
+                            break
+                        if item is None:
+                            stopping = True
+                            break
+                        batch.append(item)
+                    # Writes whose request gave up while they were queued are dropped
+                    batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+                    if batch:
+                        self._commit(conn, batch)
+                    batch = []
+            finally:
+                conn.close()
+        except BaseException as error:
+            self._fail(batch, error)
+
+    def _fail(self, batch, error):
+        # The writer is going away: nothing it holds or has queued would ever be answered
+        with self._thread_lock:
+            if self._thread is threading.current_thread():
+                self._thread = None
+            pending = list(batch)
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not None:
+                    pending.append(item)
+        with self._lock:
+            self._crashes += 1
+        for _, _, future in pending:
+            if not future.done():
+                future.set_exception(error)
+
+    def _commit(self, conn, batch):
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            outcomes = []
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                for query, args, _ in batch:
+                    conn.execute('SAVEPOINT write')
+                    try:
+                        rows = conn.execute(query, args).fetchall()
+                        outcomes.append((rows[0] if rows else None, None))
+                    except sqlite3.Error as error:
+                        if isinstance(error, sqlite3.OperationalError) and _is_busy_error(error):
+                            raise
+                        conn.execute('ROLLBACK TO write')
+                        outcomes.append((None, error))
+                    conn.execute('RELEASE write')
+                conn.execute('COMMIT')
+                break
+            except Exception as error:
+                if conn.in_transaction:
+                    conn.rollback()
+                if isinstance(error, sqlite3.OperationalError) and _is_busy_error(error) and attempt < self.busy_retries:
+                    time.sleep(self.busy_backoff * (2 ** attempt) * (0.5 + random.random()))
+                    attempt += 1
+                    continue
+                # Nothing in the batch was written
+                outcomes = [(None, error)] * len(batch)
+                break
+
+        with self._lock:
+            self._batches += 1
+            self._rows += len(batch)
+            self._failed += sum(1 for _, error in outcomes if error is not None)
+            self._largest_batch = max(self._largest_batch, len(batch))
+            self._commit_total += time.perf_counter() - start
+        for (_, _, future), (row, error) in zip(batch, outcomes):
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(row)
+
+    def reset_after_fork(self):
+        # The writer thread does not survive a fork; the child starts its own on first use
+        self._queue = queue.Queue()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._lock = threading.Lock()
+
+    def shutdown(self):
+        # Commits what is already queued, then stops the writer thread
+        with self._thread_lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_rows': self.max_rows,
+                'max_delay_seconds': self.max_delay,
+                'queued': self._queue.qsize(),
+                'batches': self._batches,
+                'rows': self._rows,
+                'failed': self._failed,
+                'largest_batch': self._largest_batch,
+                'rows_per_batch': self._rows / self._batches if self._batches else 0.0,
+                'commit_seconds_total': self._commit_total,
+                'crashes': self._crashes,
+            }
+
+def init_group_commit(app):
+    # None unless TRANSACTION_GROUP_COMMIT is enabled; writes then commit on the request thread
+    writer = None
+    if app.config.get('TRANSACTION_GROUP_COMMIT'):
+        writer = GroupCommitWriter(
+            app.config['DATABASE'],
+            pragmas=get_pool(app).pragmas,
+            max_rows=app.config.get('TRANSACTION_GROUP_COMMIT_ROWS', DEFAULT_GROUP_COMMIT_ROWS),
+            max_delay=app.config.get('TRANSACTION_GROUP_COMMIT_MS', DEFAULT_GROUP_COMMIT_MS) / 1000,
+            busy_retries=app.config.get('DATABASE_BUSY_RETRIES', DEFAULT_BUSY_RETRIES),
+            busy_backoff=app.config.get('DATABASE_BUSY_BACKOFF', DEFAULT_BUSY_BACKOFF),
+        )
+    app.extensions['group_commit'] = writer
+    return writer
+
+def get_group_commit(app):
+    if 'group_commit' not in app.extensions:
+        return init_group_commit(app)
+    return app.extensions['group_commit']
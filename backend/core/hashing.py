@@ -0,0 +1,120 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from core.auth import hash_password, verify_password
+
+DEFAULT_HASHER_EXECUTOR = 'thread'
+DEFAULT_HASHER_WORKERS = min(4, os.cpu_count() or 1)
+DEFAULT_HASHER_QUEUE_SIZE = 32
+LATENCY_SAMPLES = 1024
+
+class HasherSaturatedError(RuntimeError):
+    pass
+
+class PasswordHasher:
+    """Runs Scrypt hashing and verification on a bounded worker pool.
+
+    At most ``workers`` hashes run at once, so a login storm cannot take every CPU
+    away from other requests. Up to ``queue_size`` further calls wait for a worker;
+    beyond that, calls fail fast with HasherSaturatedError. ``workers=0`` hashes
+    inline on the calling thread.
+    """
+
+    def __init__(self, executor=DEFAULT_HASHER_EXECUTOR, workers=DEFAULT_HASHER_WORKERS, queue_size=DEFAULT_HASHER_QUEUE_SIZE):
+        if executor not in ('thread', 'process'):
+            raise ValueError(f'Unknown password hasher executor: {executor}')
+        self.executor_type = executor
+        self.workers = workers
+        self.queue_size = queue_size
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max(workers, 1) + queue_size)
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+
+    def _get_executor(self):
+        # Started on first use, so importing the app (or preloading it before a fork) spawns nothing
+        with self._executor_lock:
+            if self._executor is None:
+                if self.executor_type == 'process':
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hasher')
+            return self._executor
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise HasherSaturatedError('Too many password operations in progress')
+        start = time.perf_counter()
+        with self._lock:
+            self._in_flight += 1
+        try:
+            if self.workers == 0:
+                return fn(*args)
+            return self._get_executor().submit(fn, *args).result()
+        finally:
+            elapsed = time.perf_counter() - start
+            self._slots.release()
+            with self._lock:
+                self._in_flight -= 1
+                self._completed += 1
+                self._latencies.append(elapsed)
+
+    def hash(self, password):
+        return self._run(hash_password, password)
+
+    def verify(self, stored_password, provided_password):
+        return self._run(verify_password, stored_password, provided_password)
+
+    def reset_after_fork(self):
+        # Worker threads and processes do not survive a fork; the child starts its own on first use
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max(self.workers, 1) + self.queue_size)
+        self._in_flight = 0
+
+    def shutdown(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = {
+                'executor': self.executor_type,
+                'workers': self.workers,
+                'queue_size': self.queue_size,
+                'in_flight': self._in_flight,
+                'completed': self._completed,
+                'rejected': self._rejected,
+            }
+        for name, pct in (('p50', 50), ('p95', 95), ('p99', 99)):
+            stats[f'latency_{name}_seconds'] = latencies[min(len(latencies) - 1, len(latencies) * pct // 100)] if latencies else 0.0
+        stats['latency_max_seconds'] = latencies[-1] if latencies else 0.0
+        return stats
+
+def init_password_hasher(app):
+    hasher = PasswordHasher(
+        executor=app.config.get('PASSWORD_HASHER_EXECUTOR', DEFAULT_HASHER_EXECUTOR),
+        workers=app.config.get('PASSWORD_HASHER_WORKERS', DEFAULT_HASHER_WORKERS),
+        queue_size=app.config.get('PASSWORD_HASHER_QUEUE_SIZE', DEFAULT_HASHER_QUEUE_SIZE),
+    )
+    app.extensions['password_hasher'] = hasher
+    return hasher
+
+def get_password_hasher(app):
+    hasher = app.extensions.get('password_hasher')
+    if hasher is None:
+        hasher = init_password_hasher(app)
+    return hasher
@@ -0,0 +1,79 @@
+import re
+
+try:
+    import orjson
+except ImportError:  # Optional; without it the stdlib encoder is used
+    orjson = None
+
+from flask.json.provider import DefaultJSONProvider
+
+# Older releases have no nesting limit when decoding (CVE-2024-27454), so one deeply
+# nested request body crashes the whole server process
+MIN_ORJSON_VERSION = (3, 9, 15)
+
+# "auto" uses orjson when it is installed, "default" always uses Flask's stdlib provider
+JSON_PROVIDERS = ('auto', 'orjson', 'default')
+DEFAULT_JSON_PROVIDER = 'auto'
+
+# Response layouts of the list endpoints: an array of objects, or the column names once
+# and each row as an array of values
+LIST_FORMATS = ('json', 'compact')
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask's JSON provider with encoding and decoding done by orjson.
+
+    Responses carry the same data as with the default provider: keys are sorted, and
+    dates, decimals and other types orjson does not handle itself go through the same
+    ``default`` conversion. Non-ASCII text is written as UTF-8 rather than escaped.
+    """
+
+    def _options(self, indent=False):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            # Formatting arguments only the stdlib encoder understands
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._options()).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        body = orjson.dumps(obj, default=self.default, option=self._options(indent))
+        return self._app.response_class(body + b'\n', mimetype=self.mimetype)
+
+def orjson_usable():
+    if orjson is None:
+        return False
+    return tuple(int(part) for part in re.findall(r'\d+', orjson.__version__)[:3]) >= MIN_ORJSON_VERSION
+
+def init_json_provider(app):
+    provider = app.config.get('JSON_PROVIDER', DEFAULT_JSON_PROVIDER)
+    if provider not in JSON_PROVIDERS:
+        raise ValueError(f'Unknown JSON provider: {provider}')
+    if provider == 'orjson' and not orjson_usable():
+        raise ValueError(f"JSON_PROVIDER is orjson, which needs orjson {'.'.join(map(str, MIN_ORJSON_VERSION))} or later")
+    if provider != 'default' and orjson_usable():
+        app.json = OrjsonProvider(app)
+    return app.json
+
+def list_payload(columns, rows, list_format='json'):
+    """The body of a list response from ``query_db(..., columns=True)`` results.
+
+    Rows are plain tuples; "json" pairs them with the column names into objects, while
+    "compact" returns ``{"columns": [...], "rows": [[...], ...]}`` and builds no
+    per-row objects at all.
+    """
+    if list_format == 'compact':
+        return {'columns': list(columns), 'rows': rows}
+    return [dict(zip(columns, row)) for row in rows]
@@ -0,0 +1,258 @@
+import hmac
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, current_app, g, request
+
+from core.database import get_pool
+
+# Upper bounds, in seconds, of the request latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROMETHEUS_MIMETYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+slow_query_log = logging.getLogger('inventory.slow_queries')
+
+_WHITESPACE = re.compile(r'\s+')
+_IN_LIST = re.compile(r'IN \(\?(?:, \?)*\)')
+# Normalized texts remembered per raw SQL string; beyond this many, statements are normalized every time
+STATEMENT_TEXT_CACHE_SIZE = 4096
+# Statement shapes given their own series. Field projections, optional filters and
+# expansions build many shapes; once this many are tracked the rest share one series.
+DEFAULT_METRICS_MAX_STATEMENTS = 200
+OTHER_STATEMENT = 'other'
+
+def normalize_statement(query):
+    # One label per statement shape: the SQL text with its layout collapsed, and the
+    # padded IN lists of core.database.in_list reduced to one shape whatever their size
+    return _IN_LIST.sub('IN (?, ...)', _WHITESPACE.sub(' ', query).strip())
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+class MetricsRegistry:
+    """In-process request and SQL statistics, rendered in the Prometheus text format.
+
+    Requests are kept as a latency histogram per endpoint, method and status, and
+    statements run through the core/database.py helpers as a time and row total per
+    statement shape, up to ``max_statements`` shapes; later shapes are added to one
+    ``other`` series, so neither memory nor the number of series can grow without
+    bound. Statements slower than ``slow_query_seconds`` are logged to the
+    ``inventory.slow_queries`` logger with their query plan. Every server process has
+    its own registry.
+    """
+
+    def __init__(self, slow_query_seconds=None, explain_slow_queries=True,
+                 max_statements=DEFAULT_METRICS_MAX_STATEMENTS):
+        self.slow_query_seconds = slow_query_seconds
+        self.explain_slow_queries = explain_slow_queries
+        self.max_statements = max_statements
+        self._lock = threading.Lock()
+        self._requests = {}
+        self._statements = {}
+        self._commits = 0
+        self._slow_queries = 0
+        self._statement_texts = {}
+
+    def observe_request(self, endpoint, method, status, elapsed):
+        key = (endpoint, method, status)
+        with self._lock:
+            series = self._requests.get(key)
+            if series is None:
+                series = self._requests[key] = [[0] * (len(LATENCY_BUCKETS) + 1), 0.0]
+            series[0][bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+            series[1] += elapsed
+
+    def observe_statement(self, db, query, args, elapsed, rows):
+        statement = self._statement_texts.get(query)
+        if statement is None:
+            statement = normalize_statement(query)
+            if len(self._statement_texts) < STATEMENT_TEXT_CACHE_SIZE:
+                self._statement_texts[query] = statement
+        with self._lock:
+            totals = self._statements.get(statement)
+            if totals is None:
+                # The overflow series is created past the limit, so at most max_statements + 1 exist
+                key = statement if len(self._statements) < self.max_statements else OTHER_STATEMENT
+                totals = self._statements.get(key)
+                if totals is None:
+                    totals = self._statements[key] = [0, 0.0, 0, 0.0]
+            totals[0] += 1
+            totals[1] += elapsed
+            totals[2] += rows
+            totals[3] = max(totals[3], elapsed)
+        if self.slow_query_seconds is not None and elapsed >= self.slow_query_seconds:
+            with self._lock:
+                self._slow_queries += 1
+            self._log_slow_query(db, query, statement, args, elapsed, rows)
+
+    def _log_slow_query(self, db, query, statement, args, elapsed, rows):
+        plan = ''
+        if self.explain_slow_queries:
+            try:
+                steps = db.execute(f'EXPLAIN QUERY PLAN {query}', args).fetchall()
+                plan = ''.join(f'\n    {step[3]}' for step in steps)
+            except Exception as e:  # The statement already ran; never fail the request over its plan
+                plan = f'\n    (no plan: {e})'
+        slow_query_log.warning('Slow query (%.1f ms, %d rows): %s%s', elapsed * 1000, rows, statement, plan)
+
+    def trace_connection(self, conn):
+        # Counts the commits of a pooled connection, including those made by "with db:" blocks
+        conn.set_trace_callback(self._trace)
+
+    def _trace(self, statement):
+        if statement.startswith(('COMMIT', 'END')):
+            with self._lock:
+                self._commits += 1
+
+    def reset_after_fork(self):
+        self._lock = threading.Lock()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'requests': sum(sum(buckets) for buckets, _ in self._requests.values()),
+                'statements': sum(totals[0] for totals in self._statements.values()),
+                'statement_shapes': len(self._statements),
+                'commits': self._commits,
+                'slow_queries': self._slow_queries,
+            }
+
+    def render(self, app):
+        """The registry and the stats of the app's pool, caches and limiters as Prometheus text."""
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for suffix, labels, value in samples:
+                lines.append(f'{name}{suffix}{_labels(**labels) if labels else ""} {value}')
+
+        with self._lock:
+            requests = sorted((key, list(buckets), total) for key, (buckets, total) in self._requests.items())
+            statements = sorted((statement, list(totals)) for statement, totals in self._statements.items())
+            commits, slow_queries = self._commits, self._slow_queries
+
+        samples = []
+        for (endpoint, method, status), buckets, total in requests:
+            labels = {'endpoint': endpoint, 'method': method, 'status': status}
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), buckets):
+                cumulative += count
+                samples.append(('_bucket', {**labels, 'le': bound}, cumulative))
+            samples.append(('_sum', labels, total))
+            samples.append(('_count', labels, cumulative))
+        metric('inventory_http_request_duration_seconds', 'histogram', 'Request latency by endpoint.', samples)
+
+        metric('inventory_sql_statement_duration_seconds', 'summary',
+               'Time spent in SQLite by statement, through the core.database helpers.',
+               [sample for statement, (count, seconds, _, _) in statements
+                for sample in (('_sum', {'statement': statement}, seconds), ('_count', {'statement': statement}, count))])
+        metric('inventory_sql_statement_duration_seconds_max', 'gauge', 'Slowest run of each statement.',
+               [('', {'statement': statement}, slowest) for statement, (_, _, _, slowest) in statements])
+        metric('inventory_sql_statement_rows_total', 'counter', 'Rows returned or changed by each statement.',
+               [('', {'statement': statement}, rows) for statement, (_, _, rows, _) in statements])
+        metric('inventory_sql_slow_queries_total', 'counter', 'Statements slower than the slow query threshold.',
+               [('', None, slow_queries)])
+        metric('inventory_db_commits_total', 'counter', 'Commits on pooled connections.', [('', None, commits)])
+
+        pool = get_pool(app).stats()
+        metric('inventory_db_connections_opened_total', 'counter', 'Database connections opened by the pool.',
+               [('', None, pool['connections_opened'])])
+        metric('inventory_db_pool_connections', 'gauge', 'Pooled database connections by state.',
+               [('', {'state': 'in_use'}, pool['in_use']), ('', {'state': 'idle'}, pool['idle'])])
+        metric('inventory_db_pool_size', 'gauge', 'Maximum pooled connections.', [('', None, pool['size'])])
+        metric('inventory_db_pool_waits_total', 'counter', 'Checkouts that waited for a connection.', [('', None, pool['waits'])])
+        metric('inventory_db_pool_wait_seconds_total', 'counter', 'Time spent waiting for a connection.',
+               [('', None, pool['wait_seconds_total'])])
+        metric('inventory_db_pool_timeouts_total', 'counter', 'Checkouts that gave up waiting.', [('', None, pool['timeouts'])])
+        metric('inventory_db_statements_executed_total', 'counter', 'Statements executed on pooled connections.',
+               [('', None, pool['statements_executed'])])
+        metric('inventory_db_statements_prepared_total', 'counter', 'Statements that had to be compiled.',
+               [('', None, pool['statements_prepared'])])
+
+        cache = app.extensions.get('response_cache')
+        if cache is not None:
+            cache_stats = cache.stats()
+            metric('inventory_response_cache_requests_total', 'counter', 'Catalog response cache lookups.',
+                   [('', {'result': 'hit'}, cache_stats['hits']), ('', {'result': 'miss'}, cache_stats['misses'])])
+            metric('inventory_response_cache_bytes', 'gauge', 'Size of the cached responses.', [('', None, cache_stats['bytes'])])
+
+        hasher = app.extensions.get('password_hasher')
+        if hasher is not None:
+            hasher_stats = hasher.stats()
+            metric('inventory_password_hashes_total', 'counter', 'Password hashes and verifications by outcome.',
+                   [('', {'outcome': 'completed'}, hasher_stats['completed']),
+                    ('', {'outcome': 'rejected'}, hasher_stats['rejected'])])
+            metric('inventory_password_hashes_in_flight', 'gauge', 'Password operations running or queued.',
+                   [('', None, hasher_stats['in_flight'])])
+
+        limiter = app.extensions.get('concurrency_limiter')
+        if limiter is not None:
+            classes = sorted(limiter.stats().items())
+            metric('inventory_concurrency_active', 'gauge', 'Requests holding a slot, by endpoint class.',
+                   [('', {'endpoint_class': name}, values['active']) for name, values in classes])
+            metric('inventory_concurrency_rejected_total', 'counter', 'Requests turned away with 429, by endpoint class.',
+                   [('', {'endpoint_class': name}, values['rejected']) for name, values in classes])
+
+        writer = app.extensions.get('group_commit')
+        if writer is not None:
+            writer_stats = writer.stats()
+            metric('inventory_group_commit_batches_total', 'counter', 'Transactions committed by the group-commit writer.',
+                   [('', None, writer_stats['batches'])])
+            metric('inventory_group_commit_rows_total', 'counter', 'Rows written by the group-commit writer.',
+                   [('', None, writer_stats['rows'])])
+
+        return '\n'.join(lines) + '\n'
+
+def _start_timer():
+    g._request_started = time.perf_counter()
+
+def _record_request(response):
+    started = g.pop('_request_started', None)
+    if started is not None:
+        endpoint = request.endpoint or 'unmatched'
+        get_metrics(current_app).observe_request(endpoint, request.method, response.status_code,
+                                                 time.perf_counter() - started)
+    return response
+
+def _metrics_view():
+    # The statement labels are SQL text, so the endpoint can be closed with a bearer token
+    token = current_app.config.get('METRICS_TOKEN')
+    if token:
+        sent = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        if not hmac.compare_digest(sent.encode(), token.encode()):
+            return Response('Unauthorized\n', 401, {'WWW-Authenticate': 'Bearer'}, mimetype='text/plain')
+    return Response(get_metrics(current_app).render(current_app), mimetype=PROMETHEUS_MIMETYPE)
+
+def init_metrics(app):
+    """Installs the instrumentation when METRICS_ENABLED or SLOW_QUERY_MS is set.
+
+    With both unset nothing is registered: no request hooks run, the database helpers
+    skip their timing and /metrics does not exist.
+    """
+    enabled = app.config.get('METRICS_ENABLED')
+    slow_query_ms = app.config.get('SLOW_QUERY_MS')
+    if not enabled and slow_query_ms is None:
+        app.extensions.pop('metrics', None)
+        return None
+    registry = MetricsRegistry(
+        slow_query_seconds=None if slow_query_ms is None else slow_query_ms / 1000,
+        explain_slow_queries=app.config.get('SLOW_QUERY_EXPLAIN', True),
+        max_statements=app.config.get('METRICS_MAX_STATEMENTS', DEFAULT_METRICS_MAX_STATEMENTS),
+    )
+    app.extensions['metrics'] = registry
+    if enabled:
+        get_pool(app).on_connect.append(registry.trace_connection)
+        app.before_request(_start_timer)
+        app.after_request(_record_request)
+        app.add_url_rule('/metrics', 'metrics', _metrics_view, methods=['GET'])
+    return registry
+
+def get_metrics(app):
+    return app.extensions.get('metrics')
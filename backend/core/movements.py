@@ -0,0 +1,57 @@
+# Maintenance of the daily_product_movements summary table (see the
+# daily_product_movements migration in core/database.py).
+
+# Totals recomputed from the raw ledger, in the shape of daily_product_movements
+LEDGER_MOVEMENTS = """
+    SELECT transaction_type, substr(transaction_date, 1, 10) AS movement_date, product_id,
+           SUM(quantity) AS quantity, SUM(quantity * COALESCE(price, 0)) AS amount, COUNT(*) AS transaction_count
+    FROM transactions
+    GROUP BY transaction_type, substr(transaction_date, 1, 10), product_id
+"""
+
+# Sums are maintained by repeated addition and subtraction of REAL values
+TOLERANCE = 1e-6
+
+def rebuild_daily_movements(db):
+    # Recomputes the whole table from the ledger in one transaction
+    with db:
+        db.execute('DELETE FROM daily_product_movements')
+        cur = db.execute(f"""
+            INSERT INTO daily_product_movements (transaction_type, movement_date, product_id, quantity, amount, transaction_count)
+            {LEDGER_MOVEMENTS}
+        """)
+    return cur.rowcount
+
+def verify_daily_movements(db, limit=None):
+    # Returns the rows where the summary disagrees with the ledger; empty when consistent
+    query = f"""
+        WITH ledger AS ({LEDGER_MOVEMENTS})
+        SELECT l.transaction_type, l.movement_date, l.product_id,
+               l.quantity AS ledger_quantity, m.quantity AS summary_quantity,
+               l.amount AS ledger_amount, m.amount AS summary_amount,
+               l.transaction_count AS ledger_count, m.transaction_count AS summary_count
+        FROM ledger l
+        LEFT JOIN daily_product_movements m
+            ON m.transaction_type = l.transaction_type AND m.movement_date = l.movement_date AND m.product_id = l.product_id
+        WHERE m.product_id IS NULL
+           OR abs(l.quantity - m.quantity) > :tolerance
+           OR abs(l.amount - m.amount) > :tolerance
+           OR l.transaction_count != m.transaction_count
+        UNION ALL
+        SELECT m.transaction_type, m.movement_date, m.product_id,
+               NULL, m.quantity, NULL, m.amount, NULL, m.transaction_count
+        FROM daily_product_movements m
+        WHERE NOT EXISTS (
+            SELECT 1 FROM transactions t
+            WHERE t.transaction_type = m.transaction_type AND t.product_id = m.product_id
+              AND t.transaction_date >= m.movement_date AND substr(t.transaction_date, 1, 10) = m.movement_date
+        )
+        ORDER BY 2, 3, 1
+    """
+    args = {'tolerance': TOLERANCE}
+    if limit is not None:
+        query += ' LIMIT :limit'
+        args['limit'] = limit
+    columns = ('transaction_type', 'movement_date', 'product_id', 'ledger_quantity', 'summary_quantity',
+               'ledger_amount', 'summary_amount', 'ledger_count', 'summary_count')
+    return [dict(zip(columns, row)) for row in db.execute(query, args)]
@@ -0,0 +1,109 @@
+import threading
+import time
+
+from core.database import get_db, query_db, table_version, in_list
+
+# Everything GET /products/<id> returns except stock_on_hand, which changes with every
+# sale and is therefore always read from the database
+CATALOG_COLUMNS = ('product_id', 'item_code', 'name', 'description', 'supplier_id', 'category_id',
+                   'unit_cost', 'selling_price', 'is_vat_exempt', 'is_active')
+DEFAULT_PRODUCT_INDEX_VERSION_CHECK_MS = 1000
+
+class ProductIndex:
+    """In-process item_code -> product map of the active products, for barcode scans.
+
+    The map is tagged with the product_catalog version it was loaded at. Lookups
+    compare that tag with the database at most once per ``version_check`` seconds,
+    so a scan usually costs only the stock read, and catalog changes made by other
+    processes are picked up within that interval. Changes made through this process's
+    product endpoints are applied in place without a reload.
+    """
+
+    def __init__(self, version_check=DEFAULT_PRODUCT_INDEX_VERSION_CHECK_MS / 1000):
+        self.version_check = version_check
+        self.version = None
+        self._checked = 0.0
+        self._by_code = {}
+        self._code_by_id = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def _load(self, app):
+        # Version and rows from one snapshot, so the tag matches the contents
+        db = get_db(app)
+        db.execute('BEGIN')
+        try:
+            version = db.execute("SELECT version FROM table_versions WHERE table_name = 'product_catalog'").fetchone()[0]
+            rows = db.execute(f"SELECT {', '.join(CATALOG_COLUMNS)} FROM products WHERE is_active = 1").fetchall()
+        finally:
+            db.rollback()
+        by_code = {row['item_code']: dict(row) for row in rows}
+        self._by_code = by_code
+        self._code_by_id = {product['product_id']: code for code, product in by_code.items()}
+        self.version = version
+        self.loads += 1
+
+    def lookup(self, app, item_codes):
+        # Returns {item_code: catalog fields} for the codes of active products
+        with self._lock:
+            stale = self.version is None or time.monotonic() - self._checked >= self.version_check
+        if stale:
+            checked = time.monotonic()
+            version = table_version(app, 'product_catalog')
+        with self._lock:
+            if stale:
+                if version != self.version:
+                    self._load(app)
+                self._checked = checked
+            by_code = self._by_code
+            return {code: by_code[code] for code in item_codes if code in by_code}
+
+    def apply(self, product, version):
+        """Records a write made by this process; ``version`` is the catalog version read after it.
+
+        The write bumped the version once, so anything other than the next version
+        means another writer got in between and the map is left to reload.
+        """
+        with self._lock:
+            if self.version is None or version != self.version + 1:
+                self.version = None
+                return
+            old_code = self._code_by_id.pop(product['product_id'], None)
+            if old_code is not None:
+                self._by_code.pop(old_code, None)
+            if product['is_active']:
+                self._by_code[product['item_code']] = {column: product[column] for column in CATALOG_COLUMNS}
+                self._code_by_id[product['product_id']] = product['item_code']
+            self.version = version
+
+    def stats(self):
+        with self._lock:
+            return {'products': len(self._by_code), 'version': self.version, 'loads': self.loads}
+
+def init_product_index(app):
+    index = ProductIndex(app.config.get('PRODUCT_INDEX_VERSION_CHECK_MS', DEFAULT_PRODUCT_INDEX_VERSION_CHECK_MS) / 1000)
+    app.extensions['product_index'] = index
+    return index
+
+def get_product_index(app):
+    index = app.extensions.get('product_index')
+    if index is None:
+        index = init_product_index(app)
+    return index
+
+def record_product_write(app, product):
+    # Called by the product endpoints after a write that changed catalog columns
+    get_product_index(app).apply(product, table_version(app, 'product_catalog'))
+
+def lookup_products(app, item_codes):
+    # Products for the given codes, in request order, with stock read fresh by primary key
+    catalog = get_product_index(app).lookup(app, item_codes)
+    if not catalog:
+        return {}
+    placeholders, ids = in_list(product['product_id'] for product in catalog.values())
+    stock = {
+        row['product_id']: row['stock_on_hand']
+        for row in query_db(app, f'SELECT product_id, stock_on_hand FROM products WHERE product_id IN ({placeholders})', ids)
+    }
+    return {code: {**product, 'stock_on_hand': stock[product['product_id']]}
+            for code, product in catalog.items() if product['product_id'] in stock}
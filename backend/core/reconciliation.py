@@ -0,0 +1,110 @@
+# Reconciliation of products.stock_on_hand against the transactions ledger (see the
+# stock_reconciliation migration in core/database.py). stock_on_hand is kept by
+# triggers, but PUT/PATCH on a product can overwrite it, after which it no longer
+# equals the sum of the product's transactions.
+from datetime import datetime, timezone
+
+from core.movements import TOLERANCE
+from core.stock_snapshots import SIGNED_QUANTITY
+
+# Products compared per read; also the checkpoint interval
+RECONCILE_BATCH_PRODUCTS = 1000
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+def start_reconciliation(db, user_id=None):
+    with db:
+        return db.execute('''
+            INSERT INTO stock_reconciliation_runs (status, started_at, user_id) VALUES ('running', ?, ?)
+        ''', [_now(), user_id]).lastrowid
+
+def run_reconciliation(db, run_id, batch_size=RECONCILE_BATCH_PRODUCTS):
+    """Continues a run from its checkpoint and yields its discrepancies as they are found.
+
+    Products are taken in product_id order, a batch at a time. Each batch reads the
+    products and a grouped aggregate of their transactions, which comes out of the
+    (product_id, transaction_date) index already in product_id order, in one read
+    snapshot, and the two are merged. The batch's discrepancies and the new
+    checkpoint are then committed together, so an interrupted run resumes after the
+    last complete batch and every transaction is aggregated once per run.
+    """
+    last_product_id = db.execute('SELECT last_product_id FROM stock_reconciliation_runs WHERE run_id = ?', [run_id]).fetchone()[0]
+    while True:
+        db.execute('BEGIN')
+        try:
+            products = db.execute('''
+                SELECT product_id, stock_on_hand FROM products WHERE product_id > ? ORDER BY product_id LIMIT ?
+            ''', [last_product_id, batch_size]).fetchall()
+            if not products:
+                break
+            high = products[-1][0]
+            ledger = db.execute(f'''
+                SELECT product_id, SUM({SIGNED_QUANTITY}) FROM transactions
+                WHERE product_id > ? AND product_id <= ?
+                GROUP BY product_id ORDER BY product_id
+            ''', [last_product_id, high])
+            discrepancies = []
+            ledger_row = ledger.fetchone()
+            for product_id, recorded in products:
+                expected = 0
+                if ledger_row is not None and ledger_row[0] == product_id:
+                    expected = ledger_row[1]
+                    ledger_row = ledger.fetchone()
+                if abs(recorded - expected) > TOLERANCE:
+                    discrepancies.append({'product_id': product_id, 'recorded_stock': recorded, 'ledger_stock': expected})
+        finally:
+            db.rollback()
+
+        with db:
+            db.executemany('''
+                INSERT OR REPLACE INTO stock_reconciliation_discrepancies (run_id, product_id, recorded_stock, ledger_stock)
+                VALUES (?, ?, ?, ?)
+            ''', [(run_id, row['product_id'], row['recorded_stock'], row['ledger_stock']) for row in discrepancies])
+            db.execute('''
+                UPDATE stock_reconciliation_runs
+                SET last_product_id = ?, products_checked = products_checked + ?, discrepancy_count = discrepancy_count + ?
+                WHERE run_id = ?
+            ''', [high, len(products), len(discrepancies), run_id])
+        yield from discrepancies
+        last_product_id = high
+
+    with db:
+        db.execute("UPDATE stock_reconciliation_runs SET status = 'complete', finished_at = ? WHERE run_id = ?", [_now(), run_id])
+
+def apply_reconciliation(db, run_id, user_id=None, batch_size=RECONCILE_BATCH_PRODUCTS):
+    """Sets the stock of the run's discrepant products back to their ledger stock.
+
+    The ledger stock is recomputed inside each write, so transactions posted since the
+    run are taken into account and products that have been corrected meanwhile are
+    left alone. Every change is recorded in stock_adjustments. Products whose ledger
+    stock is negative cannot be stored and are skipped. Returns the counts.
+    """
+    adjusted = skipped = 0
+    last_product_id = 0
+    while True:
+        product_ids = [row[0] for row in db.execute('''
+            SELECT product_id FROM stock_reconciliation_discrepancies
+            WHERE run_id = ? AND product_id > ? ORDER BY product_id LIMIT ?
+        ''', [run_id, last_product_id, batch_size])]
+        if not product_ids:
+            break
+        with db:
+            for product_id in product_ids:
+                recorded, expected = db.execute(f'''
+                    SELECT stock_on_hand, COALESCE((SELECT SUM({SIGNED_QUANTITY}) FROM transactions WHERE product_id = ?), 0)
+                    FROM products WHERE product_id = ?
+                ''', [product_id, product_id]).fetchone()
+                if abs(recorded - expected) <= TOLERANCE:
+                    continue
+                if expected < 0:
+                    skipped += 1
+                    continue
+                db.execute('UPDATE products SET stock_on_hand = ? WHERE product_id = ?', [expected, product_id])
+                db.execute('''
+                    INSERT INTO stock_adjustments (product_id, run_id, previous_stock, new_stock, user_id, adjusted_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', [product_id, run_id, recorded, expected, user_id, _now()])
+                adjusted += 1
+        last_product_id = product_ids[-1]
+    return {'adjusted': adjusted, 'skipped': skipped}
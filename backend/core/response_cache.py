@@ -0,0 +1,110 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+from flask import Response, current_app, request
+
+from core.database import table_version
+
+DEFAULT_RESPONSE_CACHE_BYTES = 16 * 1024 * 1024
+
+class ResponseCache:
+    """In-process LRU cache of serialized catalog responses, bounded by total body size.
+
+    Entries are keyed by table and normalized query string and remember the table
+    version they were rendered at, so a write to the table makes them stale without
+    any explicit invalidation, in this process or any other.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_RESPONSE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def set(self, key, version, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous[1])
+            self._entries[key] = (version, body)
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+def init_response_cache(app):
+    cache = ResponseCache(max_bytes=app.config.get('RESPONSE_CACHE_BYTES', DEFAULT_RESPONSE_CACHE_BYTES))
+    app.extensions['response_cache'] = cache
+    return cache
+
+def get_response_cache(app):
+    cache = app.extensions.get('response_cache')
+    if cache is None:
+        cache = init_response_cache(app)
+    return cache
+
+def normalized_query_string():
+    # Parameter order and repetition order do not change the result of the list endpoints.
+    # Names and values are re-encoded, so an escaped "&" or "=" cannot pass for a separator.
+    return urlencode(sorted(request.args.items(multi=True)))
+
+def versioned_response(table, render):
+    """Serves a GET for data derived from ``table`` only, given its current version.
+
+    ``render`` returns the JSON-serializable payload and is only called on a cache
+    miss. A matching If-None-Match is answered with 304 before any row is read.
+    """
+    version = table_version(current_app, table)
+    query = normalized_query_string()
+    digest = hashlib.blake2b(query.encode(), digest_size=8).hexdigest()
+    etag = f'{table}-{version}-{digest}'
+    headers = {'Cache-Control': 'private, no-cache'}
+
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304, headers=headers)
+        response.set_etag(etag)
+        return response
+
+    cache = get_response_cache(current_app)
+    key = (table, query)
+    body = cache.get(key, version)
+    if body is None:
+        body = current_app.json.response(render()).get_data()
+        cache.set(key, version, body)
+    response = Response(body, mimetype='application/json', headers=headers)
+    response.set_etag(etag)
+    return response
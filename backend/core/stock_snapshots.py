@@ -0,0 +1,105 @@
+# Point-in-time stock from the stock_snapshots checkpoints (see the stock_snapshots
+# migration in core/database.py). Stock at the end of a day is taken from the
+# nearest anchor, either a complete snapshot or the live stock_on_hand, moved by
+# the daily_product_movements totals between the anchor and that day.
+from datetime import date, datetime, timezone
+
+# Snapshot rows written per write transaction, so writers are never held up for long
+SNAPSHOT_BATCH_ROWS = 500
+
+# Effect of a movement row on stock, as applied by the update_stock_on_hand triggers
+SIGNED_QUANTITY = "CASE WHEN transaction_type = 'Delivery' THEN quantity ELSE -quantity END"
+# Listing every type lets the range on movement_date use the primary key
+TRANSACTION_TYPES = "transaction_type IN ('Delivery', 'Pull-out', 'Sale', 'Return')"
+
+def nearest_snapshot(db, as_of, today=None):
+    """Returns the complete snapshot date closest to ``as_of``, or None when the live
+    stock is closer. Distances are in days, the size of the movement range to replay."""
+    target = date.fromisoformat(as_of)
+    today = today or date.today()
+    best, distance = None, max((today - target).days, 0)
+    for query in ("SELECT snapshot_date FROM stock_snapshot_dates WHERE status = 'complete' AND snapshot_date <= ? "
+                  'ORDER BY snapshot_date DESC LIMIT 1',
+                  "SELECT snapshot_date FROM stock_snapshot_dates WHERE status = 'complete' AND snapshot_date > ? "
+                  'ORDER BY snapshot_date LIMIT 1'):
+        row = db.execute(query, [as_of]).fetchone()
+        if row is not None and abs((date.fromisoformat(row[0]) - target).days) < distance:
+            best, distance = row[0], abs((date.fromisoformat(row[0]) - target).days)
+    return best
+
+def stock_as_of(as_of, snapshot_date=None):
+    """SQL pieces computing the stock of ``products p`` at the end of day ``as_of``.
+
+    Returns ``(expression, joins, args)``; the expression goes in the select list and
+    the joins after ``FROM products p``, and args bind in that order. Products missing
+    from the snapshot, i.e. added after it was taken, are replayed from the live stock.
+    """
+    if snapshot_date is None:
+        return ('p.stock_on_hand - COALESCE(d.quantity, 0)',
+                f''' LEFT JOIN (
+                    SELECT product_id, SUM({SIGNED_QUANTITY}) AS quantity FROM daily_product_movements
+                    WHERE {TRANSACTION_TYPES} AND movement_date > ?
+                    GROUP BY product_id
+                ) d ON d.product_id = p.product_id''',
+                [as_of])
+    forward = snapshot_date <= as_of
+    expression = f'''CASE WHEN s.product_id IS NULL THEN p.stock_on_hand - COALESCE((
+                    SELECT SUM({SIGNED_QUANTITY}) FROM daily_product_movements m
+                    WHERE m.product_id = p.product_id AND m.movement_date > ?
+                ), 0) ELSE s.stock_on_hand {'+' if forward else '-'} COALESCE(d.quantity, 0) END'''
+    joins = f''' LEFT JOIN stock_snapshots s ON s.snapshot_date = ? AND s.product_id = p.product_id
+                LEFT JOIN (
+                    SELECT product_id, SUM({SIGNED_QUANTITY}) AS quantity FROM daily_product_movements
+                    WHERE {TRANSACTION_TYPES} AND movement_date > ? AND movement_date <= ?
+                    GROUP BY product_id
+                ) d ON d.product_id = p.product_id'''
+    low, high = sorted((snapshot_date, as_of))
+    return expression, joins, [as_of, snapshot_date, low, high]
+
+def create_stock_snapshot(db, snapshot_date, batch_size=SNAPSHOT_BATCH_ROWS, today=None):
+    """Records the stock of every product at the end of ``snapshot_date``.
+
+    The stock is computed from the nearest existing anchor in one read, so only the
+    movements since that anchor are scanned, and written in short batches. The date is
+    registered as 'building' first, so a backdated transaction committed meanwhile
+    marks it stale and the run is discarded. Returns the snapshot's
+    stock_snapshot_dates row, or None if it went stale before it was complete.
+    """
+    date.fromisoformat(snapshot_date)
+    created_at = datetime.now(timezone.utc).isoformat()
+    with db:
+        db.execute('''
+            INSERT OR REPLACE INTO stock_snapshot_dates (snapshot_date, status, created_at, product_count)
+            VALUES (?, 'building', ?, NULL)
+        ''', [snapshot_date, created_at])
+    # Anchor and movements from one read snapshot, so the anchor matches the ledger it is moved by
+    db.execute('BEGIN')
+    try:
+        expression, joins, args = stock_as_of(snapshot_date, nearest_snapshot(db, snapshot_date, today=today))
+        rows = db.execute(f'SELECT p.product_id, {expression} FROM products p{joins}', args).fetchall()
+    finally:
+        db.rollback()
+
+    with db:
+        db.execute('DELETE FROM stock_snapshots WHERE snapshot_date = ?', [snapshot_date])
+    for start in range(0, len(rows), batch_size):
+        with db:
+            db.executemany('INSERT OR REPLACE INTO stock_snapshots (snapshot_date, product_id, stock_on_hand) VALUES (?, ?, ?)',
+                           [(snapshot_date, product_id, stock) for product_id, stock in rows[start:start + batch_size]])
+    with db:
+        completed = db.execute('''
+            UPDATE stock_snapshot_dates SET status = 'complete', product_count = ?
+            WHERE snapshot_date = ? AND status = 'building' AND created_at = ?
+        ''', [len(rows), snapshot_date, created_at]).rowcount
+    if not completed:
+        return None
+    return {'snapshot_date': snapshot_date, 'status': 'complete', 'created_at': created_at, 'product_count': len(rows)}
+
+def prune_stale_snapshots(db):
+    # Deletes the rows of snapshots invalidated by backdated ledger changes, one date per transaction
+    stale = [row[0] for row in db.execute("SELECT snapshot_date FROM stock_snapshot_dates WHERE status = 'stale'")]
+    for snapshot_date in stale:
+        with db:
+            db.execute('DELETE FROM stock_snapshots WHERE snapshot_date = ?', [snapshot_date])
+            db.execute("DELETE FROM stock_snapshot_dates WHERE snapshot_date = ? AND status = 'stale'", [snapshot_date])
+    return stale
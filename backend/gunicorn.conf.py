@@ -0,0 +1,37 @@
+# gunicorn settings for serving wsgi:app in production:
+#     gunicorn -c gunicorn.conf.py wsgi:app
+# Every setting can be overridden on the command line; the environment variables
+# below cover the usual deployment knobs.
+import os
+
+bind = os.getenv('BIND', '0.0.0.0:5000')
+
+# Processes scale CPU-bound work (JSON, Scrypt) across cores; threads within each
+# process overlap requests waiting on SQLite. Writers still serialize on the
+# database, so more processes than this mostly adds lock contention.
+workers = int(os.getenv('WEB_CONCURRENCY', 2 * (os.cpu_count() or 1) + 1))
+worker_class = 'gthread'
+threads = int(os.getenv('WEB_THREADS', 4))
+
+# Build the app once in the master: migrations run a single time instead of racing
+# in every worker, and workers start from the already imported code. Nothing in the
+# master serves requests; each worker drops what it must not share in post_fork.
+preload_app = True
+
+# kill -HUP reloads the configuration and replaces the workers, letting in-flight
+# requests (including streamed exports) finish within graceful_timeout. As the app
+# is preloaded, new code needs a new master: kill -USR2, then kill -TERM the old one.
+graceful_timeout = 30
+timeout = 60
+keepalive = 5
+
+# Recycle workers now and then so slow growth (caches, fragmentation) cannot accumulate
+max_requests = 10000
+max_requests_jitter = 1000
+
+accesslog = os.getenv('ACCESS_LOG', '-')
+
+def post_fork(server, worker):
+    from core.app import reset_after_fork
+
+    reset_after_fork(worker.app.wsgi())
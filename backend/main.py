@@ -5,4 +5,6 @@ load_dotenv()
 app = create_app()
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    # Development server. Set FLASK_DEBUG=1 for the debugger and reloader; serve
+    # production traffic with gunicorn or waitress through wsgi.py instead.
+    app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
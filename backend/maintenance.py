@@ -0,0 +1,103 @@
+import argparse
+import sqlite3
+import sys
+from datetime import date, timedelta
+
+from core.database import DATABASE_NAME, migrate_db
+from core.movements import rebuild_daily_movements, verify_daily_movements
+from core.reconciliation import apply_reconciliation, run_reconciliation, start_reconciliation
+from core.stock_snapshots import create_stock_snapshot, prune_stale_snapshots
+
+def verify_movements(db, args):
+    discrepancies = verify_daily_movements(db, limit=args.limit)
+    for row in discrepancies:
+        print(f"{row['movement_date']} product {row['product_id']} {row['transaction_type']}: "
+              f"ledger quantity={row['ledger_quantity']} count={row['ledger_count']}, "
+              f"summary quantity={row['summary_quantity']} count={row['summary_count']}")
+    if discrepancies:
+        print(f"daily_product_movements disagrees with the ledger ({len(discrepancies)} shown). "
+              "Run 'rebuild-movements' to recompute it.")
+        return 1
+    print('daily_product_movements matches the transactions ledger.')
+    return 0
+
+def rebuild_movements(db, args):
+    rows = rebuild_daily_movements(db)
+    print(f'Rebuilt daily_product_movements: {rows} rows.')
+    return 0
+
+def snapshot_stock(db, args):
+    for snapshot_date in prune_stale_snapshots(db):
+        print(f'Removed stale stock snapshot {snapshot_date}.')
+    snapshot = create_stock_snapshot(db, args.date)
+    if snapshot is None:
+        print(f'Transactions on or before {args.date} changed while the snapshot was taken; run it again.')
+        return 1
+    print(f"Stock snapshot {snapshot['snapshot_date']}: {snapshot['product_count']} products.")
+    return 0
+
+def reconcile_stock(db, args):
+    if args.resume is not None:
+        run = db.execute('SELECT status, products_checked FROM stock_reconciliation_runs WHERE run_id = ?', [args.resume]).fetchone()
+        if run is None:
+            print(f'Reconciliation run {args.resume} does not exist.')
+            return 1
+        run_id = args.resume
+        if run['status'] != 'complete':
+            print(f"Resuming reconciliation run {run_id} after {run['products_checked']} products.")
+    else:
+        run_id = start_reconciliation(db)
+        print(f'Started reconciliation run {run_id}.')
+
+    shown = 0
+    for row in run_reconciliation(db, run_id):
+        if shown < args.limit:
+            print(f"product {row['product_id']}: stock_on_hand={row['recorded_stock']} ledger={row['ledger_stock']}")
+        shown += 1
+    run = db.execute('SELECT * FROM stock_reconciliation_runs WHERE run_id = ?', [run_id]).fetchone()
+    print(f"Run {run_id}: {run['products_checked']} products checked, {run['discrepancy_count']} discrepancies.")
+    if args.apply and run['discrepancy_count']:
+        result = apply_reconciliation(db, run_id)
+        print(f"Set stock_on_hand to the ledger stock for {result['adjusted']} products.")
+        if result['skipped']:
+            print(f"Skipped {result['skipped']} products whose ledger stock is negative.")
+    return 1 if run['discrepancy_count'] and not args.apply else 0
+
+def snapshot_date(value):
+    date.fromisoformat(value)
+    return value
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintenance tasks for the inventory database.')
+    parser.add_argument('--database', default=DATABASE_NAME, help='Path to the SQLite database.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    verify_parser = commands.add_parser('verify-movements', help='Check daily_product_movements against the transactions ledger.')
+    verify_parser.add_argument('--limit', type=int, default=50, help='Maximum number of discrepancies to report.')
+    verify_parser.set_defaults(handler=verify_movements)
+
+    rebuild_parser = commands.add_parser('rebuild-movements', help='Recompute daily_product_movements from the transactions ledger.')
+    rebuild_parser.set_defaults(handler=rebuild_movements)
+
+    snapshot_parser = commands.add_parser('snapshot-stock', help='Record the stock of every product at the end of a day for as_of reports; run daily, e.g. from cron.')
+    snapshot_parser.add_argument('--date', type=snapshot_date, default=(date.today() - timedelta(days=1)).isoformat(),
+                                 help='Day to snapshot (YYYY-MM-DD). Defaults to yesterday.')
+    snapshot_parser.set_defaults(handler=snapshot_stock)
+
+    reconcile_parser = commands.add_parser('reconcile-stock', help='Compare stock_on_hand with the transactions ledger, with checkpoints.')
+    reconcile_parser.add_argument('--resume', type=int, metavar='RUN_ID', help='Continue an interrupted run from its last checkpoint.')
+    reconcile_parser.add_argument('--apply', action='store_true', help='Set stock_on_hand to the ledger stock for every discrepancy, with an audit record.')
+    reconcile_parser.add_argument('--limit', type=int, default=50, help='Maximum number of discrepancies to print.')
+    reconcile_parser.set_defaults(handler=reconcile_stock)
+
+    args = parser.parse_args()
+    db = sqlite3.connect(args.database, timeout=30)
+    db.row_factory = sqlite3.Row
+    try:
+        migrate_db(db)
+        return args.handler(db, args)
+    finally:
+        db.close()
+
+if __name__ == '__main__':
+    sys.exit(main())
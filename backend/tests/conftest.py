@@ -6,7 +6,8 @@ import pytest
 import tempfile
 import os
 from core.app import create_app
-from core.database import get_db, init_db
+from core.database import get_db, init_db, close_pool
+from core.hashing import get_password_hasher
 
 @pytest.fixture
 def app():
@@ -34,6 +35,8 @@ def app():
 
     yield app
 
+    close_pool(app)
+    get_password_hasher(app).shutdown()
     os.close(db_fd)
     os.unlink(db_path)
 
@@ -1,8 +1,9 @@
+import time
 import pytest
 from flask import current_app, g, jsonify
 
-from core.auth import hash_password, verify_password, token_required, role_required
-from core.database import query_db
+from core.auth import hash_password, verify_password, token_required, role_required, UserCache, get_user_cache
+from core.database import execute_query, get_db, query_db, table_version
 
 def test_hash_verify_password():
     password = "test_password"
@@ -155,3 +156,124 @@ def test_refresh_token_route_missing_tokens(app):
         response = client.post('/api/v1/users/refresh', json=refresh_data)
         assert response.status_code == 400
         assert response.json['message'] == 'Access token is missing'
+
+def test_token_required_caches_user(app):
+    @app.route('/test_token_cached')
+    @token_required
+    def test_route():
+        return jsonify({'message': 'Success'})
+
+    with app.test_client() as client:
+        with app.app_context():
+            from core.auth import generate_auth_token
+            user = query_db(current_app, 'SELECT * FROM users WHERE username = ?', ['test_user'], one=True)
+            token = generate_auth_token(current_app, user['user_id'])
+
+        before = get_user_cache(app).stats()
+        for _ in range(3):
+            response = client.get('/test_token_cached', headers={'Authorization': f'Bearer {token}'})
+            assert response.status_code == 200
+        after = get_user_cache(app).stats()
+        assert after['misses'] - before['misses'] <= 1
+        assert after['hits'] - before['hits'] >= 2
+
+def test_user_cache_expires_and_evicts():
+    cache = UserCache(max_size=2, ttl=60)
+    cache.set(1, {'user_id': 1})
+    cache.set(2, {'user_id': 2})
+    assert cache.get(1) == {'user_id': 1}
+    cache.set(3, {'user_id': 3})  # Evicts user 2, the least recently used
+    assert cache.get(2) is None
+    assert cache.stats()['evictions'] == 1
+
+    # An entry stored under an older users table version is never served
+    cache.set(1, {'user_id': 1, 'role': 'Administrator'}, version=4)
+    assert cache.get(1, version=5) is None
+    assert cache.get(1, version=4) is None
+
+    expired = UserCache(ttl=0.01)
+    expired.set(1, {'user_id': 1})
+    time.sleep(0.02)
+    assert expired.get(1) is None
+
+def test_deactivated_user_rejected_immediately(app, client):
+    with app.app_context():
+        from core.auth import generate_auth_token
+        admin = query_db(current_app, 'SELECT * FROM users WHERE username = ?', ['test_user'], one=True)
+        admin_token = generate_auth_token(current_app, admin['user_id'])
+    response = client.post('/api/v1/users', json={'username': 'cached_user', 'password': 'pw', 'role': 'Staff'},
+                           headers={'Authorization': f'Bearer {admin_token}'})
+    staff_id = response.json['user_id']
+    with app.app_context():
+        staff_token = generate_auth_token(current_app, staff_id)
+
+    # Warm the cache, then deactivate the user
+    assert client.get(f'/api/v1/users/{staff_id}', headers={'Authorization': f'Bearer {staff_token}'}).status_code == 200
+    assert client.delete(f'/api/v1/users/{staff_id}', headers={'Authorization': f'Bearer {admin_token}'}).status_code == 204
+
+    response = client.get(f'/api/v1/users/{staff_id}', headers={'Authorization': f'Bearer {staff_token}'})
+    assert response.status_code == 403
+    assert response.json['message'] == 'User is inactive'
+
+def test_cached_user_costs_no_statements(app, client):
+    @app.route('/test_token_statements')
+    @token_required
+    def test_route():
+        return jsonify({'message': 'Success'})
+
+    with app.app_context():
+        from core.auth import generate_auth_token
+        headers = {'Authorization': f'Bearer {generate_auth_token(current_app, 1)}'}
+    assert client.get('/test_token_statements', headers=headers).status_code == 200
+
+    statements = []
+    with app.app_context():
+        get_db(app).set_trace_callback(statements.append)
+    for _ in range(3):
+        assert client.get('/test_token_statements', headers=headers).status_code == 200
+    with app.app_context():
+        get_db(app).set_trace_callback(None)
+    assert statements == []
+
+def test_user_changes_from_other_processes_apply_within_the_check_interval(app, client):
+    cache = get_user_cache(app)
+    cache.version_check = 0.2
+    with app.app_context():
+        from core.auth import generate_auth_token
+        token = generate_auth_token(current_app, 1)
+        version = table_version(current_app, 'users')
+        # Refresh tokens are not cached, so storing one keeps the cached records
+        execute_query(current_app, "UPDATE users SET refresh_token = 'x' WHERE user_id = 1")
+        assert table_version(current_app, 'users') == version
+    headers = {'Authorization': f'Bearer {token}'}
+    assert client.get('/api/v1/users', headers=headers).status_code == 200
+
+    # Written straight to the database, as another server process would, so nothing
+    # here invalidates the cached record: it is served until the version is re-read
+    with app.app_context():
+        execute_query(current_app, "UPDATE users SET role = 'Staff' WHERE user_id = 1")
+    assert client.get('/api/v1/users', headers=headers).status_code == 200
+    time.sleep(0.25)
+    assert client.get('/api/v1/users', headers=headers).status_code == 403
+    time.sleep(0.25)
+    with app.app_context():
+        execute_query(current_app, "UPDATE users SET role = 'Administrator', is_active = 0 WHERE user_id = 1")
+    response = client.get('/api/v1/users', headers=headers)
+    assert response.status_code == 403
+    assert response.json['message'] == 'User is inactive'
+
+def test_invalidation_forces_a_version_read():
+    cache = UserCache(ttl=60, version_check=60)
+    assert cache.current_version(lambda: 1) == 1
+    assert cache.current_version(lambda: 2) == 1  # Within the check interval
+    cache.invalidate(5)
+    assert cache.current_version(lambda: 2) == 2
+
+    # A version read that overlaps an invalidation is used once but not kept
+    def read_during_write():
+        cache.invalidate(5)
+        return 2
+    cache.invalidate(5)
+    assert cache.current_version(read_during_write) == 2
+    assert cache.current_version(lambda: 3) == 3
+    assert cache.stats()['version_checks'] == 4
@@ -0,0 +1,111 @@
+import pytest
+from flask import current_app
+from core.auth import generate_auth_token
+from core.concurrency import ConcurrencyLimiter, ConcurrencyLimitExceeded, get_concurrency_limiter
+from core.database import query_db, execute_query
+
+@pytest.fixture
+def token(app):
+    with app.app_context():
+        execute_query(current_app, "INSERT INTO suppliers (name) VALUES ('Alpha Supplies')")
+        execute_query(current_app, '''
+            INSERT INTO products (item_code, name, supplier_id, category_id, unit_cost, selling_price, is_vat_exempt)
+            VALUES ('ITEM001', 'Product', 1, 1, 10, 20, 0)
+        ''')
+        execute_query(current_app, '''
+            INSERT INTO transactions (product_id, transaction_type, quantity, transaction_date, supplier_id, user_id)
+            VALUES (1, 'Delivery', 10, '2024-03-01T08:00:00', 1, 1)
+        ''')
+        user = query_db(current_app, 'SELECT * FROM users WHERE username = ?', ['test_user'], one=True)
+        return generate_auth_token(current_app, user['user_id'])
+
+@pytest.fixture
+def limiter(app):
+    limiter = ConcurrencyLimiter({'report': 1, 'export': 1}, wait=0)
+    app.extensions['concurrency_limiter'] = limiter
+    return limiter
+
+def test_limiter_rejects_beyond_limit():
+    limiter = ConcurrencyLimiter({'report': 1, 'export': 0}, wait=0)
+    limiter.acquire('report')
+    with pytest.raises(ConcurrencyLimitExceeded):
+        limiter.acquire('report')
+    # A limit of 0 leaves the class unbounded
+    for _ in range(5):
+        limiter.acquire('export')
+    limiter.release('report')
+    limiter.acquire('report')
+    assert limiter.stats() == {
+        'report': {'limit': 1, 'active': 1, 'completed': 1, 'rejected': 1},
+        'export': {'limit': 0, 'active': 5, 'completed': 0, 'rejected': 0},
+    }
+
+def test_full_class_returns_429(client, token, limiter):
+    headers = {'Authorization': f'Bearer {token}'}
+    limiter.acquire('report')
+    response = client.get('/api/v1/reports/stock-on-hand', headers=headers)
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '1'
+    assert response.json['message'] == 'Too many report requests in progress, please retry shortly'
+    # Other classes and unclassified endpoints are unaffected
+    assert client.get('/api/v1/reports/stock-on-hand/export?format=csv', headers=headers).status_code == 200
+    assert client.get('/api/v1/products/by-code/ITEM001', headers=headers).status_code == 200
+    limiter.release('report')
+    # Reports are streamed, so the slot is held until the response is closed
+    response = client.get('/api/v1/reports/stock-on-hand', headers=headers)
+    assert response.status_code == 200
+    assert limiter.stats()['report']['active'] == 1
+    response.close()
+    assert limiter.stats()['report'] == {'limit': 1, 'active': 0, 'completed': 2, 'rejected': 1}
+
+def test_streamed_export_holds_slot_until_closed(client, token, limiter):
+    headers = {'Authorization': f'Bearer {token}'}
+    response = client.get('/api/v1/transactions?format=ndjson', headers=headers, buffered=False)
+    assert response.status_code == 200
+    assert limiter.stats()['export']['active'] == 1
+    assert client.get('/api/v1/transactions?format=json-stream', headers=headers).status_code == 429
+    # Paginated and plain listings are what the transaction page loads and need no slot
+    assert client.get('/api/v1/transactions?limit=10', headers=headers).status_code == 200
+    assert client.get('/api/v1/transactions', headers=headers).status_code == 200
+    response.close()
+    assert limiter.stats()['export']['active'] == 0
+    assert client.get('/api/v1/transactions?format=json-stream', headers=headers).status_code == 200
+
+def test_concurrent_plain_listings_both_succeed(app, token, limiter, monkeypatch):
+    import threading
+    import api.transactions
+
+    # Hold the first listing inside the view until the second one has been answered
+    entered = threading.Event()
+    release = threading.Event()
+    list_payload = api.transactions.list_payload
+
+    def held_list_payload(*args, **kwargs):
+        if not entered.is_set():
+            entered.set()
+            release.wait(5)
+        return list_payload(*args, **kwargs)
+
+    monkeypatch.setattr(api.transactions, 'list_payload', held_list_payload)
+    headers = {'Authorization': f'Bearer {token}'}
+    statuses = []
+    first = threading.Thread(target=lambda: statuses.append(
+        app.test_client().get('/api/v1/transactions?expand=supplier,user', headers=headers).status_code))
+    first.start()
+    assert entered.wait(5)
+    statuses.append(app.test_client().get('/api/v1/transactions?expand=supplier,user', headers=headers).status_code)
+    release.set()
+    first.join(5)
+    assert statuses == [200, 200]
+
+def test_slot_released_when_view_fails(app, client, token, limiter, monkeypatch):
+    import api.reports
+
+    def failing_report(*args, **kwargs):
+        raise RuntimeError('boom')
+
+    monkeypatch.setattr(api.reports, 'run_report', failing_report)
+    app.config['PROPAGATE_EXCEPTIONS'] = False
+    response = client.get('/api/v1/reports/stock-on-hand', headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 500
+    assert limiter.stats()['report']['active'] == 0
@@ -1,5 +1,15 @@
+import os
+import sqlite3
+import threading
 import pytest
-from core.database import get_db, query_db, execute_query
+from core.app import reset_after_fork
+from core.auth import generate_auth_token
+from core.database import (get_db, query_db, execute_query, get_pool_stats, ConnectionPool, PoolExhaustedError,
+                           STORAGE_PROFILES, apply_storage_profile, migrate_db, in_list, parse_fields, SCHEMA_VERSION)
+from api.categories import CATEGORY_FIELDS
+from api.products import PRODUCT_FIELDS
+from api.suppliers import SUPPLIER_FIELDS
+from api.transactions import TRANSACTION_COLUMNS
 
 def test_get_db(app):
     with app.app_context():
@@ -35,4 +45,163 @@ def test_execute_query(app):
 
         execute_query(app, 'UPDATE users SET username = ? WHERE user_id = ?', ['updated_user', new_user_id])
         updated_user = query_db(app, 'SELECT * FROM users WHERE user_id = ?', [new_user_id], one=True)
-        assert updated_user['username'] == 'updated_user'
\ No newline at end of file
+        assert updated_user['username'] == 'updated_user'
+
+def test_connection_returned_to_pool(app):
+    checkouts = get_pool_stats(app)['checkouts']
+    with app.app_context():
+        first = get_db(app)
+    with app.app_context():
+        assert get_db(app) is first  # Warm connection is reused across app contexts
+    stats = get_pool_stats(app)
+    assert stats['open'] == 1
+    assert stats['in_use'] == 0
+    assert stats['checkouts'] == checkouts + 2
+
+def test_open_transaction_rolled_back_on_release(app):
+    with app.app_context():
+        db = get_db(app)
+        db.execute("INSERT INTO categories (name) VALUES ('Uncommitted')")
+    with app.app_context():
+        assert query_db(app, "SELECT * FROM categories WHERE name = 'Uncommitted'", one=True) is None
+
+def test_pool_is_bounded(app):
+    pool = ConnectionPool(app.config['DATABASE'], size=2, timeout=0.05)
+    first = pool.acquire()
+    second = pool.acquire()
+    with pytest.raises(PoolExhaustedError):
+        pool.acquire()
+    pool.release(first)
+    assert pool.acquire() is first
+    stats = pool.stats()
+    assert stats['open'] == 2
+    assert stats['in_use'] == 2
+    assert stats['timeouts'] == 1
+    pool.release(first)
+    pool.release(second)
+    pool.close()
+    assert pool.stats()['open'] == 0
+
+def test_connection_released_after_close_is_closed(app):
+    pool = ConnectionPool(app.config['DATABASE'], size=2)
+    idle = pool.acquire()
+    held = pool.acquire()
+    held.execute('SELECT 1')
+    pool.release(idle)
+    pool.close()
+    assert pool.stats()['open'] == 1
+    pool.release(held)
+    stats = pool.stats()
+    assert stats['open'] == 0
+    assert stats['in_use'] == 0
+    assert stats['statements_executed'] == 1  # Still counted once retired
+    with pytest.raises(sqlite3.ProgrammingError):
+        held.execute('SELECT 1')
+
+def test_pool_applies_pragmas(app):
+    pool = ConnectionPool(app.config['DATABASE'], pragmas={'cache_size': -4096})
+    conn = pool.acquire()
+    assert conn.execute('PRAGMA cache_size').fetchone()[0] == -4096
+    pool.release(conn)
+    pool.close()
+
+def test_storage_profile_applied(app):
+    with app.app_context():
+        db = get_db(app)
+        assert db.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        assert db.execute('PRAGMA synchronous').fetchone()[0] == 1  # NORMAL
+        assert db.execute('PRAGMA temp_store').fetchone()[0] == 2  # MEMORY
+        assert db.execute('PRAGMA busy_timeout').fetchone()[0] == STORAGE_PROFILES['wal']['busy_timeout']
+
+def test_unknown_storage_profile(app):
+    db = sqlite3.connect(':memory:')
+    with pytest.raises(ValueError):
+        apply_storage_profile(db, 'no-such-profile')
+    db.close()
+
+def test_execute_query_retries_when_database_is_locked(app):
+    app.config['DATABASE_BUSY_BACKOFF'] = 0.05
+    blocker = sqlite3.connect(app.config['DATABASE'], check_same_thread=False)
+    blocker.execute('BEGIN IMMEDIATE')
+    blocker.execute("INSERT INTO categories (name) VALUES ('Held by another writer')")
+    release = threading.Timer(0.15, blocker.commit)
+    release.start()
+    try:
+        with app.app_context():
+            db = get_db(app)
+            db.execute('PRAGMA busy_timeout = 0')  # Force the retry path instead of SQLite's busy handler
+            category_id = execute_query(app, "INSERT INTO categories (name) VALUES ('Retried')")
+            assert category_id is not None
+            db.execute(f"PRAGMA busy_timeout = {STORAGE_PROFILES['wal']['busy_timeout']}")
+    finally:
+        release.join()
+        blocker.close()
+
+def test_schema_is_migrated(app):
+    with app.app_context():
+        db = get_db(app)
+        assert db.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION
+        assert migrate_db(db) == SCHEMA_VERSION  # Already up to date; nothing is re-applied
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs os.fork')
+def test_pool_reset_after_fork(app):
+    # A preforking server builds the app in the parent, which may already hold warm connections
+    with app.app_context():
+        inherited = get_db(app)
+    pid = os.fork()
+    if pid == 0:
+        try:
+            reset_after_fork(app)
+            with app.app_context():
+                fresh = get_db(app) is not inherited
+                ok = fresh and query_db(app, 'SELECT COUNT(*) FROM users', one=True)[0] == 1
+            os._exit(0 if ok else 1)
+        except BaseException:
+            os._exit(2)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    with app.app_context():
+        assert get_db(app) is inherited
+
+def test_statement_cache_counts_prepares(app):
+    pool = ConnectionPool(app.config['DATABASE'], cached_statements=2)
+    conn = pool.acquire()
+    for sql in ('SELECT 1', 'SELECT 2', 'SELECT 1', 'SELECT 3', 'SELECT 2'):
+        conn.execute(sql)
+    stats = pool.stats()
+    # SELECT 3 evicted SELECT 2, the least recently used
+    assert (stats['statements_executed'], stats['statements_prepared']) == (5, 4)
+    pool.release(conn)
+    pool.close()
+    # Counts of closed connections are kept
+    assert pool.stats()['statements_prepared'] == 4
+
+def test_in_list_pads_to_power_of_two(app):
+    assert in_list([7]) == ('?', [7])
+    assert in_list([1, 2, 3]) == ('?, ?, ?, ?', [1, 2, 3, 3])
+    with app.app_context():
+        placeholders, args = in_list(['test_user', 'missing', 'other'])
+        assert len(query_db(app, f'SELECT * FROM users WHERE username IN ({placeholders})', args)) == 1
+        assert len(query_db(app, f'SELECT * FROM users WHERE username NOT IN ({placeholders})', args)) == 0
+
+def test_filter_shapes_reuse_prepared_statements(app, client):
+    with app.app_context():
+        headers = {'Authorization': f'Bearer {generate_auth_token(app, 1)}'}
+    assert client.get('/api/v1/transactions?product_id=1&transaction_type=Sale&limit=5', headers=headers).status_code == 200
+    prepared = get_pool_stats(app)['statements_prepared']
+    # Same filters in another order and with other values
+    assert client.get('/api/v1/transactions?limit=10&transaction_type=Delivery&product_id=2', headers=headers).status_code == 200
+    assert get_pool_stats(app)['statements_prepared'] == prepared
+
+def test_parse_fields_whitelists_columns(app):
+    assert parse_fields({}, PRODUCT_FIELDS) is None
+    assert parse_fields({'fields': 'name, item_code,name'}, PRODUCT_FIELDS) == ['name', 'item_code']
+    for fields in ('', 'name,password', 'name FROM users --'):
+        with pytest.raises(ValueError):
+            parse_fields({'fields': fields}, PRODUCT_FIELDS)
+    # The whitelists must follow the schema, or fields= would hide new columns
+    with app.app_context():
+        db = get_db(app)
+        for table, fields in (('products', PRODUCT_FIELDS), ('suppliers', SUPPLIER_FIELDS),
+                              ('categories', CATEGORY_FIELDS), ('transactions', TRANSACTION_COLUMNS)):
+            assert tuple(column[1] for column in db.execute(f'PRAGMA table_info({table})')) == fields
@@ -0,0 +1,132 @@
+import sqlite3
+import threading
+import pytest
+from flask import current_app
+from core.auth import generate_auth_token
+from core.database import get_pool, query_db, execute_query
+from core.group_commit import GroupCommitWriter
+
+INSERT_SALE = '''
+    INSERT INTO transactions (product_id, transaction_type, quantity, transaction_date, user_id)
+    VALUES (?, 'Sale', ?, '2024-03-02T09:00:00', 1)
+    RETURNING *
+'''
+
+@pytest.fixture
+def token(app):
+    with app.app_context():
+        execute_query(current_app, "INSERT INTO suppliers (name) VALUES ('Alpha Supplies')")
+        execute_query(current_app, '''
+            INSERT INTO products (item_code, name, supplier_id, category_id, unit_cost, selling_price, is_vat_exempt)
+            VALUES ('ITEM001', 'Product', 1, 1, 10, 20, 0)
+        ''')
+        execute_query(current_app, '''
+            INSERT INTO transactions (product_id, transaction_type, quantity, transaction_date, supplier_id, user_id)
+            VALUES (1, 'Delivery', 10, '2024-03-01T08:00:00', 1, 1)
+        ''')
+        user = query_db(current_app, 'SELECT * FROM users WHERE username = ?', ['test_user'], one=True)
+        return generate_auth_token(current_app, user['user_id'])
+
+@pytest.fixture
+def writer(app):
+    writer = GroupCommitWriter(app.config['DATABASE'], pragmas=get_pool(app).pragmas, max_rows=4, max_delay=0.5)
+    app.extensions['group_commit'] = writer
+    yield writer
+    writer.shutdown()
+
+def stock_and_sales(app):
+    with app.app_context():
+        stock = query_db(current_app, 'SELECT stock_on_hand FROM products WHERE product_id = 1', one=True)[0]
+        sales = query_db(current_app, "SELECT COUNT(*) FROM transactions WHERE transaction_type = 'Sale'", one=True)[0]
+    return stock, sales
+
+def test_concurrent_writes_share_a_commit(app, token, writer):
+    futures = []
+    threads = [threading.Thread(target=lambda: futures.append(writer.submit(INSERT_SALE, [1, 1]))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    rows = [future.result(timeout=5) for future in futures]
+    assert sorted(row['transaction_id'] for row in rows) == [2, 3, 4, 5]
+    assert stock_and_sales(app) == (6, 4)
+    stats = writer.stats()
+    assert (stats['batches'], stats['rows'], stats['largest_batch'], stats['failed']) == (1, 4, 4, 0)
+
+def test_failing_row_is_rolled_back_alone(app, token, writer):
+    first = writer.submit(INSERT_SALE, [1, 4])
+    oversold = writer.submit(INSERT_SALE, [1, 50])
+    last = writer.submit(INSERT_SALE, [1, 5])
+    assert first.result(timeout=5)['quantity'] == 4
+    with pytest.raises(sqlite3.IntegrityError, match='stock_on_hand'):
+        oversold.result(timeout=5)
+    assert last.result(timeout=5)['quantity'] == 5
+    assert stock_and_sales(app) == (1, 2)
+    assert writer.stats()['failed'] == 1
+
+def test_shutdown_commits_queued_writes(app, token):
+    writer = GroupCommitWriter(app.config['DATABASE'], pragmas=get_pool(app).pragmas, max_rows=100, max_delay=60)
+    futures = [writer.submit(INSERT_SALE, [1, 1]) for _ in range(3)]
+    writer.shutdown()
+    assert all(future.done() for future in futures)
+    assert stock_and_sales(app) == (7, 3)
+
+def test_create_transaction_through_writer(app, client, token, writer):
+    writer.max_delay = 0
+    headers = {'Authorization': f'Bearer {token}'}
+    sale = {'product_id': 1, 'transaction_type': 'Sale', 'quantity': 3, 'transaction_date': '2024-03-02T09:00:00', 'user_id': 1}
+    response = client.post('/api/v1/transactions', json=sale, headers=headers)
+    assert response.status_code == 201
+    assert (response.json['transaction_id'], response.json['price']) == (2, 20)
+    response = client.post('/api/v1/transactions', json={**sale, 'quantity': 100}, headers=headers)
+    assert (response.status_code, response.json['message']) == (400, 'Insufficient stock')
+    response = client.post('/api/v1/transactions', json={**sale, 'user_id': 99}, headers=headers)
+    assert (response.status_code, response.json['message']) == (400, 'Invalid user_id')
+    response = client.post('/api/v1/transactions', json={**sale, 'product_id': 99}, headers=headers)
+    assert (response.status_code, response.json['message']) == (400, 'Invalid product_id')
+    assert writer.stats()['rows'] == 4
+    assert stock_and_sales(app) == (7, 1)
+
+def test_writer_failures_fail_the_writes_and_restart(app, token, tmp_path):
+    broken = GroupCommitWriter(str(tmp_path / 'missing' / 'inventory.db'))
+    with pytest.raises(sqlite3.OperationalError):
+        broken.submit(INSERT_SALE, [1, 1]).result(timeout=5)
+    with pytest.raises(sqlite3.OperationalError):
+        broken.submit(INSERT_SALE, [1, 1]).result(timeout=5)
+    assert broken.stats()['crashes'] == 2
+
+    writer = GroupCommitWriter(app.config['DATABASE'], pragmas=get_pool(app).pragmas, max_delay=0)
+    commit = writer._commit
+    def crash_once(conn, batch):
+        writer._commit = commit
+        raise sqlite3.OperationalError('cannot rollback - no transaction is active')
+    writer._commit = crash_once
+    with pytest.raises(sqlite3.OperationalError, match='cannot rollback'):
+        writer.submit(INSERT_SALE, [1, 1]).result(timeout=5)
+    assert writer.submit(INSERT_SALE, [1, 2]).result(timeout=5)['quantity'] == 2
+    assert writer.stats()['crashes'] == 1
+    writer.shutdown()
+    assert stock_and_sales(app) == (8, 1)
+
+def test_create_transaction_times_out_with_503(app, client, token, writer):
+    app.config['TRANSACTION_GROUP_COMMIT_TIMEOUT'] = 0.05
+    writer.max_delay = 0
+    commit = writer._commit
+    stalled, release = threading.Event(), threading.Event()
+    def stalled_commit(conn, batch):
+        stalled.set()
+        release.wait(5)
+        commit(conn, batch)
+    writer._commit = stalled_commit
+    held = writer.submit(INSERT_SALE, [1, 1])
+    assert stalled.wait(5)
+
+    sale = {'product_id': 1, 'transaction_type': 'Sale', 'quantity': 3, 'transaction_date': '2024-03-02T09:00:00', 'user_id': 1}
+    response = client.post('/api/v1/transactions', json=sale, headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    release.set()
+    held.result(timeout=5)
+    writer.shutdown()
+    # The timed-out sale was withdrawn while queued and never written
+    assert stock_and_sales(app) == (9, 1)
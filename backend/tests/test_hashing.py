@@ -0,0 +1,77 @@
+import threading
+import pytest
+from flask import current_app
+
+import core.hashing
+from core.auth import generate_auth_token
+from core.database import query_db
+from core.hashing import PasswordHasher, HasherSaturatedError, get_password_hasher
+
+@pytest.mark.parametrize('workers', [0, 2])
+def test_hash_and_verify(workers):
+    hasher = PasswordHasher(workers=workers)
+    hashed = hasher.hash('secret')
+    assert hasher.verify(hashed, 'secret')
+    assert not hasher.verify(hashed, 'wrong')
+    stats = hasher.stats()
+    assert stats['completed'] == 3
+    assert stats['in_flight'] == 0
+    assert stats['latency_max_seconds'] > 0
+    hasher.shutdown()
+
+def test_process_executor():
+    hasher = PasswordHasher(executor='process', workers=1)
+    assert hasher.verify(hasher.hash('secret'), 'secret')
+    hasher.shutdown()
+
+def block_hashing(monkeypatch):
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_hash(password):
+        started.set()
+        release.wait(5)
+        return b'\0' * 48
+
+    monkeypatch.setattr(core.hashing, 'hash_password', slow_hash)
+    return started, release
+
+def test_saturated_hasher_rejects(monkeypatch):
+    started, release = block_hashing(monkeypatch)
+    hasher = PasswordHasher(workers=1, queue_size=0)
+    worker = threading.Thread(target=hasher.hash, args=('first',))
+    worker.start()
+    started.wait(5)
+    with pytest.raises(HasherSaturatedError):
+        hasher.hash('second')
+    release.set()
+    worker.join()
+    assert hasher.stats()['rejected'] == 1
+    hasher.shutdown()
+
+def test_saturated_hasher_returns_429(app, client, monkeypatch):
+    started, release = block_hashing(monkeypatch)
+    app.extensions['password_hasher'] = PasswordHasher(workers=1, queue_size=0)
+    with app.app_context():
+        user = query_db(current_app, 'SELECT * FROM users WHERE username = ?', ['test_user'], one=True)
+        token = generate_auth_token(current_app, user['user_id'])
+    worker = threading.Thread(target=get_password_hasher(app).hash, args=('busy',))
+    worker.start()
+    started.wait(5)
+    response = client.post('/api/v1/users', json={'username': 'storm', 'password': 'pw', 'role': 'Staff'},
+                           headers={'Authorization': f'Bearer {token}'})
+    release.set()
+    worker.join()
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '1'
+    get_password_hasher(app).shutdown()
+
+def test_reset_after_fork_starts_a_new_executor():
+    hasher = PasswordHasher(workers=1)
+    hashed = hasher.hash('secret')
+    inherited = hasher._executor
+    hasher.reset_after_fork()
+    assert hasher.verify(hashed, 'secret')
+    assert hasher._executor is not inherited
+    hasher.shutdown()
+    inherited.shutdown()
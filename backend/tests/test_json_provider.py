@@ -0,0 +1,63 @@
+import json
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import pytest
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from core.auth import generate_auth_token
+from core.database import execute_query
+from core.json_provider import OrjsonProvider, init_json_provider, list_payload
+
+def test_orjson_matches_default_provider(app):
+    pytest.importorskip('orjson', minversion='3.9.15')
+    assert isinstance(app.json, OrjsonProvider)
+    payload = {'b': [1, 2.5, None, True], 'a': 'Café', 'c': Decimal('1.10'),
+               'when': datetime(2024, 3, 1, 8, 30, tzinfo=timezone.utc), 'row': (1, 'x')}
+    expected = json.loads(DefaultJSONProvider(app).dumps(payload))
+    assert json.loads(app.json.dumps(payload)) == expected
+    with app.app_context():
+        response = app.json.response(payload)
+    assert response.mimetype == 'application/json'
+    assert json.loads(response.get_data()) == expected
+    assert app.json.loads(b'{"a": [1]}') == {'a': [1]}
+
+def test_provider_is_configurable():
+    app = Flask(__name__)
+    app.config['JSON_PROVIDER'] = 'default'
+    assert type(init_json_provider(app)) is DefaultJSONProvider
+    app.config['JSON_PROVIDER'] = 'simplejson'
+    with pytest.raises(ValueError):
+        init_json_provider(app)
+
+def test_hostile_bodies_are_rejected(app, client):
+    # Nesting deep enough to exhaust the decoder's stack, well within the size limit
+    nested = '[' * 100000 + ']' * 100000
+    response = client.post('/api/v1/users/login', data=nested, content_type='application/json')
+    assert 400 <= response.status_code < 500
+    response = client.post('/api/v1/users/login', data='[' * 1000000 + ']' * 1000000, content_type='application/json')
+    assert response.status_code == 413
+
+def test_compact_list_format(app, client):
+    assert list_payload(('id', 'name'), [(1, 'a')]) == [{'id': 1, 'name': 'a'}]
+    assert list_payload(('id', 'name'), [(1, 'a')], 'compact') == {'columns': ['id', 'name'], 'rows': [(1, 'a')]}
+
+    with app.app_context():
+        headers = {'Authorization': f'Bearer {generate_auth_token(app, 1)}'}
+        execute_query(app, "INSERT INTO suppliers (name) VALUES ('Format Supplier')")
+        execute_query(app, '''
+            INSERT INTO products (item_code, name, supplier_id, category_id, unit_cost, selling_price, is_vat_exempt, stock_on_hand)
+            VALUES ('ITEM001', 'Format Product', 1, 1, 1, 2, 0, 10)
+        ''')
+    response = client.get('/api/v1/categories?format=compact&fields=category_id,name')
+    assert response.json['columns'] == ['category_id', 'name']
+    assert response.json['rows'][0] == [1, 'College Books']
+    assert client.get('/api/v1/categories?format=xml').status_code == 400
+
+    for type_, day in (('Sale', 2), ('Sale', 3), ('Return', 4)):
+        client.post('/api/v1/transactions', headers=headers, json={
+            'product_id': 1, 'transaction_type': type_, 'quantity': 1, 'transaction_date': f'2024-03-0{day}', 'user_id': 1})
+    response = client.get('/api/v1/transactions?format=compact&fields=transaction_type&limit=2&sort=transaction_date', headers=headers)
+    assert response.json == {'columns': ['transaction_type'], 'rows': [['Sale'], ['Sale']]}
+    assert 'X-Next-Cursor' in response.headers
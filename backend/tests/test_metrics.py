@@ -0,0 +1,97 @@
+import logging
+import pytest
+from flask import current_app
+from core.auth import generate_auth_token
+from core.database import close_pool, init_pool, query_db, execute_query
+from core.metrics import init_metrics, get_metrics, LATENCY_BUCKETS
+
+@pytest.fixture
+def metrics_app(app):
+    app.config.update(METRICS_ENABLED=True, SLOW_QUERY_MS=None)
+    # A fresh pool, so every connection carries the commit counter
+    close_pool(app)
+    init_pool(app)
+    init_metrics(app)
+    return app
+
+@pytest.fixture
+def headers(app):
+    with app.app_context():
+        user = query_db(current_app, 'SELECT * FROM users WHERE username = ?', ['test_user'], one=True)
+        return {'Authorization': f'Bearer {generate_auth_token(current_app, user["user_id"])}'}
+
+def test_disabled_by_default(app, client):
+    assert get_metrics(app) is None
+    assert client.get('/metrics').status_code == 404
+
+def test_metrics_endpoint(metrics_app, client, headers):
+    assert client.get('/api/v1/products', headers=headers).status_code == 200
+    assert client.get('/api/v1/products', headers=headers).status_code == 200
+    assert client.post('/api/v1/categories', json={'name': 'Snacks'}, headers=headers).status_code == 201
+    assert client.get('/no-such-page').status_code == 404
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+    lines = text.splitlines()
+    labels = 'endpoint="products.get_products",method="GET",status="200"'
+    assert f'inventory_http_request_duration_seconds_count{{{labels}}} 2' in lines
+    assert f'inventory_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2' in lines
+    assert 'inventory_http_request_duration_seconds_count{endpoint="unmatched",method="GET",status="404"} 1' in lines
+    assert '# TYPE inventory_sql_statement_duration_seconds summary' in lines
+    # The second listing came from the response cache
+    assert 'inventory_sql_statement_duration_seconds_count{statement="SELECT * FROM products"} 1' in lines
+    assert 'inventory_sql_statement_rows_total{statement="SELECT * FROM products"} 0' in lines
+    assert 'inventory_db_connections_opened_total 1' in lines
+    assert 'inventory_concurrency_rejected_total{endpoint_class="report"} 0' in lines
+    commits = next(line for line in lines if line.startswith('inventory_db_commits_total '))
+    assert int(commits.split()[1]) >= 1
+
+def test_histogram_buckets_are_cumulative(metrics_app):
+    registry = get_metrics(metrics_app)
+    for elapsed in (0.001, 0.02, 0.02, 30.0):
+        registry.observe_request('reports.sales_report', 'GET', 200, elapsed)
+    lines = registry.render(metrics_app).splitlines()
+    prefix = 'inventory_http_request_duration_seconds_bucket{endpoint="reports.sales_report",method="GET",status="200",'
+    counts = [int(line.rsplit(' ', 1)[1]) for line in lines if line.startswith(prefix)]
+    assert len(counts) == len(LATENCY_BUCKETS) + 1
+    assert counts[0] == 1  # le="0.005"
+    assert counts[LATENCY_BUCKETS.index(0.025)] == 3
+    assert counts[-2:] == [3, 4]  # Only +Inf holds the 30 s request
+
+def test_slow_query_log_explains_plan(app, caplog):
+    app.config.update(SLOW_QUERY_MS=0)
+    init_metrics(app)
+    with caplog.at_level(logging.WARNING, logger='inventory.slow_queries'), app.app_context():
+        query_db(app, 'SELECT * FROM users WHERE user_id = ?', [1])
+        execute_query(app, "INSERT INTO categories (name) VALUES ('Logged')")
+    messages = [record.getMessage() for record in caplog.records]
+    assert messages[0].startswith('Slow query (')
+    assert 'SELECT * FROM users WHERE user_id = ?' in messages[0]
+    assert 'SEARCH users USING INTEGER PRIMARY KEY' in messages[0]
+    assert "INSERT INTO categories (name) VALUES ('Logged')" in messages[1]
+    # Timing without METRICS_ENABLED: no endpoint
+    assert get_metrics(app).stats()['slow_queries'] == 2
+    assert 'metrics' not in app.view_functions
+
+def test_statement_shapes_are_capped(app):
+    app.config.update(METRICS_ENABLED=True, METRICS_MAX_STATEMENTS=3)
+    registry = init_metrics(app)
+    with app.app_context():
+        # Padded IN lists of every size are one shape
+        for count in (1, 2, 3, 5, 9):
+            query_db(app, f"SELECT * FROM users WHERE user_id IN ({', '.join('?' * count)})", [1] * count)
+        for column in ('category_id', 'name', 'category_id, name', 'name, category_id'):
+            query_db(app, f'SELECT {column} FROM categories')
+    lines = registry.render(app).splitlines()
+    assert 'inventory_sql_statement_duration_seconds_count{statement="SELECT * FROM users WHERE user_id IN (?, ...)"} 5' in lines
+    assert 'inventory_sql_statement_duration_seconds_count{statement="SELECT name FROM categories"} 1' in lines
+    assert 'inventory_sql_statement_duration_seconds_count{statement="other"} 2' in lines
+    assert registry.stats()['statement_shapes'] == 4
+
+def test_metrics_token(metrics_app, client):
+    metrics_app.config['METRICS_TOKEN'] = 'scrape-secret'
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer scrape-secret'}).status_code == 200
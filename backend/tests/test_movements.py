@@ -0,0 +1,77 @@
+import pytest
+from flask import current_app
+from core.database import get_db, query_db, execute_query
+from core.movements import rebuild_daily_movements, verify_daily_movements
+
+def setup_product(app):
+    with app.app_context():
+        execute_query(current_app, "INSERT INTO suppliers (name) VALUES ('Test Supplier')")
+        return execute_query(current_app, '''
+            INSERT INTO products (item_code, name, supplier_id, category_id, unit_cost, selling_price, is_vat_exempt, stock_on_hand)
+            VALUES ('ITEM001', 'Test Product', 1, 1, 10, 20, 0, 100)
+        ''')
+
+def add_transaction(app, product_id, transaction_type, quantity, date, price=None):
+    with app.app_context():
+        return execute_query(current_app, '''
+            INSERT INTO transactions (product_id, transaction_type, quantity, transaction_date, supplier_id, user_id, price)
+            VALUES (?, ?, ?, ?, ?, 1, ?)
+        ''', [product_id, transaction_type, quantity, date, 1 if transaction_type in ('Delivery', 'Pull-out') else None, price])
+
+def movements(app):
+    with app.app_context():
+        rows = query_db(current_app, 'SELECT * FROM daily_product_movements ORDER BY movement_date, transaction_type')
+        return [dict(row) for row in rows]
+
+def test_insert_aggregates_per_day(app):
+    product_id = setup_product(app)
+    add_transaction(app, product_id, 'Sale', 2, '2024-03-15T09:00:00', 20)
+    add_transaction(app, product_id, 'Sale', 3, '2024-03-15T17:30:00', 20)
+    add_transaction(app, product_id, 'Sale', 1, '2024-03-16T08:00:00', 20)
+    add_transaction(app, product_id, 'Delivery', 10, '2024-03-15T10:00:00')
+
+    assert movements(app) == [
+        {'transaction_type': 'Delivery', 'movement_date': '2024-03-15', 'product_id': product_id, 'quantity': 10, 'amount': 0, 'transaction_count': 1},
+        {'transaction_type': 'Sale', 'movement_date': '2024-03-15', 'product_id': product_id, 'quantity': 5, 'amount': 100, 'transaction_count': 2},
+        {'transaction_type': 'Sale', 'movement_date': '2024-03-16', 'product_id': product_id, 'quantity': 1, 'amount': 20, 'transaction_count': 1},
+    ]
+
+def test_update_and_delete_move_totals(app):
+    product_id = setup_product(app)
+    first = add_transaction(app, product_id, 'Sale', 2, '2024-03-15', 20)
+    second = add_transaction(app, product_id, 'Sale', 3, '2024-03-15', 20)
+    with app.app_context():
+        execute_query(current_app, "UPDATE transactions SET transaction_date = '2024-03-16', quantity = 4 WHERE transaction_id = ?", [second])
+        execute_query(current_app, 'DELETE FROM transactions WHERE transaction_id = ?', [first])
+
+    assert movements(app) == [
+        {'transaction_type': 'Sale', 'movement_date': '2024-03-16', 'product_id': product_id, 'quantity': 4, 'amount': 80, 'transaction_count': 1},
+    ]
+
+def test_batch_ingestion_maintains_movements(app, client):
+    product_id = setup_product(app)
+    with app.app_context():
+        from core.auth import generate_auth_token
+        token = generate_auth_token(current_app, 1)
+    batch = [{'product_id': product_id, 'transaction_type': 'Sale', 'quantity': 1, 'transaction_date': '2024-03-15', 'user_id': 1}] * 3
+    response = client.post('/api/v1/transactions/batch', json=batch, headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 201
+    assert movements(app)[0]['transaction_count'] == 3
+
+def test_verify_and_rebuild(app):
+    product_id = setup_product(app)
+    add_transaction(app, product_id, 'Sale', 2, '2024-03-15', 20)
+    add_transaction(app, product_id, 'Delivery', 5, '2024-03-16')
+    with app.app_context():
+        db = get_db(app)
+        assert verify_daily_movements(db) == []
+
+        # Simulate drift: one wrong total and one row with no ledger behind it
+        db.execute("UPDATE daily_product_movements SET quantity = 99 WHERE transaction_type = 'Sale'")
+        db.execute("INSERT INTO daily_product_movements VALUES ('Return', '2024-01-01', ?, 1, 20, 1)", [product_id])
+        db.commit()
+        discrepancies = verify_daily_movements(db)
+        assert {(row['transaction_type'], row['movement_date']) for row in discrepancies} == {('Sale', '2024-03-15'), ('Return', '2024-01-01')}
+
+        assert rebuild_daily_movements(db) == 2
+        assert verify_daily_movements(db) == []
@@ -0,0 +1,107 @@
+import time
+
+import pytest
+from flask import current_app
+from core.database import get_db, query_db, execute_query
+from core.auth import generate_auth_token
+from core.product_index import get_product_index
+
+@pytest.fixture
+def headers(app):
+    with app.app_context():
+        execute_query(current_app, "INSERT INTO suppliers (name) VALUES ('Scan Supplier')")
+        for item_code, is_active in (('4800001', 1), ('4800002', 1), ('4800003', 0)):
+            execute_query(current_app, '''
+                INSERT INTO products (item_code, name, supplier_id, category_id, unit_cost, selling_price, is_vat_exempt, stock_on_hand, is_active)
+                VALUES (?, ?, 1, 1, 10, 20, 0, 50, ?)
+            ''', [item_code, f'Product {item_code}', is_active])
+        user = query_db(current_app, 'SELECT * FROM users WHERE username = ?', ['test_user'], one=True)
+        return {'Authorization': f'Bearer {generate_auth_token(current_app, user["user_id"])}'}
+
+def test_lookup_by_code(app, client, headers):
+    response = client.get('/api/v1/products/by-code/4800001', headers=headers)
+    assert response.status_code == 200
+    assert response.json == client.get('/api/v1/products/1', headers=headers).json
+
+@pytest.mark.parametrize('item_code', ['4800003', 'UNKNOWN'])
+def test_lookup_by_code_not_found(app, client, headers, item_code):
+    # Inactive products cannot be scanned
+    response = client.get(f'/api/v1/products/by-code/{item_code}', headers=headers)
+    assert response.status_code == 404
+
+def traced_scan(app, client, headers):
+    statements = []
+    with app.app_context():
+        get_db(app).set_trace_callback(statements.append)
+    client.get('/api/v1/products/by-code/4800001', headers=headers)
+    with app.app_context():
+        get_db(app).set_trace_callback(None)
+    return statements
+
+def test_scan_reads_only_the_stock(app, client, headers):
+    client.get('/api/v1/products/by-code/4800001', headers=headers)
+    statements = traced_scan(app, client, headers)
+    assert len(statements) == 1
+    assert 'stock_on_hand' in statements[0] and 'product_id IN (1)' in statements[0]
+
+    # Once the check interval has passed, the next scan also reads the catalog version
+    get_product_index(app).version_check = 0
+    statements = traced_scan(app, client, headers)
+    assert len(statements) == 2
+    assert 'table_versions' in statements[0]
+
+def test_sales_do_not_reload_the_index(app, client, headers):
+    client.get('/api/v1/products/by-code/4800001', headers=headers)
+    loads = get_product_index(app).loads
+    client.post('/api/v1/transactions', json={
+        'product_id': 1, 'transaction_type': 'Sale', 'quantity': 4, 'transaction_date': '2024-03-15', 'user_id': 1,
+    }, headers=headers)
+    response = client.get('/api/v1/products/by-code/4800001', headers=headers)
+    assert response.json['stock_on_hand'] == 46
+    assert get_product_index(app).loads == loads
+
+def test_product_endpoints_update_the_index_in_place(app, client, headers):
+    client.get('/api/v1/products/by-code/4800001', headers=headers)
+    loads = get_product_index(app).loads
+
+    client.patch('/api/v1/products/1', json={'item_code': '4800009', 'selling_price': 25}, headers=headers)
+    assert client.get('/api/v1/products/by-code/4800001', headers=headers).status_code == 404
+    assert client.get('/api/v1/products/by-code/4800009', headers=headers).json['selling_price'] == 25
+
+    client.post('/api/v1/products', json={'item_code': '4800010', 'name': 'Fresh', 'supplier_id': 1, 'category_id': 1,
+                                          'unit_cost': 1, 'selling_price': 2, 'is_vat_exempt': 0}, headers=headers)
+    assert client.get('/api/v1/products/by-code/4800010', headers=headers).json['name'] == 'Fresh'
+
+    client.delete('/api/v1/products/2', headers=headers)
+    assert client.get('/api/v1/products/by-code/4800002', headers=headers).status_code == 404
+    assert get_product_index(app).loads == loads
+
+def test_changes_from_other_writers_reload_the_index(app, client, headers):
+    get_product_index(app).version_check = 0.2
+    client.get('/api/v1/products/by-code/4800001', headers=headers)
+    # Stands in for another server process writing to the same database
+    with app.app_context():
+        execute_query(current_app, "UPDATE products SET is_active = 1, name = 'Back in stock' WHERE item_code = '4800003'")
+    # Seen once the catalog version is checked again
+    assert client.get('/api/v1/products/by-code/4800003', headers=headers).status_code == 404
+    time.sleep(0.25)
+    response = client.get('/api/v1/products/by-code/4800003', headers=headers)
+    assert response.status_code == 200
+    assert response.json['name'] == 'Back in stock'
+
+def test_batch_lookup(app, client, headers):
+    response = client.post('/api/v1/products/by-code', json={'item_codes': ['4800002', 'NOPE', '4800001', '4800003', '4800002']},
+                           headers=headers)
+    assert response.status_code == 200
+    assert [product['item_code'] for product in response.json['products']] == ['4800002', '4800001']
+    assert response.json['missing'] == ['NOPE', '4800003']
+
+@pytest.mark.parametrize('body', [{}, {'item_codes': []}, {'item_codes': '4800001'}, {'item_codes': [4800001]}, ['4800001']])
+def test_batch_lookup_rejects_invalid_bodies(app, client, headers, body):
+    response = client.post('/api/v1/products/by-code', json=body, headers=headers)
+    assert response.status_code == 400
+
+def test_batch_lookup_limit(app, client, headers):
+    app.config['PRODUCT_LOOKUP_BATCH_LIMIT'] = 2
+    response = client.post('/api/v1/products/by-code', json={'item_codes': ['a', 'b', 'c']}, headers=headers)
+    assert response.status_code == 400
@@ -0,0 +1,87 @@
+import sqlite3
+import pytest
+from flask import current_app
+import core.database
+from core.database import query_db, execute_query, init_db, migrate_db, MIGRATIONS
+from core.auth import generate_auth_token
+
+PRODUCTS = [
+    ('UNI-PE-M', 'PE Uniform Shirt', 'Medium, cotton', 1),
+    ('UNI-PE-L', 'PE Uniform Shirt', 'Large, cotton', 1),
+    ('NB-001', 'Spiral Notebook', '80 leaves, college ruled', 1),
+    ('BK-ALG', 'College Algebra', 'Textbook for first year', 1),
+    ('BK-OLD', 'Álgebra Básica', 'Discontinued edition', 0),
+]
+
+@pytest.fixture
+def headers(app):
+    with app.app_context():
+        execute_query(current_app, "INSERT INTO suppliers (name) VALUES ('Search Supplier')")
+        for item_code, name, description, is_active in PRODUCTS:
+            execute_query(current_app, '''
+                INSERT INTO products (item_code, name, description, supplier_id, category_id, unit_cost, selling_price, is_vat_exempt, is_active)
+                VALUES (?, ?, ?, 1, 1, 10, 20, 0, ?)
+            ''', [item_code, name, description, is_active])
+        user = query_db(current_app, 'SELECT * FROM users WHERE username = ?', ['test_user'], one=True)
+        return {'Authorization': f'Bearer {generate_auth_token(current_app, user["user_id"])}'}
+
+def search(client, headers, query):
+    response = client.get(f'/api/v1/products/search?{query}', headers=headers)
+    assert response.status_code == 200, response.json
+    return [product['item_code'] for product in response.json]
+
+def test_prefix_search(client, headers):
+    assert search(client, headers, 'q=unif') == ['UNI-PE-M', 'UNI-PE-L']
+    assert search(client, headers, 'q=spi+note') == ['NB-001']
+    # Every word has to match
+    assert search(client, headers, 'q=unif+large') == ['UNI-PE-L']
+
+def test_search_ranks_item_code_over_name_over_description(client, headers):
+    assert search(client, headers, 'q=college&is_active=1') == ['BK-ALG', 'NB-001']
+
+def test_search_ignores_case_accents_and_punctuation(client, headers):
+    assert sorted(search(client, headers, 'q=ALGEBRA')) == ['BK-ALG', 'BK-OLD']
+    assert search(client, headers, 'q=uni-pe-m') == ['UNI-PE-M']
+    # FTS5 query syntax in the input is treated as plain text
+    assert search(client, headers, 'q="shirt*(:^') == ['UNI-PE-M', 'UNI-PE-L']
+
+def test_search_filters_and_limit(client, headers):
+    assert search(client, headers, 'q=algebra&is_active=1') == ['BK-ALG']
+    assert search(client, headers, 'q=shirt&limit=1') == ['UNI-PE-M']
+
+def test_search_follows_product_changes(app, client, headers):
+    client.patch('/api/v1/products/3', json={'name': 'Composition Notebook'}, headers=headers)
+    assert search(client, headers, 'q=spiral') == []
+    assert search(client, headers, 'q=compo') == ['NB-001']
+    with app.app_context():
+        execute_query(current_app, 'DELETE FROM products WHERE product_id = 3')
+    assert search(client, headers, 'q=compo') == []
+
+@pytest.mark.parametrize('query', ['', 'q=', 'q=%20-%20', 'q=shirt&limit=0', 'q=shirt&limit=101', 'q=shirt&limit=ten'])
+def test_search_rejects_invalid_parameters(client, headers, query):
+    response = client.get(f'/api/v1/products/search?{query}', headers=headers)
+    assert response.status_code == 400
+
+def test_migration_indexes_existing_products(tmp_path, monkeypatch):
+    db = sqlite3.connect(tmp_path / 'existing.db')
+    init_db(db)
+    # Roll the database back to just before the full-text index existed
+    db.executescript('''
+        DROP TRIGGER products_fts_insert;
+        DROP TRIGGER products_fts_update;
+        DROP TRIGGER products_fts_delete;
+        DROP TABLE products_fts;
+    ''')
+    version = [name for name, _ in MIGRATIONS].index('products_fts')
+    db.execute(f"PRAGMA user_version = {version}")
+    db.execute("INSERT INTO suppliers (name) VALUES ('Old Supplier')")
+    db.execute('''
+        INSERT INTO products (item_code, name, supplier_id, category_id, unit_cost, selling_price, is_vat_exempt)
+        VALUES ('OLD-1', 'Legacy Protractor', 1, 1, 1, 2, 0)
+    ''')
+    db.commit()
+
+    monkeypatch.setattr(core.database, 'MIGRATIONS', MIGRATIONS[:version + 1])
+    assert migrate_db(db) == version + 1
+    assert db.execute("SELECT rowid FROM products_fts WHERE products_fts MATCH 'protr*'").fetchall() == [(1,)]
+    db.close()
@@ -1,6 +1,6 @@
 import pytest
 from flask import current_app
-from core.database import query_db, execute_query
+from core.database import get_db, query_db, execute_query
 from core.auth import generate_auth_token
 
 # Helper function to get a valid token (admin)
@@ -147,3 +147,63 @@ def test_create_product_missing_data(app, client):
     admin_token = get_admin_token(app)
     response = client.post('/api/v1/products', json={}, headers={'Authorization': f'Bearer {admin_token}'})
     assert response.status_code == 400
+
+def test_create_product_invalid_references(app, client):
+    setup_test_data(app)
+    admin_token = get_admin_token(app)
+    product_data = {'item_code': 'ITEM009', 'name': 'Orphan', 'supplier_id': 999, 'category_id': 1,
+                    'unit_cost': 1, 'selling_price': 2, 'is_vat_exempt': 0}
+    response = client.post('/api/v1/products', json=product_data, headers={'Authorization': f'Bearer {admin_token}'})
+    assert response.status_code == 400
+    assert response.json['message'] == 'Invalid supplier_id or category_id'
+    with app.app_context():
+        assert query_db(current_app, "SELECT * FROM products WHERE item_code = 'ITEM009'", one=True) is None
+
+@pytest.mark.parametrize('patch_data, message', [
+    ({'supplier_id': 999}, 'Invalid supplier_id'),
+    ({'category_id': 999}, 'Invalid category_id'),
+    ({'supplier_id': 1, 'category_id': 999}, 'Invalid category_id'),
+])
+def test_patch_product_invalid_references(app, client, patch_data, message):
+    setup_test_data(app)
+    admin_token = get_admin_token(app)
+    response = client.patch('/api/v1/products/1', json=patch_data, headers={'Authorization': f'Bearer {admin_token}'})
+    assert response.status_code == 400
+    assert response.json['message'] == message
+
+def test_update_missing_product(app, client):
+    setup_test_data(app)
+    admin_token = get_admin_token(app)
+    response = client.patch('/api/v1/products/999', json={'name': 'Nothing'}, headers={'Authorization': f'Bearer {admin_token}'})
+    assert response.status_code == 404
+
+def test_create_product_runs_a_single_statement(app, client):
+    setup_test_data(app)
+    admin_token = get_admin_token(app)
+    statements = []
+    with app.app_context():
+        get_db(app).set_trace_callback(statements.append)
+    product_data = {'item_code': 'ITEM010', 'name': 'Traced', 'supplier_id': 1, 'category_id': 1,
+                    'unit_cost': 1, 'selling_price': 2, 'is_vat_exempt': 0}
+    response = client.post('/api/v1/products', json=product_data, headers={'Authorization': f'Bearer {admin_token}'})
+    with app.app_context():
+        get_db(app).set_trace_callback(None)
+    assert response.status_code == 201
+    assert response.json['item_code'] == 'ITEM010'
+    # Authentication is served from the user cache, so only the insert and the catalog
+    # version read that keeps the product index current reach the database. SQLite traces
+    # the statement text again for each trigger program it runs, and the full-text index's
+    # own statements as '-- ...'.
+    writes = {sql for sql in statements
+              if sql.strip().split()[0].upper() not in ('BEGIN', 'COMMIT', '--') and 'table_versions' not in sql}
+    assert len(writes) == 1 and 'RETURNING' in writes.pop()
+
+def test_get_products_fields(app, client):
+    setup_test_data(app)
+    admin_token = get_admin_token(app)
+    response = client.get('/api/v1/products?fields=item_code,name,stock_on_hand', headers={'Authorization': f'Bearer {admin_token}'})
+    assert response.status_code == 200
+    assert response.json == [{'item_code': 'ITEM001', 'name': 'New Product', 'stock_on_hand': 0}]
+    response = client.get('/api/v1/products?fields=name,password', headers={'Authorization': f'Bearer {admin_token}'})
+    assert response.status_code == 400
+    assert response.json['message'] == 'Invalid field: password'
@@ -0,0 +1,118 @@
+import re
+import pytest
+from flask import current_app
+from core.database import get_db, query_db, execute_query
+from core.auth import generate_auth_token
+
+# Every filter the list endpoints accept (apart from the name substring search) must be
+# answered through an index. Listing a whole table is the only acceptable scan.
+TRANSACTION_FILTERS = [
+    'product_id=1',
+    'transaction_type=Sale',
+    'start_date=2024-03-01',
+    'end_date=2024-03-31',
+    'start_date=2024-03-01&end_date=2024-03-31',
+    'user_id=1',
+    'supplier_id=1',
+    'product_id=1&start_date=2024-03-01&end_date=2024-03-31',
+    'transaction_type=Sale&start_date=2024-03-01&end_date=2024-03-31',
+    'user_id=1&start_date=2024-03-01',
+    'supplier_id=1&transaction_type=Delivery',
+]
+TRANSACTION_PAGINATION = [
+    '',
+    '&limit=2',
+    '&limit=2&order=desc',
+    '&limit=2&sort=transaction_date',
+    '&limit=2&sort=transaction_date&order=desc',
+    '&limit=2&sort=transaction_date&expand=product,supplier,user',
+]
+PRODUCT_FILTERS = [
+    'category_id=1',
+    'supplier_id=1',
+    'item_code=ITEM001',
+    'is_active=1',
+    'stock_on_hand_lte=10',
+    'stock_on_hand_gte=10',
+    'is_active=1&stock_on_hand_lte=10',
+    'category_id=1&is_active=1',
+    'supplier_id=1&is_active=1',
+]
+# Reports over the ledger; only stock on hand and unsold items list the products table
+REPORT_QUERIES = [
+    'stock-on-hand?as_of=2024-03-03',
+    'sales?start_date=2024-03-01&end_date=2024-03-31',
+    'sales?sort=total_sales_amount&order=desc',
+    'unsold?start_date=2024-03-01&end_date=2024-03-31',
+    'deliveries?start_date=2024-03-01&end_date=2024-03-31',
+    'deliveries?supplier_id=1&start_date=2024-03-01',
+    'pull-outs?start_date=2024-03-01&end_date=2024-03-31',
+    'transaction-history?start_date=2024-03-01&end_date=2024-03-31',
+    'transaction-history?product_id=1&start_date=2024-03-01',
+    'transaction-history?user_id=1&start_date=2024-03-01',
+]
+LEDGER_SCAN = re.compile(r'^SCAN (transactions|daily_product_movements)\b')
+TABLE_SCAN = re.compile(r'^SCAN (transactions|products)\b')
+
+@pytest.fixture
+def token(app):
+    with app.app_context():
+        execute_query(current_app, "INSERT INTO suppliers (name) VALUES ('Plan Supplier')")
+        execute_query(current_app, '''
+            INSERT INTO products (item_code, name, supplier_id, category_id, unit_cost, selling_price, is_vat_exempt, stock_on_hand)
+            VALUES ('ITEM001', 'Plan Product', 1, 1, 1, 2, 0, 100)
+        ''')
+        for day in range(1, 6):
+            execute_query(current_app, '''
+                INSERT INTO transactions (product_id, transaction_type, quantity, transaction_date, supplier_id, user_id)
+                VALUES (1, 'Delivery', 1, ?, 1, 1)
+            ''', [f'2024-03-{day:02d}'])
+            execute_query(current_app, '''
+                INSERT INTO transactions (product_id, transaction_type, quantity, transaction_date, user_id, price)
+                VALUES (1, 'Sale', 1, ?, 1, 2)
+            ''', [f'2024-03-{day:02d}'])
+        user = query_db(current_app, 'SELECT * FROM users WHERE username = ?', ['test_user'], one=True)
+        return generate_auth_token(current_app, user['user_id'])
+
+def query_plans(app, client, url, token):
+    # The pool hands the single warm connection to the next request, so tracing it here
+    # captures the statements the endpoint actually runs.
+    statements = []
+    with app.app_context():
+        get_db(app).set_trace_callback(statements.append)
+    response = client.get(url, headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 200
+    with app.app_context():
+        db = get_db(app)
+        db.set_trace_callback(None)
+        selects = [sql for sql in statements if sql.lstrip().upper().startswith('SELECT')]
+        assert selects, 'no statements were captured'
+        return {sql: [row['detail'] for row in db.execute('EXPLAIN QUERY PLAN ' + sql)] for sql in selects}
+
+def assert_no_table_scan(plans):
+    for sql, details in plans.items():
+        scans = [detail for detail in details if TABLE_SCAN.match(detail)]
+        assert not scans, f'{sql!r} scans: {scans}'
+
+@pytest.mark.parametrize('pagination', TRANSACTION_PAGINATION)
+@pytest.mark.parametrize('filters', TRANSACTION_FILTERS)
+def test_transaction_filters_use_indexes(app, client, token, filters, pagination):
+    assert_no_table_scan(query_plans(app, client, f'/api/v1/transactions?{filters}{pagination}', token))
+
+@pytest.mark.parametrize('filters', TRANSACTION_FILTERS)
+def test_transaction_cursor_pages_use_indexes(app, client, token, filters):
+    response = client.get(f'/api/v1/transactions?{filters}&limit=1&sort=transaction_date', headers={'Authorization': f'Bearer {token}'})
+    cursor = response.headers.get('X-Next-Cursor')
+    if cursor is None:
+        pytest.skip('filter matches a single row')
+    assert_no_table_scan(query_plans(app, client, f'/api/v1/transactions?{filters}&limit=1&sort=transaction_date&after={cursor}', token))
+
+@pytest.mark.parametrize('filters', PRODUCT_FILTERS)
+def test_product_filters_use_indexes(app, client, token, filters):
+    assert_no_table_scan(query_plans(app, client, f'/api/v1/products?{filters}', token))
+
+@pytest.mark.parametrize('report', REPORT_QUERIES)
+def test_reports_use_indexes(app, client, token, report):
+    for sql, details in query_plans(app, client, f'/api/v1/reports/{report}', token).items():
+        scans = [detail for detail in details if LEDGER_SCAN.match(detail)]
+        assert not scans, f'{sql!r} scans: {scans}'
@@ -0,0 +1,130 @@
+import csv
+import io
+import pytest
+from flask import current_app
+from core.database import get_db, query_db, execute_query
+from core.auth import generate_auth_token
+from core.reconciliation import apply_reconciliation, run_reconciliation, start_reconciliation
+
+@pytest.fixture
+def token(app):
+    with app.app_context():
+        execute_query(current_app, "INSERT INTO suppliers (name) VALUES ('Alpha Supplies')")
+        for number in range(1, 6):
+            execute_query(current_app, '''
+                INSERT INTO products (item_code, name, supplier_id, category_id, unit_cost, selling_price, is_vat_exempt)
+                VALUES (?, 'Product', 1, 1, 10, 20, 0)
+            ''', [f'ITEM00{number}'])
+            add_transaction(number, 'Delivery', 10 * number)
+        add_transaction(1, 'Sale', 3)
+        add_transaction(4, 'Pull-out', 4)
+        # Drift on products 2 and 4: stock overwritten outside the ledger
+        execute_query(current_app, 'UPDATE products SET stock_on_hand = 25 WHERE product_id = 2')
+        execute_query(current_app, 'UPDATE products SET stock_on_hand = 0 WHERE product_id = 4')
+        user = query_db(current_app, 'SELECT * FROM users WHERE username = ?', ['test_user'], one=True)
+        return generate_auth_token(current_app, user['user_id'])
+
+def add_transaction(product_id, transaction_type, quantity):
+    execute_query(current_app, '''
+        INSERT INTO transactions (product_id, transaction_type, quantity, transaction_date, supplier_id, user_id)
+        VALUES (?, ?, ?, '2024-03-01T08:00:00', ?, 1)
+    ''', [product_id, transaction_type, quantity, 1 if transaction_type in ('Delivery', 'Pull-out') else None])
+
+def test_reports_products_that_drifted_from_the_ledger(app, token):
+    with app.app_context():
+        db = get_db(app)
+        found = list(run_reconciliation(db, start_reconciliation(db)))
+        run = query_db(current_app, 'SELECT * FROM stock_reconciliation_runs', one=True)
+    assert found == [
+        {'product_id': 2, 'recorded_stock': 25, 'ledger_stock': 20},
+        {'product_id': 4, 'recorded_stock': 0, 'ledger_stock': 36},
+    ]
+    assert (run['status'], run['products_checked'], run['discrepancy_count'], run['last_product_id']) == ('complete', 5, 2, 5)
+
+def test_interrupted_run_resumes_from_checkpoint(app, token):
+    with app.app_context():
+        db = get_db(app)
+        run_id = start_reconciliation(db)
+        first = run_reconciliation(db, run_id, batch_size=2)
+        # The first batch (products 1 and 2) is committed before its discrepancies are yielded
+        assert next(first) == {'product_id': 2, 'recorded_stock': 25, 'ledger_stock': 20}
+        first.close()
+        run = query_db(current_app, 'SELECT * FROM stock_reconciliation_runs WHERE run_id = ?', [run_id], one=True)
+        assert (run['status'], run['last_product_id'], run['products_checked']) == ('running', 2, 2)
+
+        assert [row['product_id'] for row in run_reconciliation(db, run_id, batch_size=2)] == [4]
+        run = query_db(current_app, 'SELECT * FROM stock_reconciliation_runs WHERE run_id = ?', [run_id], one=True)
+        assert (run['status'], run['products_checked'], run['discrepancy_count']) == ('complete', 5, 2)
+
+def test_apply_resets_stock_to_the_ledger_with_audit(app, token):
+    with app.app_context():
+        db = get_db(app)
+        run_id = start_reconciliation(db)
+        list(run_reconciliation(db, run_id))
+        # Posted after the run: the correction must include it
+        add_transaction(4, 'Delivery', 5)
+        assert apply_reconciliation(db, run_id, user_id=1) == {'adjusted': 2, 'skipped': 0}
+        stock = {row[0]: row[1] for row in query_db(current_app, 'SELECT product_id, stock_on_hand FROM products')}
+        assert stock == {1: 7, 2: 20, 3: 30, 4: 41, 5: 50}
+        adjustments = query_db(current_app, 'SELECT product_id, run_id, previous_stock, new_stock, user_id FROM stock_adjustments ORDER BY product_id')
+        assert [tuple(row) for row in adjustments] == [(2, run_id, 25, 20, 1), (4, run_id, 5, 41, 1)]
+        # Already corrected, so nothing to do the second time
+        assert apply_reconciliation(db, run_id) == {'adjusted': 0, 'skipped': 0}
+
+def test_apply_skips_negative_ledger_stock(app, token):
+    with app.app_context():
+        execute_query(current_app, 'UPDATE products SET stock_on_hand = 100 WHERE product_id = 3')
+        add_transaction(3, 'Sale', 40)
+        db = get_db(app)
+        run_id = start_reconciliation(db)
+        assert {'product_id': 3, 'recorded_stock': 60, 'ledger_stock': -10} in list(run_reconciliation(db, run_id))
+        assert apply_reconciliation(db, run_id) == {'adjusted': 2, 'skipped': 1}
+        assert query_db(current_app, 'SELECT stock_on_hand FROM products WHERE product_id = 3', one=True)[0] == 60
+
+def test_reconciliation_endpoints(client, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    response = client.post('/api/v1/reports/stock-reconciliations', headers=headers)
+    assert response.status_code == 201
+    run_id = response.json['run_id']
+    assert (response.json['status'], response.json['discrepancy_count']) == ('complete', 2)
+
+    response = client.get(f'/api/v1/reports/stock-reconciliations/{run_id}/discrepancies', headers=headers)
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.json == [
+        {'product_id': 2, 'item_code': 'ITEM002', 'name': 'Product', 'recorded_stock': 25, 'ledger_stock': 20, 'difference': 5},
+        {'product_id': 4, 'item_code': 'ITEM004', 'name': 'Product', 'recorded_stock': 0, 'ledger_stock': 36, 'difference': -36},
+    ]
+    response = client.get(f'/api/v1/reports/stock-reconciliations/{run_id}/discrepancies?format=csv', headers=headers)
+    assert list(csv.reader(io.StringIO(response.data.decode())))[0] == ['product_id', 'item_code', 'name', 'recorded_stock', 'ledger_stock', 'difference']
+
+    assert client.post(f'/api/v1/reports/stock-reconciliations/{run_id}/resume', headers=headers).status_code == 409
+    response = client.post(f'/api/v1/reports/stock-reconciliations/{run_id}/apply', headers=headers)
+    assert response.json == {'adjusted': 2, 'skipped': 0}
+
+    response = client.post('/api/v1/reports/stock-reconciliations', headers=headers)
+    assert response.json['discrepancy_count'] == 0
+    response = client.get(f"/api/v1/reports/stock-reconciliations/{response.json['run_id']}/discrepancies", headers=headers)
+    assert response.json == []
+    response = client.get('/api/v1/reports/stock-reconciliations', headers=headers)
+    assert [run['run_id'] for run in response.json] == [run_id + 1, run_id]
+
+def test_resume_and_apply_through_endpoints(app, client, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    with app.app_context():
+        db = get_db(app)
+        run_id = start_reconciliation(db)
+        next(run_reconciliation(db, run_id, batch_size=2))
+    assert client.post(f'/api/v1/reports/stock-reconciliations/{run_id}/apply', headers=headers).status_code == 409
+    response = client.post(f'/api/v1/reports/stock-reconciliations/{run_id}/resume', headers=headers)
+    assert (response.json['status'], response.json['products_checked'], response.json['discrepancy_count']) == ('complete', 5, 2)
+    assert client.get('/api/v1/reports/stock-reconciliations/999', headers=headers).status_code == 404
+    assert client.get(f'/api/v1/reports/stock-reconciliations/{run_id}/discrepancies?format=pdf', headers=headers).status_code == 400
+
+def test_only_administrators_apply(app, client, token):
+    with app.app_context():
+        execute_query(current_app, "INSERT INTO users (username, password, role) VALUES ('manager', '', 'Manager')")
+        manager = generate_auth_token(current_app, query_db(current_app, "SELECT user_id FROM users WHERE username = 'manager'", one=True)[0])
+    headers = {'Authorization': f'Bearer {manager}'}
+    run_id = client.post('/api/v1/reports/stock-reconciliations', headers=headers).json['run_id']
+    assert client.post(f'/api/v1/reports/stock-reconciliations/{run_id}/apply', headers=headers).status_code == 403
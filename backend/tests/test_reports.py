@@ -0,0 +1,197 @@
+import csv
+import io
+import tracemalloc
+import zipfile
+import xml.etree.ElementTree as ET
+import pytest
+from flask import current_app
+from core.database import get_db, query_db, execute_query
+from core.auth import generate_auth_token
+
+@pytest.fixture
+def token(app):
+    with app.app_context():
+        execute_query(current_app, "INSERT INTO suppliers (name) VALUES ('Alpha Supplies')")
+        execute_query(current_app, "INSERT INTO suppliers (name) VALUES ('Beta Trading')")
+        for item_code, name, supplier_id in (('ITEM001', 'Uniform', 1), ('ITEM002', 'Notebook', 2), ('ITEM003', 'Ballpen', 1)):
+            execute_query(current_app, '''
+                INSERT INTO products (item_code, name, supplier_id, category_id, unit_cost, selling_price, is_vat_exempt)
+                VALUES (?, ?, ?, 1, 10, 20, 0)
+            ''', [item_code, name, supplier_id])
+        transactions = [
+            (1, 'Delivery', 50, '2024-03-01T08:00:00', 1, None),
+            (2, 'Delivery', 30, '2024-03-01T09:00:00', 2, None),
+            (3, 'Delivery', 10, '2024-03-02T09:00:00', 1, None),
+            (1, 'Sale', 5, '2024-03-10T10:00:00', None, 20),
+            (1, 'Sale', 2, '2024-03-31T23:59:59', None, 25),
+            (2, 'Sale', 4, '2024-04-01T00:00:00', None, 15),
+            (2, 'Pull-out', 3, '2024-03-15T12:00:00', 2, None),
+        ]
+        for product_id, transaction_type, quantity, date, supplier_id, price in transactions:
+            execute_query(current_app, '''
+                INSERT INTO transactions (product_id, transaction_type, quantity, transaction_date, supplier_id, user_id, price)
+                VALUES (?, ?, ?, ?, ?, 1, ?)
+            ''', [product_id, transaction_type, quantity, date, supplier_id, price])
+        user = query_db(current_app, 'SELECT * FROM users WHERE username = ?', ['test_user'], one=True)
+        return generate_auth_token(current_app, user['user_id'])
+
+def get_report(client, token, url):
+    response = client.get(url, headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 200, response.json
+    return response.json
+
+def test_stock_on_hand_report(client, token):
+    report = get_report(client, token, '/api/v1/reports/stock-on-hand?sort=stock_on_hand&order=desc')
+    assert [(row['item_code'], row['stock_on_hand']) for row in report] == [('ITEM001', 43), ('ITEM002', 23), ('ITEM003', 10)]
+
+def test_report_compact_format(client, token):
+    report = get_report(client, token, '/api/v1/reports/deliveries?format=compact&sort=quantity&order=desc')
+    assert report['columns'][:2] == ['transaction_id', 'transaction_date']
+    assert [row[report['columns'].index('quantity')] for row in report['rows']] == [50, 30, 10]
+    assert get_report(client, token, '/api/v1/reports/deliveries?format=compact&start_date=2030-01-01')['rows'] == []
+    assert get_report(client, token, '/api/v1/reports/deliveries?start_date=2030-01-01') == []
+
+def test_stock_on_hand_report_filters(client, token):
+    report = get_report(client, token, '/api/v1/reports/stock-on-hand?supplier_id=2')
+    assert [row['item_code'] for row in report] == ['ITEM002']
+
+def test_sales_report_groups_by_product(client, token):
+    report = get_report(client, token, '/api/v1/reports/sales?start_date=2024-03-01&end_date=2024-03-31')
+    assert report == [{
+        'product_id': 1, 'item_code': 'ITEM001', 'name': 'Uniform', 'description': None,
+        'quantity_sold': 7, 'total_sales_amount': 150.0,
+    }]
+
+def test_sales_report_sorting(client, token):
+    report = get_report(client, token, '/api/v1/reports/sales?sort=quantity_sold&order=asc')
+    assert [(row['item_code'], row['quantity_sold']) for row in report] == [('ITEM002', 4), ('ITEM001', 7)]
+
+def test_unsold_report(client, token):
+    report = get_report(client, token, '/api/v1/reports/unsold?start_date=2024-03-01&end_date=2024-03-31')
+    assert [row['item_code'] for row in report] == ['ITEM002', 'ITEM003']
+    report = get_report(client, token, '/api/v1/reports/unsold')
+    assert [row['item_code'] for row in report] == ['ITEM003']
+
+def test_deliveries_report(client, token):
+    report = get_report(client, token, '/api/v1/reports/deliveries?start_date=2024-03-01&end_date=2024-03-01')
+    assert [(row['item_code'], row['supplier_name'], row['quantity']) for row in report] == [
+        ('ITEM001', 'Alpha Supplies', 50), ('ITEM002', 'Beta Trading', 30)]
+    report = get_report(client, token, '/api/v1/reports/deliveries?supplier_id=1&sort=quantity')
+    assert [(row['item_code'], row['quantity']) for row in report] == [('ITEM003', 10), ('ITEM001', 50)]
+
+def test_pull_outs_report(client, token):
+    report = get_report(client, token, '/api/v1/reports/pull-outs')
+    assert [(row['item_code'], row['supplier_name'], row['quantity']) for row in report] == [('ITEM002', 'Beta Trading', 3)]
+
+def test_transaction_history_report(client, token):
+    report = get_report(client, token, '/api/v1/reports/transaction-history?product_id=2&order=desc')
+    assert [row['transaction_type'] for row in report] == ['Sale', 'Pull-out', 'Delivery']
+    assert all(row['username'] == 'test_user' for row in report)
+
+@pytest.mark.parametrize('url', [
+    '/api/v1/reports/sales?start_date=03-01-2024',
+    '/api/v1/reports/deliveries?end_date=yesterday',
+    '/api/v1/reports/sales?start_date=2024-02-31',
+    '/api/v1/reports/pull-outs?end_date=2024-13-45',
+    '/api/v1/reports/stock-on-hand?sort=unit_cost',
+    '/api/v1/reports/transaction-history?order=sideways',
+])
+def test_report_invalid_parameters(client, token, url):
+    response = client.get(url, headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 400
+
+def test_reports_require_token(client):
+    response = client.get('/api/v1/reports/sales')
+    assert response.status_code == 401
+
+def test_export_csv(client, token):
+    response = client.get('/api/v1/reports/deliveries/export?format=csv&start_date=2024-03-01&end_date=2024-03-01',
+                          headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    assert response.headers['Content-Disposition'].startswith('attachment; filename="deliveries-')
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+    assert rows[0] == ['transaction_id', 'transaction_date', 'supplier_id', 'supplier_name', 'product_id', 'item_code', 'name', 'quantity']
+    assert [(row[5], row[3], row[7]) for row in rows[1:]] == [('ITEM001', 'Alpha Supplies', '50.0'), ('ITEM002', 'Beta Trading', '30.0')]
+
+def test_export_csv_without_rows_keeps_header(client, token):
+    response = client.get('/api/v1/reports/sales/export?format=csv&start_date=2030-01-01', headers={'Authorization': f'Bearer {token}'})
+    assert response.get_data(as_text=True).splitlines() == ['product_id,item_code,name,description,quantity_sold,total_sales_amount']
+
+def sheet_rows(content):
+    namespace = {'s': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+    with zipfile.ZipFile(io.BytesIO(content)) as archive:
+        assert archive.testzip() is None
+        assert {'[Content_Types].xml', '_rels/.rels', 'xl/workbook.xml'} <= set(archive.namelist())
+        sheet = ET.fromstring(archive.read('xl/worksheets/sheet1.xml'))
+    rows = []
+    for row in sheet.iterfind('s:sheetData/s:row', namespace):
+        cells = {}
+        for cell in row.iterfind('s:c', namespace):
+            column = cell.get('r').rstrip('0123456789')
+            if cell.get('t') == 'inlineStr':
+                cells[column] = cell.find('s:is/s:t', namespace).text
+            else:
+                cells[column] = float(cell.find('s:v', namespace).text)
+        rows.append(cells)
+    return rows
+
+def test_export_xlsx(client, token):
+    response = client.get('/api/v1/reports/sales/export?start_date=2024-03-01&end_date=2024-03-31', headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 200
+    assert response.mimetype == 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    rows = sheet_rows(response.data)
+    assert rows[0] == {'A': 'product_id', 'B': 'item_code', 'C': 'name', 'D': 'description', 'E': 'quantity_sold', 'F': 'total_sales_amount'}
+    # NULL description leaves its cell out
+    assert rows[1] == {'A': 1, 'B': 'ITEM001', 'C': 'Uniform', 'E': 7, 'F': 150.0}
+
+def test_export_xlsx_escapes_text(app, client, token):
+    with app.app_context():
+        execute_query(current_app, "UPDATE products SET name = ? WHERE product_id = 3", ['Pens <blue> & "black"\x01'])
+    response = client.get('/api/v1/reports/unsold/export', headers={'Authorization': f'Bearer {token}'})
+    assert sheet_rows(response.data)[-1]['C'] == 'Pens <blue> & "black"'
+
+@pytest.mark.parametrize('url, status', [
+    ('/api/v1/reports/profits/export', 404),
+    ('/api/v1/reports/sales/export?format=pdf', 400),
+    ('/api/v1/reports/sales/export?start_date=yesterday', 400),
+])
+def test_export_errors(client, token, url, status):
+    response = client.get(url, headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == status
+
+def export_peak_memory(client, token, url):
+    # Peak Python heap while the whole export is read chunk by chunk, as a client would
+    tracemalloc.start()
+    try:
+        response = client.get(url, headers={'Authorization': f'Bearer {token}'}, buffered=False)
+        size = sum(len(chunk) for chunk in response.response)
+        response.close()
+        return size, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+@pytest.mark.parametrize('path', [
+    'transaction-history/export?format=csv',
+    'transaction-history/export?format=xlsx',
+    # The reports themselves are streamed as well
+    'transaction-history?format=json',
+    'transaction-history?format=compact',
+])
+def test_export_memory_does_not_grow_with_rows(app, client, token, path):
+    with app.app_context():
+        db = get_db(app)
+        db.execute('UPDATE stock_trigger_control SET deferred = 1')
+        db.executemany('''
+            INSERT INTO transactions (product_id, transaction_type, quantity, transaction_date, supplier_id, user_id)
+            VALUES (1, 'Delivery', 1, ?, 1, 1)
+        ''', [(f'2024-05-{day:02d}T{second // 3600:02d}:{second // 60 % 60:02d}:{second % 60:02d}',)
+              for day in range(1, 21) for second in range(1000)])
+        db.execute('UPDATE stock_trigger_control SET deferred = 0')
+        db.commit()
+
+    url = f'/api/v1/reports/{path}&start_date=2024-05-01'
+    small_size, small_peak = export_peak_memory(client, token, url + '&end_date=2024-05-02')
+    large_size, large_peak = export_peak_memory(client, token, url + '&end_date=2024-05-20')
+    assert large_size > 8 * small_size
+    assert large_peak < small_peak * 1.5 + 256 * 1024
@@ -0,0 +1,99 @@
+import pytest
+from flask import current_app
+from core.database import get_db, query_db, execute_query
+from core.auth import generate_auth_token
+from core.response_cache import ResponseCache, get_response_cache
+
+@pytest.fixture
+def headers(app):
+    with app.app_context():
+        execute_query(current_app, "INSERT INTO suppliers (name) VALUES ('Cache Supplier')")
+        execute_query(current_app, '''
+            INSERT INTO products (item_code, name, supplier_id, category_id, unit_cost, selling_price, is_vat_exempt, stock_on_hand)
+            VALUES ('ITEM001', 'Cached Product', 1, 1, 10, 20, 0, 100)
+        ''')
+        user = query_db(current_app, 'SELECT * FROM users WHERE username = ?', ['test_user'], one=True)
+        return {'Authorization': f'Bearer {generate_auth_token(current_app, user["user_id"])}'}
+
+def traced_get(app, client, url, headers):
+    statements = []
+    with app.app_context():
+        get_db(app).set_trace_callback(statements.append)
+    response = client.get(url, headers=headers)
+    with app.app_context():
+        get_db(app).set_trace_callback(None)
+    return response, statements
+
+@pytest.mark.parametrize('url', ['/api/v1/products', '/api/v1/suppliers', '/api/v1/categories'])
+def test_if_none_match_returns_304_without_reading_rows(app, client, headers, url):
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert response.headers['Cache-Control'] == 'private, no-cache'
+
+    response, statements = traced_get(app, client, url, {**headers, 'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == etag
+    # Only the version lookup reaches the database
+    assert len(statements) == 1 and 'FROM table_versions' in statements[0]
+
+def test_writes_change_the_etag(app, client, headers):
+    etag = client.get('/api/v1/suppliers', headers=headers).headers['ETag']
+    client.post('/api/v1/suppliers', json={'name': 'New Supplier'}, headers=headers)
+    response = client.get('/api/v1/suppliers', headers={**headers, 'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert [supplier['name'] for supplier in response.json] == ['Cache Supplier', 'New Supplier']
+
+def test_stock_movements_change_the_products_etag(app, client, headers):
+    etag = client.get('/api/v1/products', headers=headers).headers['ETag']
+    client.post('/api/v1/transactions', json={
+        'product_id': 1, 'transaction_type': 'Sale', 'quantity': 3, 'transaction_date': '2024-03-15', 'user_id': 1,
+    }, headers=headers)
+    response = client.get('/api/v1/products', headers={**headers, 'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.json[0]['stock_on_hand'] == 97
+
+def test_cached_body_is_reused_until_the_table_changes(app, client, headers):
+    first = client.get('/api/v1/products?is_active=1', headers=headers)
+    response, statements = traced_get(app, client, '/api/v1/products?is_active=1', headers)
+    assert response.status_code == 200
+    assert response.data == first.data
+    assert not any('FROM products' in sql for sql in statements)
+    assert get_response_cache(app).stats()['hits'] == 1
+
+    with app.app_context():
+        execute_query(current_app, "UPDATE products SET name = 'Renamed' WHERE product_id = 1")
+    response = client.get('/api/v1/products?is_active=1', headers=headers)
+    assert response.json[0]['name'] == 'Renamed'
+
+def test_etag_follows_the_normalized_query(app, client, headers):
+    etag = client.get('/api/v1/products?is_active=1&category_id=1', headers=headers).headers['ETag']
+    assert client.get('/api/v1/products?category_id=1&is_active=1', headers=headers).headers['ETag'] == etag
+    assert client.get('/api/v1/products?category_id=2&is_active=1', headers=headers).headers['ETag'] != etag
+
+def test_escaped_separators_do_not_share_a_cache_entry(app, client, headers):
+    # A single category_id value that spells out a second parameter matches nothing
+    response = client.get('/api/v1/products?category_id=1%26supplier_id%3D1', headers=headers)
+    assert response.json == []
+    collision = response.headers['ETag']
+    response = client.get('/api/v1/products?category_id=1&supplier_id=1', headers=headers)
+    assert [product['item_code'] for product in response.json] == ['ITEM001']
+    assert response.headers['ETag'] != collision
+
+def test_response_cache_is_bounded_by_bytes():
+    cache = ResponseCache(max_bytes=10)
+    cache.set('a', 1, b'12345')
+    cache.set('b', 1, b'12345')
+    assert cache.get('a', 1) == b'12345'
+    cache.set('c', 1, b'123')
+    # 'b' was the least recently used entry
+    assert cache.get('b', 1) is None
+    assert cache.get('a', 1) == b'12345'
+    assert cache.get('a', 2) is None
+    cache.set('d', 1, b'x' * 11)
+    assert cache.get('d', 1) is None
+    stats = cache.stats()
+    assert stats['bytes'] <= 10
+    assert stats['evictions'] == 1
@@ -0,0 +1,135 @@
+import pytest
+from flask import current_app
+from core.database import get_db, query_db, execute_query
+from core.auth import generate_auth_token
+from datetime import date
+from core.stock_snapshots import create_stock_snapshot, prune_stale_snapshots
+
+@pytest.fixture
+def token(app):
+    with app.app_context():
+        execute_query(current_app, "INSERT INTO suppliers (name) VALUES ('Alpha Supplies')")
+        for item_code in ('ITEM001', 'ITEM002'):
+            execute_query(current_app, '''
+                INSERT INTO products (item_code, name, supplier_id, category_id, unit_cost, selling_price, is_vat_exempt)
+                VALUES (?, 'Product', 1, 1, 10, 20, 0)
+            ''', [item_code])
+        for product_id, transaction_type, quantity, date in (
+            (1, 'Delivery', 50, '2024-03-01T08:00:00'),
+            (2, 'Delivery', 30, '2024-03-01T09:00:00'),
+            (1, 'Sale', 5, '2024-03-10T10:00:00'),
+            (1, 'Sale', 2, '2024-03-31T23:59:59'),
+            (2, 'Pull-out', 3, '2024-03-15T12:00:00'),
+            (1, 'Delivery', 20, '2024-04-02T08:00:00'),
+        ):
+            add_transaction(product_id, transaction_type, quantity, date)
+        user = query_db(current_app, 'SELECT * FROM users WHERE username = ?', ['test_user'], one=True)
+        return generate_auth_token(current_app, user['user_id'])
+
+def add_transaction(product_id, transaction_type, quantity, date):
+    return execute_query(current_app, '''
+        INSERT INTO transactions (product_id, transaction_type, quantity, transaction_date, supplier_id, user_id)
+        VALUES (?, ?, ?, ?, ?, 1)
+    ''', [product_id, transaction_type, quantity, date, 1 if transaction_type in ('Delivery', 'Pull-out') else None])
+
+def stock_as_of(client, token, as_of):
+    response = client.get(f'/api/v1/reports/stock-on-hand?as_of={as_of}', headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 200, response.json
+    return {row['item_code']: row['stock_on_hand'] for row in response.json}
+
+EXPECTED = {
+    '2024-02-28': {'ITEM001': 0, 'ITEM002': 0},
+    '2024-03-01': {'ITEM001': 50, 'ITEM002': 30},
+    '2024-03-14': {'ITEM001': 45, 'ITEM002': 30},
+    '2024-03-31': {'ITEM001': 43, 'ITEM002': 27},
+    '2024-04-30': {'ITEM001': 63, 'ITEM002': 27},
+}
+
+def snapshot_dates(app):
+    with app.app_context():
+        return {row['snapshot_date']: row['status'] for row in query_db(current_app, 'SELECT * FROM stock_snapshot_dates')}
+
+def test_as_of_without_snapshots_replays_from_live_stock(client, token):
+    for as_of, expected in EXPECTED.items():
+        assert stock_as_of(client, token, as_of) == expected
+
+@pytest.mark.parametrize('snapshots', [['2024-03-01'], ['2024-03-20'], ['2024-03-01', '2024-03-31', '2024-04-15']])
+def test_as_of_from_snapshots(app, client, token, snapshots):
+    with app.app_context():
+        for snapshot_date in snapshots:
+            assert create_stock_snapshot(get_db(app), snapshot_date)['product_count'] == 2
+    assert set(snapshot_dates(app).values()) == {'complete'}
+    for as_of, expected in EXPECTED.items():
+        assert stock_as_of(client, token, as_of) == expected
+
+def test_snapshot_is_built_incrementally_from_the_previous_one(app, token):
+    with app.app_context():
+        db = get_db(app)
+        create_stock_snapshot(db, '2024-03-01')
+        # A snapshot is only read through its rows, so tampering with them shows which anchor was used
+        db.execute("UPDATE stock_snapshots SET stock_on_hand = stock_on_hand + 1000 WHERE snapshot_date = '2024-03-01'")
+        db.commit()
+        create_stock_snapshot(db, '2024-03-14', today=date(2024, 12, 31))
+        rows = query_db(current_app, "SELECT product_id, stock_on_hand FROM stock_snapshots WHERE snapshot_date = '2024-03-14' ORDER BY product_id")
+        assert [tuple(row) for row in rows] == [(1, 1045), (2, 1030)]
+
+def test_backdated_transaction_marks_later_snapshots_stale(app, client, token):
+    with app.app_context():
+        db = get_db(app)
+        for snapshot_date in ('2024-03-01', '2024-03-20', '2024-04-15'):
+            create_stock_snapshot(db, snapshot_date)
+        add_transaction(2, 'Sale', 4, '2024-03-20T18:00:00')
+    assert snapshot_dates(app) == {'2024-03-01': 'complete', '2024-03-20': 'stale', '2024-04-15': 'stale'}
+    assert stock_as_of(client, token, '2024-03-31') == {'ITEM001': 43, 'ITEM002': 23}
+
+    with app.app_context():
+        execute_query(current_app, "UPDATE transactions SET transaction_date = '2024-02-01' WHERE transaction_id = 1")
+        assert snapshot_dates(app)['2024-03-01'] == 'stale'
+        assert prune_stale_snapshots(get_db(app)) == ['2024-03-01', '2024-03-20', '2024-04-15']
+        assert query_db(current_app, 'SELECT COUNT(*) FROM stock_snapshots', one=True)[0] == 0
+    assert snapshot_dates(app) == {}
+
+def test_products_added_after_a_snapshot(app, client, token):
+    with app.app_context():
+        create_stock_snapshot(get_db(app), '2024-03-31')
+        execute_query(current_app, '''
+            INSERT INTO products (item_code, name, supplier_id, category_id, unit_cost, selling_price, is_vat_exempt)
+            VALUES ('ITEM003', 'Late Product', 1, 1, 10, 20, 0)
+        ''')
+        add_transaction(3, 'Delivery', 7, '2024-04-10T08:00:00')
+    assert stock_as_of(client, token, '2024-04-30') == {'ITEM001': 63, 'ITEM002': 27, 'ITEM003': 7}
+    assert stock_as_of(client, token, '2024-04-01') == {'ITEM001': 43, 'ITEM002': 27, 'ITEM003': 0}
+
+def test_as_of_keeps_filters_and_sorting(client, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    response = client.get('/api/v1/reports/stock-on-hand?as_of=2024-03-14&sort=stock_on_hand&order=asc', headers=headers)
+    assert [(row['item_code'], row['stock_on_hand']) for row in response.json] == [('ITEM002', 30), ('ITEM001', 45)]
+    response = client.get('/api/v1/reports/stock-on-hand/export?format=csv&as_of=2024-03-14', headers=headers)
+    assert response.data.decode().splitlines()[1:] == ['1,ITEM001,Product,,45.0', '2,ITEM002,Product,,30.0']
+
+@pytest.mark.parametrize('as_of', ['2024-3-1', '2024-02-30', 'yesterday'])
+def test_invalid_as_of(client, token, as_of):
+    response = client.get(f'/api/v1/reports/stock-on-hand?as_of={as_of}', headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 400
+    assert response.json['message'] == 'Invalid as_of, expected YYYY-MM-DD'
+
+def test_snapshot_endpoints(app, client, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    response = client.post('/api/v1/reports/stock-snapshots', json={'snapshot_date': '2024-03-14'}, headers=headers)
+    assert response.status_code == 201
+    assert response.json['snapshot_date'] == '2024-03-14'
+    assert response.json['product_count'] == 2
+
+    response = client.get('/api/v1/reports/stock-snapshots', headers=headers)
+    assert [(row['snapshot_date'], row['status'], row['product_count']) for row in response.json] == [('2024-03-14', 'complete', 2)]
+
+    response = client.post('/api/v1/reports/stock-snapshots', json={'snapshot_date': '2024-13-01'}, headers=headers)
+    assert response.status_code == 400
+
+def test_snapshot_endpoint_requires_manager(app, client, token):
+    with app.app_context():
+        execute_query(current_app, "INSERT INTO users (username, password, role) VALUES ('staff', '', 'Staff')")
+        staff_token = generate_auth_token(current_app, query_db(current_app, "SELECT user_id FROM users WHERE username = 'staff'", one=True)[0])
+    response = client.post('/api/v1/reports/stock-snapshots', json={'snapshot_date': '2024-03-14'},
+                           headers={'Authorization': f'Bearer {staff_token}'})
+    assert response.status_code == 403
@@ -1,6 +1,10 @@
+import json
+import sqlite3
+import threading
 import pytest
 from flask import current_app
-from core.database import query_db, execute_query
+from api.transactions import encode_cursor
+from core.database import get_db, query_db, execute_query
 from core.auth import generate_auth_token
 
 # Helper function to get a valid token (any logged in user)
@@ -112,3 +116,237 @@ def test_create_transaction_invalid_transaction_type(app, client):
     }
     response = client.post('/api/v1/transactions', json=invalid_transaction_data, headers={'Authorization': f'Bearer {user_token}'})
     assert response.status_code == 400
+
+@pytest.mark.parametrize('overrides, message', [
+    ({'product_id': 9999}, 'Invalid product_id'),
+    ({'user_id': 9999}, 'Invalid user_id'),
+    ({'supplier_id': 9999}, 'Invalid supplier_id'),
+    ({'product_id': 9999, 'user_id': 9999}, 'Invalid product_id'),
+    ({'transaction_type': 'Sale', 'quantity': 500}, 'Insufficient stock'),
+])
+def test_create_transaction_rejections(app, client, overrides, message):
+    user_token, product_id, supplier_id, user_id = setup_test_data(app, client)
+    transaction_data = {
+        'product_id': product_id,
+        'transaction_type': 'Delivery',
+        'quantity': 5,
+        'transaction_date': '2024-03-15',
+        'user_id': user_id,
+        'supplier_id': supplier_id,
+        **overrides,
+    }
+    response = client.post('/api/v1/transactions', json=transaction_data, headers={'Authorization': f'Bearer {user_token}'})
+    assert response.status_code == 400
+    assert response.json['message'] == message
+    with app.app_context():
+        assert query_db(current_app, 'SELECT COUNT(*) AS count FROM transactions', one=True)['count'] == 0
+        assert query_db(current_app, 'SELECT stock_on_hand FROM products WHERE product_id = ?', [product_id], one=True)['stock_on_hand'] == 0
+
+def test_create_sale_takes_selling_price(app, client):
+    user_token, product_id, supplier_id, user_id = setup_test_data(app, client)
+    with app.app_context():
+        execute_query(current_app, 'UPDATE products SET stock_on_hand = 10 WHERE product_id = ?', [product_id])
+    response = client.post('/api/v1/transactions', json={
+        'product_id': product_id, 'transaction_type': 'Sale', 'quantity': 2, 'transaction_date': '2024-03-15', 'user_id': user_id,
+    }, headers={'Authorization': f'Bearer {user_token}'})
+    assert response.status_code == 201
+    assert response.json['price'] == 15.75
+    assert response.json['supplier_id'] is None
+    with app.app_context():
+        assert query_db(current_app, 'SELECT stock_on_hand FROM products WHERE product_id = ?', [product_id], one=True)['stock_on_hand'] == 8
+
+def test_create_transactions_batch(app, client):
+    user_token, product_id, supplier_id, user_id = setup_test_data(app, client)
+    batch = [
+        {'product_id': product_id, 'transaction_type': 'Delivery', 'quantity': 50, 'transaction_date': '2024-03-15', 'user_id': user_id, 'supplier_id': supplier_id},
+        {'product_id': product_id, 'transaction_type': 'Sale', 'quantity': 3, 'transaction_date': '2024-03-16', 'user_id': user_id},
+        {'product_id': product_id, 'transaction_type': 'Sale', 'quantity': 2, 'transaction_date': '2024-03-16', 'user_id': user_id},
+    ]
+    response = client.post('/api/v1/transactions/batch', json=batch, headers={'Authorization': f'Bearer {user_token}'})
+    assert response.status_code == 201
+    assert response.json['created'] == 3
+    results = response.json['results']
+    assert [result['status'] for result in results] == [201, 201, 201]
+    assert results[1]['transaction']['price'] == 15.75
+
+    with app.app_context():
+        for result in results:
+            stored = query_db(current_app, 'SELECT * FROM transactions WHERE transaction_id = ?', [result['transaction']['transaction_id']], one=True)
+            assert dict(stored) == result['transaction']
+        product = query_db(current_app, 'SELECT stock_on_hand FROM products WHERE product_id = ?', [product_id], one=True)
+        assert product['stock_on_hand'] == 45
+        # The stock trigger is active again for single inserts
+        assert query_db(current_app, 'SELECT deferred FROM stock_trigger_control', one=True)['deferred'] == 0
+
+def test_create_transactions_batch_reports_invalid_rows(app, client):
+    user_token, product_id, supplier_id, user_id = setup_test_data(app, client)
+    batch = [
+        {'product_id': product_id, 'transaction_type': 'Delivery', 'quantity': 5, 'transaction_date': '2024-03-15', 'user_id': user_id, 'supplier_id': supplier_id},
+        {'product_id': 9999, 'transaction_type': 'Sale', 'quantity': 1, 'transaction_date': '2024-03-15', 'user_id': user_id},
+        {'product_id': product_id, 'transaction_type': 'Pull-out', 'quantity': 1, 'transaction_date': '2024-03-15', 'user_id': user_id},
+        {'product_id': product_id, 'transaction_type': 'Sale', 'quantity': 10, 'transaction_date': '2024-03-15', 'user_id': user_id},
+        {'product_id': product_id, 'transaction_type': 'Sale'},
+    ]
+    response = client.post('/api/v1/transactions/batch', json=batch, headers={'Authorization': f'Bearer {user_token}'})
+    assert response.status_code == 207
+    assert response.json['created'] == 1
+    assert response.json['failed'] == 4
+    messages = [result.get('message') for result in response.json['results']]
+    assert messages == [None, 'Invalid product_id', 'supplier_id is required for Delivery and Pull-out transactions',
+                        'Insufficient stock', 'Missing required fields']
+
+    with app.app_context():
+        product = query_db(current_app, 'SELECT stock_on_hand FROM products WHERE product_id = ?', [product_id], one=True)
+        assert product['stock_on_hand'] == 5
+
+def test_create_transactions_batch_rejects_invalid_dates(app, client):
+    user_token, product_id, supplier_id, user_id = setup_test_data(app, client)
+    batch = [
+        {'product_id': product_id, 'transaction_type': 'Delivery', 'quantity': 5, 'transaction_date': '2024-03-15T09:30:00.000Z', 'user_id': user_id, 'supplier_id': supplier_id},
+        {'product_id': product_id, 'transaction_type': 'Delivery', 'quantity': 5, 'transaction_date': '2024-02-31', 'user_id': user_id, 'supplier_id': supplier_id},
+        {'product_id': product_id, 'transaction_type': 'Delivery', 'quantity': 5, 'transaction_date': 'yesterday', 'user_id': user_id, 'supplier_id': supplier_id},
+        {'product_id': product_id, 'transaction_type': 'Delivery', 'quantity': 5, 'transaction_date': 20240315, 'user_id': user_id, 'supplier_id': supplier_id},
+    ]
+    response = client.post('/api/v1/transactions/batch', json=batch, headers={'Authorization': f'Bearer {user_token}'})
+    assert response.status_code == 207
+    messages = [result.get('message') for result in response.json['results']]
+    assert messages == [None] + ['Invalid transaction_date'] * 3
+
+    response = client.post('/api/v1/transactions', json=batch[1], headers={'Authorization': f'Bearer {user_token}'})
+    assert response.status_code == 400
+    assert response.json['message'] == 'Invalid transaction_date'
+
+def hold_write_lock(app):
+    # Another writer holding the lock; the next request's connection skips SQLite's busy handler
+    with app.app_context():
+        get_db(app).execute('PRAGMA busy_timeout = 0')  # Released last, so the next request gets it
+    blocker = sqlite3.connect(app.config['DATABASE'], check_same_thread=False)
+    blocker.execute('BEGIN IMMEDIATE')
+    blocker.execute("INSERT INTO categories (name) VALUES ('Held by another writer')")
+    return blocker
+
+def test_create_transactions_batch_retries_when_database_is_locked(app, client):
+    user_token, product_id, supplier_id, user_id = setup_test_data(app, client)
+    app.config['DATABASE_BUSY_BACKOFF'] = 0.05
+    blocker = hold_write_lock(app)
+    release = threading.Timer(0.15, blocker.commit)
+    release.start()
+    try:
+        batch = [{'product_id': product_id, 'transaction_type': 'Delivery', 'quantity': 5, 'transaction_date': '2024-03-15', 'user_id': user_id, 'supplier_id': supplier_id}]
+        response = client.post('/api/v1/transactions/batch', json=batch, headers={'Authorization': f'Bearer {user_token}'})
+        assert response.status_code == 201
+    finally:
+        release.join()
+        blocker.close()
+
+def test_create_transactions_batch_answers_503_while_database_stays_locked(app, client):
+    user_token, product_id, supplier_id, user_id = setup_test_data(app, client)
+    app.config['DATABASE_BUSY_RETRIES'] = 1
+    app.config['DATABASE_BUSY_BACKOFF'] = 0.01
+    blocker = hold_write_lock(app)
+    try:
+        batch = [{'product_id': product_id, 'transaction_type': 'Delivery', 'quantity': 5, 'transaction_date': '2024-03-15', 'user_id': user_id, 'supplier_id': supplier_id}]
+        response = client.post('/api/v1/transactions/batch', json=batch, headers={'Authorization': f'Bearer {user_token}'})
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
+    finally:
+        blocker.rollback()
+        blocker.close()
+    with app.app_context():
+        assert query_db(current_app, 'SELECT COUNT(*) FROM transactions', one=True)[0] == 0
+        assert query_db(current_app, 'SELECT deferred FROM stock_trigger_control', one=True)['deferred'] == 0
+
+def test_create_transactions_batch_rejects_empty_body(app, client):
+    user_token = get_user_token(app)
+    response = client.post('/api/v1/transactions/batch', json=[], headers={'Authorization': f'Bearer {user_token}'})
+    assert response.status_code == 400
+
+def create_sales(app, count):
+    user_token, product_id, supplier_id, user_id = setup_test_data(app, None)
+    with app.app_context():
+        execute_query(current_app, 'UPDATE products SET stock_on_hand = 1000 WHERE product_id = ?', [product_id])
+        for day in range(count):
+            execute_query(current_app, '''
+                INSERT INTO transactions (product_id, transaction_type, quantity, transaction_date, user_id, price)
+                VALUES (?, 'Sale', 1, ?, ?, 15.75)
+            ''', [product_id, f'2024-03-{count - day:02d}', user_id])
+    return user_token
+
+def test_get_transactions_keyset_pagination(app, client):
+    user_token = create_sales(app, 5)
+    seen = []
+    url = '/api/v1/transactions?limit=2'
+    while url:
+        response = client.get(url, headers={'Authorization': f'Bearer {user_token}'})
+        assert response.status_code == 200
+        assert len(response.json) <= 2
+        seen.extend(transaction['transaction_id'] for transaction in response.json)
+        cursor = response.headers.get('X-Next-Cursor')
+        url = f'/api/v1/transactions?limit=2&after={cursor}' if cursor else None
+    assert seen == sorted(seen)
+    assert len(seen) == 5
+
+def test_get_transactions_keyset_pagination_by_date(app, client):
+    user_token = create_sales(app, 5)
+    response = client.get('/api/v1/transactions?limit=3&sort=transaction_date&order=desc', headers={'Authorization': f'Bearer {user_token}'})
+    first_page = [transaction['transaction_date'] for transaction in response.json]
+    assert first_page == ['2024-03-05', '2024-03-04', '2024-03-03']
+    cursor = response.headers['X-Next-Cursor']
+    response = client.get(f'/api/v1/transactions?limit=3&sort=transaction_date&order=desc&after={cursor}', headers={'Authorization': f'Bearer {user_token}'})
+    assert [transaction['transaction_date'] for transaction in response.json] == ['2024-03-02', '2024-03-01']
+    assert 'X-Next-Cursor' not in response.headers
+
+def test_get_transactions_invalid_cursor(app, client):
+    user_token = get_user_token(app)
+    response = client.get('/api/v1/transactions?limit=2&after=not-a-cursor', headers={'Authorization': f'Bearer {user_token}'})
+    assert response.status_code == 400
+    # Well-formed cursors holding values of the wrong type for the sort key
+    for sort, values in (('transaction_id', [{'a': 1}]), ('transaction_id', [True]), ('transaction_id', ['5']),
+                         ('transaction_id', [1.5]), ('transaction_date', [[1], 1]), ('transaction_date', [1, 1]),
+                         ('transaction_date', ['2024-03-01', None])):
+        response = client.get(f'/api/v1/transactions?limit=2&sort={sort}&after={encode_cursor(values)}',
+                              headers={'Authorization': f'Bearer {user_token}'})
+        assert response.status_code == 400
+        assert response.json['message'] == 'Invalid cursor'
+
+def test_get_transactions_streamed_ndjson(app, client):
+    user_token = create_sales(app, 3)
+    response = client.get('/api/v1/transactions?format=ndjson&transaction_type=Sale', headers={'Authorization': f'Bearer {user_token}'})
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [line['transaction_type'] for line in lines] == ['Sale'] * 3
+
+def test_get_transactions_streamed_json_array(app, client):
+    user_token = create_sales(app, 3)
+    response = client.get('/api/v1/transactions?format=json-stream', headers={'Authorization': f'Bearer {user_token}'})
+    assert response.status_code == 200
+    assert len(json.loads(response.get_data(as_text=True))) == 3
+
+def test_get_transactions_expanded(app, client):
+    user_token = create_sales(app, 3)
+    response = client.get('/api/v1/transactions?expand=product,user&limit=2', headers={'Authorization': f'Bearer {user_token}'})
+    assert response.status_code == 200
+    assert [(row['item_code'], row['product_name'], row['username']) for row in response.json] == [('ITEM001', 'Test Product', 'test_user')] * 2
+    assert 'supplier_name' not in response.json[0]
+    cursor = response.headers['X-Next-Cursor']
+    response = client.get(f'/api/v1/transactions?expand=product,user&limit=2&after={cursor}', headers={'Authorization': f'Bearer {user_token}'})
+    assert len(response.json) == 1 and response.json[0]['product_name'] == 'Test Product'
+
+    transaction_id = response.json[0]['transaction_id']
+    response = client.get(f'/api/v1/transactions/{transaction_id}?expand=supplier', headers={'Authorization': f'Bearer {user_token}'})
+    assert response.json['supplier_name'] is None  # Sales have no supplier
+    response = client.get('/api/v1/transactions?expand=product,warehouse', headers={'Authorization': f'Bearer {user_token}'})
+    assert response.status_code == 400
+
+def test_get_transactions_fields(app, client):
+    user_token = create_sales(app, 3)
+    # The page omits its sort key, which is still read for the cursor
+    response = client.get('/api/v1/transactions?fields=quantity,product_name&limit=2&sort=transaction_date', headers={'Authorization': f'Bearer {user_token}'})
+    assert response.json == [{'quantity': 1, 'product_name': 'Test Product'}] * 2
+    cursor = response.headers['X-Next-Cursor']
+    response = client.get(f'/api/v1/transactions?fields=quantity,product_name&limit=2&sort=transaction_date&after={cursor}',
+                          headers={'Authorization': f'Bearer {user_token}'})
+    assert response.json == [{'quantity': 1, 'product_name': 'Test Product'}]
+    response = client.get('/api/v1/transactions?fields=transaction_id,username&format=ndjson', headers={'Authorization': f'Bearer {user_token}'})
+    assert [json.loads(line) for line in response.get_data(as_text=True).splitlines()][0] == {'transaction_id': 1, 'username': 'test_user'}
@@ -0,0 +1,18 @@
+# Entry point for production WSGI servers. On Linux and macOS:
+#     gunicorn -c gunicorn.conf.py wsgi:app
+# On Windows, where gunicorn does not run, `python wsgi.py` serves the app with waitress.
+import os
+
+from dotenv import load_dotenv
+from core.app import create_app
+
+load_dotenv()
+app = create_app()
+
+if __name__ == '__main__':
+    from waitress import serve
+
+    # One process; waitress serves requests on a thread pool. SQLite and Scrypt release
+    # the GIL, so threads beyond the core count still overlap database and hashing work.
+    serve(app, listen=os.getenv('BIND', '0.0.0.0:5000'),
+          threads=int(os.getenv('WEB_THREADS', 4 * (os.cpu_count() or 1))))
@@ -40,10 +40,17 @@ async function handleResponse<T>(response: Response, errorMapping?: Record<numbe
 }
 
 async function apiClient<T>(endpoint: string, config: RequestInit = {}, errorMapping?: Record<number, string>): Promise<T> {
+  const { data } = await apiClientWithHeaders<T>(endpoint, config, errorMapping);
+  return data;
+}
+
+// Like apiClient, but also hands back the response headers (pagination cursors and the like)
+async function apiClientWithHeaders<T>(endpoint: string, config: RequestInit = {}, errorMapping?: Record<number, string>): Promise<{ data: T; headers: Headers }> {
   try {
     const url = `${API_BASE_URL}${endpoint}`;
     const response = await fetch(url, config);
-    return handleResponse<T>(response, errorMapping);
+    const data = await handleResponse<T>(response, errorMapping);
+    return { data, headers: response.headers };
   } catch (error) {
     if (error instanceof Error && error.name === 'ApiError') {
       throw error;
@@ -52,4 +59,4 @@ async function apiClient<T>(endpoint: string, config: RequestInit = {}, errorMap
   }
 }
 
-export { apiClient };
+export { apiClient, apiClientWithHeaders };
@@ -1,4 +1,4 @@
-import { apiClient } from './client';
+import { apiClient, apiClientWithHeaders } from './client';
 
 export interface Transaction {
   transaction_id: number;
@@ -9,6 +9,20 @@ export interface Transaction {
   supplier_id: number | null;
   user_id: number;
   price: number | null;
+  // Present when requested with expand
+  item_code?: string;
+  product_name?: string;
+  supplier_name?: string | null;
+  username?: string;
+}
+
+export type TransactionExpansion = 'product' | 'supplier' | 'user';
+
+export const TRANSACTION_PAGE_SIZE = 100;
+
+export interface TransactionPage {
+  transactions: Transaction[];
+  nextCursor: string | null; // Pass as after to fetch the following page; null on the last one
 }
 
 export interface CreateTransactionPayload {
@@ -21,14 +35,28 @@ export interface CreateTransactionPayload {
   price?: number | null; // Optional, depending on transaction type
 }
 
-export async function getAllTransactions(authToken: string): Promise<Transaction[]> {
-  return apiClient<Transaction[]>('/transactions', {
+// One page of the ledger, newest first
+export async function getTransactionPage(
+  authToken: string,
+  expand: TransactionExpansion[] = [],
+  after: string | null = null,
+  limit: number = TRANSACTION_PAGE_SIZE,
+): Promise<TransactionPage> {
+  const params = new URLSearchParams({ sort: 'transaction_date', order: 'desc', limit: String(limit) });
+  if (expand.length) {
+    params.set('expand', expand.join(','));
+  }
+  if (after) {
+    params.set('after', after);
+  }
+  const { data, headers } = await apiClientWithHeaders<Transaction[]>(`/transactions?${params}`, {
     method: 'GET',
     headers: {
       'Authorization': `Bearer ${authToken}`,
       'Content-Type': 'application/json',
     },
   });
+  return { transactions: data, nextCursor: headers.get('X-Next-Cursor') };
 }
 
 export async function getTransactionById(authToken: string, transactionId: number): Promise<Transaction> {
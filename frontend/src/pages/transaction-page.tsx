@@ -1,35 +1,28 @@
 import React, { useState, useEffect } from 'react';
-import { getAllTransactions, Transaction } from '../api/transactions';
-import { getAllSuppliers, Supplier } from '../api/suppliers';
-import { getAllUsers, User } from '../api/users';
+import { getTransactionPage, Transaction, TransactionExpansion } from '../api/transactions';
 import { useAuth } from '../providers/auth-provider';
 import useErrorNotifier from '../hooks/useErrorNotifier';
 import AddTransactionModal from '../components/add-transaction-modal';
 
+// Supplier and user names come joined in, instead of downloading both lists
+const EXPANSIONS: TransactionExpansion[] = ['supplier', 'user'];
+
 const TransactionPage: React.FC = () => {
   const { authToken } = useAuth();
   const { reportError } = useErrorNotifier();
   const [transactions, setTransactions] = useState<Transaction[]>([]);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [isAddModalOpen, setIsAddModalOpen] = useState(false);
-  const [suppliersMap, setSuppliersMap] = useState<Map<number, Supplier>>(new Map());
-  const [usersMap, setUsersMap] = useState<Map<number, User>>(new Map());
 
   const fetchTransactions = async () => {
     if (authToken) {
       try {
-        const transactionsData = await getAllTransactions(authToken);
-        setTransactions(transactionsData);
-
-        const suppliersData = await getAllSuppliers(authToken);
-        const suppliersMapData = new Map<number, Supplier>();
-        suppliersData.forEach(supplier => suppliersMapData.set(supplier.supplier_id, supplier));
-        setSuppliersMap(suppliersMapData);
-
-        const usersData = await getAllUsers(authToken);
-        const usersMapData = new Map<number, User>();
-        usersData.forEach(user => usersMapData.set(user.user_id, user));
-        setUsersMap(usersMapData);
+        // Starts over from the newest page, e.g. after a transaction was added
+        const page = await getTransactionPage(authToken, EXPANSIONS);
+        setTransactions(page.transactions);
+        setNextCursor(page.nextCursor);
       } catch (error) {
         reportError('fetch transactions', error);
       } finally {
@@ -44,6 +37,22 @@ const TransactionPage: React.FC = () => {
     fetchTransactions();
   }, [authToken]);
 
+  const loadMore = async () => {
+    if (!authToken || !nextCursor) {
+      return;
+    }
+    setLoadingMore(true);
+    try {
+      const page = await getTransactionPage(authToken, EXPANSIONS, nextCursor);
+      setTransactions((loaded) => [...loaded, ...page.transactions]);
+      setNextCursor(page.nextCursor);
+    } catch (error) {
+      reportError('fetch more transactions', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const openAddModal = () => {
     setIsAddModalOpen(true);
   };
@@ -91,16 +100,31 @@ const TransactionPage: React.FC = () => {
                     <td className="px-6 py-4 whitespace-nowrap text-sm text-ashley-gray-11">{transaction.quantity}</td>
                     <td className="px-6 py-4 whitespace-nowrap text-sm text-ashley-gray-11">{transaction.transaction_date}</td>
                     <td className="px-6 py-4 whitespace-nowrap text-sm text-ashley-gray-11">
-                      {transaction.supplier_id ? suppliersMap.get(transaction.supplier_id)?.name || '-' : '-'}
+                      {transaction.supplier_name || '-'}
                     </td>
                     <td className="px-6 py-4 whitespace-nowrap text-sm text-ashley-gray-11">
-                      {usersMap.get(transaction.user_id)?.username || 'Unknown User'}
+                      {transaction.username || 'Unknown User'}
                     </td>
                     <td className="px-6 py-4 whitespace-nowrap text-sm text-ashley-gray-11">{transaction.price || '-'}</td>
                   </tr>
                 ))}
               </tbody>
             </table>
+            {nextCursor && (
+              <div className="flex justify-center mt-4">
+                <button
+                  className={`font-bold py-2 px-4 rounded ${
+                    loadingMore
+                      ? 'bg-ashley-gray-6 text-ashley-gray-11 cursor-not-allowed'
+                      : 'bg-ashley-gray-9 hover:bg-ashley-gray-10 text-ashley-accent-1'
+                  }`}
+                  onClick={loadMore}
+                  disabled={loadingMore}
+                >
+                  {loadingMore ? 'Loading...' : 'Load more'}
+                </button>
+              </div>
+            )}
           </div>
         )}
       </div>